@@ -0,0 +1,128 @@
+"""
+Compare accuracy and latency of the image classifier serving backends.
+
+Runs every image in a local folder through the fp32, int8 and onnx backends of
+FoodImageClassifier and reports, relative to fp32:
+  - top-1 label agreement
+  - mean absolute confidence difference
+  - per-image latency (batch of 1) and throughput for a batched pass
+
+Usage:
+    python scripts/compare_image_backends.py --images notebooks/image_tagging
+"""
+
+import os
+import sys
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+# Add parent directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from server.src.image_classifier import FoodImageClassifier
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.jfif')
+
+
+def load_images(folder: str) -> Dict[str, bytes]:
+    """Reads every image file in the folder as raw bytes."""
+    images = {}
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(folder, name), 'rb') as f:
+                images[name] = f.read()
+    return images
+
+
+def benchmark_backend(classifier: FoodImageClassifier, images: Dict[str, bytes],
+                      batch_size: int, warmup: int = 2) -> Dict[str, object]:
+    """Runs single-image and batched passes, returning predictions and timings."""
+    payloads = list(images.values())
+
+    for payload in payloads[:warmup]:
+        classifier.predict_batch([payload])
+
+    predictions, single_latencies = [], []
+    for payload in payloads:
+        start = time.perf_counter()
+        predictions.append(classifier.predict_batch([payload])[0])
+        single_latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for i in range(0, len(payloads), batch_size):
+        classifier.predict_batch(payloads[i:i + batch_size])
+    batched_seconds = time.perf_counter() - start
+
+    return {
+        'predictions': predictions,
+        'latency_ms_mean': float(np.mean(single_latencies)),
+        'latency_ms_p95': float(np.percentile(single_latencies, 95)),
+        'batched_images_per_s': len(payloads) / batched_seconds if batched_seconds > 0 else 0.0,
+    }
+
+
+def compare(reference: List[dict], candidate: List[dict]) -> Dict[str, float]:
+    """Top-1 agreement and confidence drift of a backend against the fp32 reference."""
+    pairs = [(r, c) for r, c in zip(reference, candidate)
+             if isinstance(r, dict) and isinstance(c, dict)]
+    if not pairs:
+        return {'top1_agreement': 0.0, 'confidence_mae': 0.0}
+
+    agreement = np.mean([r['label'] == c['label'] for r, c in pairs])
+    confidence_mae = np.mean([abs(r['confidence'] - c['confidence']) for r, c in pairs])
+    return {'top1_agreement': float(agreement), 'confidence_mae': float(confidence_mae)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare fp32 / int8 / onnx image classifier backends')
+    parser.add_argument('--images', required=True, help='Folder of sample dish images')
+    parser.add_argument('--model', default='nateraw/food', help='Hugging Face model name')
+    parser.add_argument('--backends', nargs='+', default=list(FoodImageClassifier.BACKENDS),
+                        choices=FoodImageClassifier.BACKENDS, help='Backends to compare')
+    parser.add_argument('--onnx-path', default=FoodImageClassifier.DEFAULT_ONNX_PATH,
+                        help='Where the ONNX graph is cached')
+    parser.add_argument('--batch-size', type=int, default=8, help='Batch size for the throughput pass')
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"No images found in {args.images}")
+        sys.exit(1)
+    print(f"Loaded {len(images)} images from {args.images}")
+
+    backends = ['fp32'] + [b for b in args.backends if b != 'fp32']
+    results = {}
+    for backend in backends:
+        print(f"\nBenchmarking backend: {backend}...")
+        classifier = FoodImageClassifier(args.model, backend=backend, onnx_path=args.onnx_path)
+        results[backend] = benchmark_backend(classifier, images, args.batch_size)
+        del classifier
+
+    reference = results['fp32']['predictions']
+
+    print("\n=== IMAGE BACKEND COMPARISON ===")
+    print(f"{'backend':<8} {'mean ms':>9} {'p95 ms':>9} {'img/s (batched)':>16} {'top1 agree':>11} {'conf MAE':>9}")
+    for backend in backends:
+        res = results[backend]
+        diff = compare(reference, res['predictions'])
+        print(f"{backend:<8} {res['latency_ms_mean']:>9.1f} {res['latency_ms_p95']:>9.1f} "
+              f"{res['batched_images_per_s']:>16.1f} {diff['top1_agreement']:>11.2%} {diff['confidence_mae']:>9.4f}")
+
+    disagreements = []
+    for backend in backends[1:]:
+        for name, ref, cand in zip(images, reference, results[backend]['predictions']):
+            if isinstance(ref, dict) and isinstance(cand, dict) and ref['label'] != cand['label']:
+                disagreements.append(f"  [{backend}] {name}: fp32={ref['label']} vs {cand['label']}")
+    if disagreements:
+        print("\nLabel disagreements:")
+        print("\n".join(disagreements))
+
+
+if __name__ == "__main__":
+    main()
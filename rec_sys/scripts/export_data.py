@@ -9,244 +9,451 @@ import os
 import sys
 import pandas as pd
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional
 import argparse
+import hashlib
+import uuid
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from server.src.columnar_io import (
+    PARQUET_AVAILABLE, read_frame, read_table, resolve_format, table_path, write_frame, write_table
+)
+
+if PARQUET_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
 try:
     from pymongo import MongoClient
+    from bson import ObjectId
     import motor.motor_asyncio
 except ImportError:
     print("Please install pymongo and motor: pip install pymongo motor")
     sys.exit(1)
 
 
+# Incremental mode: snapshot files are rebuilt from append-only partitions, keeping
+# the latest version of each row according to these keys.
+SNAPSHOT_KEYS = {
+    'interactions': ['user_id', 'dish_id', 'store_id', 'timestamp', 'event_type'],
+    'users': ['user_id'],
+    'dishes': ['dish_id'],
+    'stores': ['store_id'],
+}
+INTERACTION_COLUMNS = ['user_id', 'dish_id', 'store_id', 'timestamp', 'event_type', 'rating', 'quantity']
+if PARQUET_AVAILABLE:
+    INTERACTION_SCHEMA = pa.schema([
+        ('user_id', pa.string()),
+        ('dish_id', pa.string()),
+        ('store_id', pa.string()),
+        ('timestamp', pa.timestamp('ms')),
+        ('event_type', pa.string()),
+        ('rating', pa.float64()),
+        ('quantity', pa.int64()),
+    ])
+STATE_FILE = '_export_state.json'
+PARTITION_DIR = 'incremental'
+
+
 class DataExporter:
-    """Export data from MongoDB for recommendation system training."""
+    """
+    Export data from MongoDB for recommendation system training.
+
+    Related documents (order items, user references, stores, categories...) are
+    fetched with batched `$in` queries and `$group` aggregations instead of one
+    query per parent document, so the number of round trips depends on the
+    number of batches, not on the number of orders/users/dishes.
+    """
     
-    def __init__(self, mongodb_uri: str):
+    def __init__(self, mongodb_uri: str = None, db=None, batch_size: int = 1000, data_format: str = None):
         """
         Initialize data exporter.
         
         Args:
             mongodb_uri: MongoDB connection URI
+            db: Already connected database (e.g. a mongomock database in tests);
+                takes precedence over mongodb_uri
+            batch_size: Cursor batch size and max ids per `$in` query
+            data_format: 'parquet' (typed list/timestamp columns) or 'csv';
+                defaults to DATA_FORMAT, falling back to CSV without pyarrow
+        """
+        if db is None:
+            self.client = MongoClient(mongodb_uri)
+            self.db = self.client.get_default_database()
+        else:
+            self.client = None
+            self.db = db
+        self.batch_size = batch_size
+        self.data_format = resolve_format(data_format)
+
+    # --- Batched lookups ---
+
+    def _chunks(self, values: List[Any]):
+        for i in range(0, len(values), self.batch_size):
+            yield values[i:i + self.batch_size]
+
+    def _find(self, collection, query: Dict, projection: Dict = None):
+        return collection.find(query, projection).batch_size(self.batch_size)
+
+    def _group_by_parent(self, collection, parent_field: str, parent_ids: List[Any],
+                         projection: Dict) -> Dict[Any, List[Dict]]:
+        """Child documents (e.g. order_items) grouped by parent id, one query per batch of parents."""
+        grouped: Dict[Any, List[Dict]] = {}
+        unique_ids = list(dict.fromkeys(parent_ids))
+        for chunk in self._chunks(unique_ids):
+            for doc in self._find(collection, {parent_field: {'$in': chunk}}, {**projection, parent_field: 1}):
+                grouped.setdefault(doc[parent_field], []).append(doc)
+        return grouped
+
+    def _docs_by_id(self, collection, ids: List[Any], projection: Dict) -> Dict[Any, Dict]:
+        docs: Dict[Any, Dict] = {}
+        unique_ids = list(dict.fromkeys(i for i in ids if i is not None))
+        for chunk in self._chunks(unique_ids):
+            for doc in self._find(collection, {'_id': {'$in': chunk}}, projection):
+                docs[doc['_id']] = doc
+        return docs
+
+    def _count_by(self, collection, field: str, ids: List[Any]) -> Dict[Any, int]:
+        counts: Dict[Any, int] = {}
+        unique_ids = list(dict.fromkeys(ids))
+        for chunk in self._chunks(unique_ids):
+            pipeline = [
+                {'$match': {field: {'$in': chunk}}},
+                {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+            ]
+            for row in collection.aggregate(pipeline, batchSize=self.batch_size):
+                counts[row['_id']] = row['count']
+        return counts
+
+    @staticmethod
+    def _changed_since(since: Optional[datetime]) -> List[Dict]:
+        """Clauses matching documents modified after `since` (createdAt when updatedAt is absent)."""
+        if since is None:
+            return []
+        return [
+            {'updatedAt': {'$gt': since}},
+            {'updatedAt': {'$exists': False}, 'createdAt': {'$gt': since}},
+        ]
+
+    def _selection(self, base: Dict, since: Optional[datetime] = None, **id_filters: Optional[List[Any]]) -> Dict:
         """
-        self.client = MongoClient(mongodb_uri)
-        self.db = self.client.get_default_database()
+        `base` restricted to documents changed since `since` OR whose fields match
+        one of the given id lists (e.g. _id=[...]). No restriction for a full export.
+        """
+        if since is None and all(ids is None for ids in id_filters.values()):
+            return base
+        clauses = self._changed_since(since)
+        clauses += [{field: {'$in': list(ids)}} for field, ids in id_filters.items() if ids]
+        if not clauses:
+            # Incremental run with nothing changed: match no document
+            return {**base, '_id': {'$in': []}}
+        return {**base, '$or': clauses}
+
+    @staticmethod
+    def _point_to_lat_lon(location: Dict) -> tuple:
+        """GeoJSON Point format: [longitude, latitude]"""
+        if location and location.get('type') == 'Point' and location.get('coordinates'):
+            lon, lat = location['coordinates']
+            return lat, lon
+        return 0.0, 0.0
     
-    def export_interactions(self) -> pd.DataFrame:
+    def _iter_batches(self, cursor):
+        """Groups a cursor into lists of at most batch_size documents."""
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _iter_interaction_batches(self, since: Optional[datetime] = None):
         """
-        Export user-item interactions from orders, completed carts, and ratings.
-        
-        Returns:
-            DataFrame with interaction data
+        Yields interaction rows one cursor batch at a time: only one batch of
+        orders / carts / ratings and their items is held in memory.
         """
-        interactions = []
-        
         # Export from orders (only completed orders)
-        orders = self.db.orders.find({
+        orders = self._find(self.db.orders, self._selection({
             'status': 'done',  # Only completed orders
             'deleted': {'$ne': True}  # Exclude deleted orders
-        }, {
+        }, since), {
             'userId': 1,
             'storeId': 1,
             'createdAt': 1,
             'status': 1
         })
-        
-        for order in orders:
-            # Get order items for this order
-            order_items = self.db.order_items.find({
-                'orderId': order['_id']
-            }, {
-                'dishId': 1,
-                'quantity': 1,
-                'createdAt': 1
-            })
-            
-            for item in order_items:
-                interactions.append({
-                    'user_id': str(order['userId']),
-                    'dish_id': str(item['dishId']),
-                    'store_id': str(order['storeId']),
+        for batch in self._iter_batches(orders):
+            items_by_order = self._group_by_parent(
+                self.db.order_items, 'orderId', [o['_id'] for o in batch],
+                {'dishId': 1, 'quantity': 1, 'createdAt': 1}
+            )
+            yield [
+                {
+                    'user_id': order.get('userId'),
+                    'dish_id': item.get('dishId'),
+                    'store_id': order.get('storeId'),
                     'timestamp': order['createdAt'],
                     'event_type': 'order',
                     'rating': None,
                     'quantity': item.get('quantity', 1)
-                })
+                }
+                for order in batch for item in items_by_order.get(order['_id'], [])
+            ]
         
         # Export from completed carts (carts with completed=True)
-        completed_carts = self.db.carts.find({
+        completed_carts = self._find(self.db.carts, self._selection({
             'completed': True,
             'status': 'active'
-        }, {
+        }, since), {
             'userId': 1,
             'storeId': 1,
             'createdAt': 1
         })
-        
-        for cart in completed_carts:
-            # Get cart items for this cart
-            cart_items = self.db.cart_items.find({
-                'cartId': cart['_id']
-            }, {
-                'dishId': 1,
-                'quantity': 1,
-                'createdAt': 1
-            })
-            
-            for item in cart_items:
-                interactions.append({
-                    'user_id': str(cart['userId']),
-                    'dish_id': str(item['dishId']),
-                    'store_id': str(cart['storeId']),
+        for batch in self._iter_batches(completed_carts):
+            items_by_cart = self._group_by_parent(
+                self.db.cart_items, 'cartId', [c['_id'] for c in batch],
+                {'dishId': 1, 'quantity': 1, 'createdAt': 1}
+            )
+            yield [
+                {
+                    'user_id': cart.get('userId'),
+                    'dish_id': item.get('dishId'),
+                    'store_id': cart.get('storeId'),
                     'timestamp': cart['createdAt'],
                     'event_type': 'cart_completed',
                     'rating': None,
                     'quantity': item.get('quantity', 1)
-                })
+                }
+                for cart in batch for item in items_by_cart.get(cart['_id'], [])
+            ]
         
-        # Export from ratings
-        ratings = self.db.ratings.find({}, {
+        # Export from ratings: the rated dishes are the items of the rated order
+        ratings = self._find(self.db.ratings, self._selection({}, since), {
             'userId': 1,
             'storeId': 1,
+            'orderId': 1,
             'ratingValue': 1,
             'createdAt': 1
         })
+        for batch in self._iter_batches(ratings):
+            rated_order_ids = [r['orderId'] for r in batch if r.get('orderId') is not None]
+            existing_orders = self._docs_by_id(self.db.orders, rated_order_ids, {'_id': 1})
+            items_by_order = self._group_by_parent(self.db.order_items, 'orderId', list(existing_orders), {'dishId': 1})
+            yield [
+                {
+                    'user_id': rating.get('userId'),
+                    'dish_id': item.get('dishId'),
+                    'store_id': rating.get('storeId'),
+                    'timestamp': rating['createdAt'],
+                    'event_type': 'rating',
+                    'rating': rating.get('ratingValue'),
+                    'quantity': 1
+                }
+                for rating in batch if rating.get('orderId') in existing_orders
+                for item in items_by_order.get(rating['orderId'], [])
+            ]
+
+    @staticmethod
+    def _clean_interaction_rows(rows: List[Dict]) -> List[Dict]:
+        """Drops rows without ids and stringifies ObjectIds."""
+        cleaned = []
+        for row in rows:
+            if row['user_id'] is None or row['dish_id'] is None or row['store_id'] is None:
+                continue
+            row['user_id'], row['dish_id'], row['store_id'] = str(row['user_id']), str(row['dish_id']), str(row['store_id'])
+            cleaned.append(row)
+        return cleaned
+    
+    def export_interactions(self, since: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Export user-item interactions from orders, completed carts, and ratings.
+        Holds the whole result in memory; see stream_interactions for large histories.
         
-        for rating in ratings:
-            # Get the dish from the order to find dish_id
-            order = self.db.orders.find_one(
-                {'_id': rating['orderId']},
-                {'_id': 1}
-            )
-            if order:
-                # Get order items to find dish_id
-                order_items = self.db.order_items.find({
-                    'orderId': order['_id']
-                }, {'dishId': 1})
-                
-                for item in order_items:
-                    interactions.append({
-                        'user_id': str(rating['userId']),
-                        'dish_id': str(item['dishId']),
-                        'store_id': str(rating['storeId']),
-                        'timestamp': rating['createdAt'],
-                        'event_type': 'rating',
-                        'rating': rating.get('ratingValue'),
-                        'quantity': 1
-                    })
+        Args:
+            since: Only orders/carts/ratings created or updated after this time
+        
+        Returns:
+            DataFrame with interaction data
+        """
+        interactions = []
+        for rows in self._iter_interaction_batches(since):
+            interactions.extend(self._clean_interaction_rows(rows))
         
         # Convert to DataFrame
-        df = pd.DataFrame(interactions)
+        df = pd.DataFrame(interactions, columns=INTERACTION_COLUMNS)
         
-        # Remove duplicates and invalid entries
-        df = df.dropna(subset=['user_id', 'dish_id', 'store_id'])
+        # Remove duplicates
         df = df.drop_duplicates()
         
         # Convert timestamp to datetime
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         
         return df
+
+    def stream_interactions(self, path: str, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Export interactions with bounded memory: each cursor batch is converted to
+        an Arrow record batch (or a CSV chunk) and appended to `path` right away.
+        Duplicates are dropped with a set of 64-bit row hashes instead of keeping
+        the rows themselves.
+        
+        Args:
+            path: Output file (.parquet or .csv)
+            since: Only orders/carts/ratings created or updated after this time
+        
+        Returns:
+            Summary with row count, duplicates dropped, date range and event types
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        use_parquet = path.endswith('.parquet')
+        tmp_path = path + '.tmp'
+        seen_hashes = set()
+        summary = {'rows': 0, 'duplicates': 0, 'min_timestamp': None, 'max_timestamp': None, 'event_types': {}}
+        writer = pq.ParquetWriter(tmp_path, INTERACTION_SCHEMA, compression='zstd') if use_parquet else None
+        wrote_csv_header = False
+        
+        try:
+            for rows in self._iter_interaction_batches(since):
+                unique_rows = []
+                for row in self._clean_interaction_rows(rows):
+                    key = hashlib.blake2b(
+                        repr(tuple(row[c] for c in INTERACTION_COLUMNS)).encode('utf-8'), digest_size=8
+                    ).digest()
+                    if key in seen_hashes:
+                        summary['duplicates'] += 1
+                        continue
+                    seen_hashes.add(key)
+                    unique_rows.append(row)
+                if not unique_rows:
+                    continue
+                
+                chunk = pd.DataFrame(unique_rows, columns=INTERACTION_COLUMNS)
+                chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+                chunk['rating'] = pd.to_numeric(chunk['rating'], errors='coerce')
+                chunk['quantity'] = pd.to_numeric(chunk['quantity'], errors='coerce').fillna(1).astype('int64')
+                if use_parquet:
+                    writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=INTERACTION_SCHEMA, preserve_index=False))
+                else:
+                    # Explicit date format: per-chunk inference would drop the time on all-midnight chunks
+                    chunk.to_csv(tmp_path, mode='a' if wrote_csv_header else 'w', header=not wrote_csv_header,
+                                 index=False, date_format='%Y-%m-%d %H:%M:%S.%f')
+                    wrote_csv_header = True
+                
+                summary['rows'] += len(chunk)
+                batch_min, batch_max = chunk['timestamp'].min(), chunk['timestamp'].max()
+                if summary['min_timestamp'] is None or batch_min < summary['min_timestamp']:
+                    summary['min_timestamp'] = batch_min
+                if summary['max_timestamp'] is None or batch_max > summary['max_timestamp']:
+                    summary['max_timestamp'] = batch_max
+                for event_type, count in chunk['event_type'].value_counts().items():
+                    summary['event_types'][event_type] = summary['event_types'].get(event_type, 0) + int(count)
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        if not use_parquet and not wrote_csv_header:
+            pd.DataFrame(columns=INTERACTION_COLUMNS).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return summary
     
-    def export_users(self) -> pd.DataFrame:
+    def export_users(self, recent_orders_limit: int = 20, since: Optional[datetime] = None,
+                     user_ids: Optional[List[Any]] = None) -> pd.DataFrame:
         """
         Export user profiles with user references.
         
+        Args:
+            recent_orders_limit: Orders kept in recent_history_dishes
+            since: Only users whose profile or preferences changed after this time
+            user_ids: Users to export regardless of `since` (e.g. users with new orders)
+        
         Returns:
             DataFrame with user data
         """
         users = []
+        reference_fields = [
+            'allergy', 'dislike_taste', 'dislike_food', 'dislike_cooking_method', 'dislike_culture',
+            'like_taste', 'like_food', 'like_cooking_method', 'like_culture'
+        ]
         
         # Get users with their user_references
-        user_docs = self.db.users.find({}, {
+        changed_reference_ids = None
+        if since is not None:
+            changed_reference_ids = [
+                ref['_id'] for ref in self._find(self.db.user_references, self._selection({}, since), {'_id': 1})
+            ]
+        user_docs = list(self._find(self.db.users, self._selection(
+            {}, since, _id=user_ids, user_reference_id=changed_reference_ids
+        ), {
             '_id': 1,
             'name': 1,
             'email': 1,
             'gender': 1,
             'user_reference_id': 1,
             'createdAt': 1
-        })
-        
-        for user in user_docs:
-            user_ref_id = user.get('user_reference_id')
-            user_ref = None
-            
-            # Get user reference data if exists
-            if user_ref_id:
-                user_ref = self.db.user_references.find_one({'_id': user_ref_id})
-            
-            # Extract user reference data
-            allergy = []
-            dislike_taste = []
-            dislike_food = []
-            dislike_cooking_method = []
-            dislike_culture = []
-            like_taste = []
-            like_food = []
-            like_cooking_method = []
-            like_culture = []
-            
-            if user_ref:
-                allergy = user_ref.get('allergy', [])
-                dislike_taste = user_ref.get('dislike_taste', [])
-                dislike_food = user_ref.get('dislike_food', [])
-                dislike_cooking_method = user_ref.get('dislike_cooking_method', [])
-                dislike_culture = user_ref.get('dislike_culture', [])
-                like_taste = user_ref.get('like_taste', [])
-                like_food = user_ref.get('like_food', [])
-                like_cooking_method = user_ref.get('like_cooking_method', [])
-                like_culture = user_ref.get('like_culture', [])
-            
-            # Get user's recent order history for recent_history_dishes
-            recent_orders = self.db.orders.find({
-                'userId': user['_id'],
+        }))
+        user_refs = self._docs_by_id(
+            self.db.user_references, [u.get('user_reference_id') for u in user_docs], None
+        )
+        
+        # Recent order history for recent_history_dishes: newest orders first,
+        # keeping at most `recent_orders_limit` per user
+        recent_orders: Dict[Any, List[Any]] = {}
+        for chunk in self._chunks([u['_id'] for u in user_docs]):
+            cursor = self._find(self.db.orders, {
+                'userId': {'$in': chunk},
                 'status': 'done',
                 'deleted': {'$ne': True}
-            }).sort('createdAt', -1).limit(20)
-            
-            recent_dishes = []
-            for order in recent_orders:
-                order_items = self.db.order_items.find({
-                    'orderId': order['_id']
-                }, {'dishId': 1})
-                for item in order_items:
-                    recent_dishes.append(str(item['dishId']))
+            }, {'userId': 1, 'createdAt': 1}).sort('createdAt', -1)
+            for order in cursor:
+                user_orders = recent_orders.setdefault(order['userId'], [])
+                if len(user_orders) < recent_orders_limit:
+                    user_orders.append(order['_id'])
+        items_by_order = self._group_by_parent(
+            self.db.order_items, 'orderId',
+            [oid for order_ids in recent_orders.values() for oid in order_ids], {'dishId': 1}
+        )
+        
+        for user in user_docs:
+            user_ref = user_refs.get(user.get('user_reference_id')) or {}
+            recent_dishes = [
+                str(item['dishId'])
+                for order_id in recent_orders.get(user['_id'], [])
+                for item in items_by_order.get(order_id, [])
+            ]
             
             users.append({
                 'user_id': str(user['_id']),
                 'name': user.get('name', ''),
                 'email': user.get('email', ''),
                 'gender': user.get('gender', 'unknown'),
-                'allergy': json.dumps(allergy) if allergy else json.dumps([]),
-                'dislike_taste': json.dumps(dislike_taste) if dislike_taste else json.dumps([]),
-                'dislike_food': json.dumps(dislike_food) if dislike_food else json.dumps([]),
-                'dislike_cooking_method': json.dumps(dislike_cooking_method) if dislike_cooking_method else json.dumps([]),
-                'dislike_culture': json.dumps(dislike_culture) if dislike_culture else json.dumps([]),
-                'like_taste': json.dumps(like_taste) if like_taste else json.dumps([]),
-                'like_food': json.dumps(like_food) if like_food else json.dumps([]),
-                'like_cooking_method': json.dumps(like_cooking_method) if like_cooking_method else json.dumps([]),
-                'like_culture': json.dumps(like_culture) if like_culture else json.dumps([]),
-                'recent_history_dishes': json.dumps(recent_dishes) if recent_dishes else json.dumps([]),
+                **{field: list(user_ref.get(field) or []) for field in reference_fields},
+                'recent_history_dishes': recent_dishes,
                 'created_at': user.get('createdAt')
             })
         
         return pd.DataFrame(users)
     
-    def export_dishes(self) -> pd.DataFrame:
+    def export_dishes(self, since: Optional[datetime] = None, dish_ids: Optional[List[Any]] = None,
+                      store_ids: Optional[List[Any]] = None) -> pd.DataFrame:
         """
         Export dish information with proper tags and categories.
         
+        Args:
+            since: Only dishes changed after this time
+            dish_ids: Dishes to export regardless of `since` (e.g. new order_times)
+            store_ids: Export every dish of these stores (e.g. new store ratings)
+        
         Returns:
             DataFrame with dish data
         """
         dishes = []
         
         # Get dishes from dishes collection
-        dish_docs = self.db.dishes.find({}, {
+        dish_docs = list(self._find(self.db.dishes, self._selection({}, since, _id=dish_ids, storeId=store_ids), {
             '_id': 1,
             'name': 1,
             'storeId': 1,
@@ -259,61 +466,45 @@ class DataExporter:
             'description': 1,
             'stockStatus': 1,
             'createdAt': 1
-        })
+        }))
+        store_ids = [d['storeId'] for d in dish_docs]
+        
+        # Store locations and category names
+        stores = self._docs_by_id(self.db.stores, store_ids, {'location': 1})
+        categories = self._docs_by_id(self.db.categories, [d.get('category') for d in dish_docs], {'name': 1})
+        
+        # Order times (popularity) per dish
+        order_times = self._count_by(self.db.order_items, 'dishId', [d['_id'] for d in dish_docs])
+        
+        # Average (non-empty) rating per store
+        store_ratings: Dict[Any, float] = {}
+        for chunk in self._chunks(list(dict.fromkeys(store_ids))):
+            pipeline = [
+                {'$match': {'storeId': {'$in': chunk}, 'ratingValue': {'$nin': [None, 0]}}},
+                {'$group': {'_id': '$storeId', 'avg_rating': {'$avg': '$ratingValue'}}},
+            ]
+            for row in self.db.ratings.aggregate(pipeline, batchSize=self.batch_size):
+                store_ratings[row['_id']] = row['avg_rating']
         
         for dish in dish_docs:
-            # Get store location
-            store = self.db.stores.find_one(
-                {'_id': dish['storeId']},
-                {'location': 1}
-            )
-            
-            # Extract store location
-            lat = 0.0
-            lon = 0.0
-            if store and store.get('location'):
-                location = store['location']
-                if location.get('type') == 'Point' and location.get('coordinates'):
-                    # GeoJSON Point format: [longitude, latitude]
-                    lon, lat = location['coordinates']
-            
-            # Get category name
-            category_name = 'unknown'
-            if dish.get('category'):
-                category = self.db.categories.find_one(
-                    {'_id': dish['category']},
-                    {'name': 1}
-                )
-                if category:
-                    category_name = category.get('name', 'unknown')
-            
-            # Calculate order times (popularity) from order_items
-            order_times = self.db.order_items.count_documents({
-                'dishId': dish['_id']
-            })
-            
-            # Calculate average rating from ratings
-            ratings = self.db.ratings.find({
-                'storeId': dish['storeId']
-            }, {'ratingValue': 1})
-            
-            rating_values = [r.get('ratingValue', 0) for r in ratings if r.get('ratingValue')]
-            avg_rating = sum(rating_values) / len(rating_values) if rating_values else 3.0
+            lat, lon = self._point_to_lat_lon((stores.get(dish['storeId']) or {}).get('location'))
+            category = categories.get(dish.get('category')) if dish.get('category') else None
+            category_name = category.get('name', 'unknown') if category else 'unknown'
             
             dishes.append({
                 'dish_id': str(dish['_id']),
                 'store_id': str(dish['storeId']),
                 'name': dish.get('name', ''),
-                'dish_tags': json.dumps(dish.get('dishTags', [])),
-                'taste_tags': json.dumps(dish.get('tasteTags', [])),
-                'cooking_method_tags': json.dumps(dish.get('cookingMethodtags', [])),
-                'culture_tags': json.dumps(dish.get('cultureTags', [])),
+                'dish_tags': [str(t) for t in dish.get('dishTags') or []],
+                'taste_tags': [str(t) for t in dish.get('tasteTags') or []],
+                'cooking_method_tags': [str(t) for t in dish.get('cookingMethodtags') or []],
+                'culture_tags': [str(t) for t in dish.get('cultureTags') or []],
                 'price': float(dish.get('price', 0.0)),
                 'category': category_name,
                 'description': dish.get('description', ''),
                 'stock_status': dish.get('stockStatus', 'available'),
-                'order_times': order_times,
-                'average_rating': avg_rating,
+                'order_times': order_times.get(dish['_id'], 0),
+                'average_rating': store_ratings.get(dish['storeId'], 3.0),
                 'location_lat': lat,
                 'location_lon': lon,
                 'created_at': dish.get('createdAt')
@@ -321,17 +512,20 @@ class DataExporter:
         
         return pd.DataFrame(dishes)
     
-    def export_stores(self) -> pd.DataFrame:
+    def export_stores(self, since: Optional[datetime] = None) -> pd.DataFrame:
         """
         Export store information with proper location handling.
         
+        Args:
+            since: Only stores changed after this time
+        
         Returns:
             DataFrame with store data
         """
         stores = []
         
         # Get stores from stores collection
-        store_docs = self.db.stores.find({}, {
+        store_docs = list(self._find(self.db.stores, self._selection({}, since), {
             '_id': 1,
             'name': 1,
             'description': 1,
@@ -343,28 +537,22 @@ class DataExporter:
             'openHour': 1,
             'closeHour': 1,
             'createdAt': 1
-        })
+        }))
+        system_categories_by_id = self._docs_by_id(
+            self.db.system_categories,
+            [cat_id for store in store_docs for cat_id in (store.get('systemCategoryId') or [])],
+            {'name': 1}
+        )
         
         for store in store_docs:
-            # Extract location from GeoJSON
-            lat = 0.0
-            lon = 0.0
-            if store.get('location'):
-                location = store['location']
-                if location.get('type') == 'Point' and location.get('coordinates'):
-                    # GeoJSON Point format: [longitude, latitude]
-                    lon, lat = location['coordinates']
+            lat, lon = self._point_to_lat_lon(store.get('location'))
             
-            # Get system category names
-            system_categories = []
-            if store.get('systemCategoryId'):
-                for cat_id in store['systemCategoryId']:
-                    category = self.db.system_categories.find_one(
-                        {'_id': cat_id},
-                        {'name': 1}
-                    )
-                    if category:
-                        system_categories.append(category.get('name', ''))
+            # System category names, in the store's own order
+            system_categories = [
+                system_categories_by_id[cat_id].get('name', '')
+                for cat_id in (store.get('systemCategoryId') or [])
+                if cat_id in system_categories_by_id
+            ]
             
             stores.append({
                 'store_id': str(store['_id']),
@@ -373,7 +561,7 @@ class DataExporter:
                 'location_lat': lat,
                 'location_lon': lon,
                 'address_full': store.get('address_full', ''),
-                'system_categories': json.dumps(system_categories) if system_categories else json.dumps([]),
+                'system_categories': system_categories,
                 'status': store.get('status', 'approve'),
                 'open_status': store.get('openStatus', 'open'),
                 'open_hour': store.get('openHour', '08:00'),
@@ -383,41 +571,17 @@ class DataExporter:
         
         return pd.DataFrame(stores)
     
-    def export_all(self, output_dir: str) -> None:
+    def export_tags(self) -> pd.DataFrame:
         """
-        Export all data to CSV files.
+        Export all tag collections into one table.
         
-        Args:
-            output_dir: Directory to save exported data
+        Returns:
+            DataFrame with tag data
         """
-        os.makedirs(output_dir, exist_ok=True)
-        
-        print("Exporting interactions...")
-        interactions_df = self.export_interactions()
-        interactions_df.to_csv(os.path.join(output_dir, 'interactions.csv'), index=False)
-        print(f"Exported {len(interactions_df)} interactions")
-        
-        print("Exporting users...")
-        users_df = self.export_users()
-        users_df.to_csv(os.path.join(output_dir, 'users.csv'), index=False)
-        print(f"Exported {len(users_df)} users")
-        
-        print("Exporting dishes...")
-        dishes_df = self.export_dishes()
-        dishes_df.to_csv(os.path.join(output_dir, 'dishes.csv'), index=False)
-        print(f"Exported {len(dishes_df)} dishes")
-        
-        print("Exporting stores...")
-        stores_df = self.export_stores()
-        stores_df.to_csv(os.path.join(output_dir, 'stores.csv'), index=False)
-        print(f"Exported {len(stores_df)} stores")
-        
-        # Create tags.csv from all tag collections
-        print("Creating tags.csv...")
         all_tags = []
         
         # Get food tags
-        food_tags = self.db.food_tags.find({}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
+        food_tags = self._find(self.db.food_tags, {}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
         for tag in food_tags:
             all_tags.append({
                 'tag_id': str(tag['_id']),
@@ -427,7 +591,7 @@ class DataExporter:
             })
         
         # Get taste tags
-        taste_tags = self.db.taste_tags.find({}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
+        taste_tags = self._find(self.db.taste_tags, {}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
         for tag in taste_tags:
             all_tags.append({
                 'tag_id': str(tag['_id']),
@@ -437,7 +601,7 @@ class DataExporter:
             })
         
         # Get cooking method tags
-        cooking_method_tags = self.db.cooking_method_tags.find({}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
+        cooking_method_tags = self._find(self.db.cooking_method_tags, {}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
         for tag in cooking_method_tags:
             all_tags.append({
                 'tag_id': str(tag['_id']),
@@ -447,7 +611,7 @@ class DataExporter:
             })
         
         # Get culture tags
-        culture_tags = self.db.culture_tags.find({}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
+        culture_tags = self._find(self.db.culture_tags, {}, {'_id': 1, 'name': 1, 'tag_category_id': 1})
         for tag in culture_tags:
             all_tags.append({
                 'tag_id': str(tag['_id']),
@@ -456,23 +620,211 @@ class DataExporter:
                 'tag_category_id': str(tag.get('tag_category_id', ''))
             })
         
-        tags_df = pd.DataFrame(all_tags)
-        tags_df.to_csv(os.path.join(output_dir, 'tags.csv'), index=False)
+        return pd.DataFrame(all_tags)
+    
+    def export_all(self, output_dir: str, stream: bool = False) -> None:
+        """
+        Export all data to Parquet (typed columns) or CSV files.
+        
+        Args:
+            output_dir: Directory to save exported data
+            stream: Write interactions batch by batch (bounded memory)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        
+        print("Exporting interactions...")
+        if stream:
+            interactions_summary = self.stream_interactions(
+                os.path.join(output_dir, f'interactions.{self.data_format}')
+            )
+            print(f"Exported {interactions_summary['rows']} interactions "
+                  f"({interactions_summary['duplicates']} duplicates dropped)")
+        else:
+            interactions_df = self.export_interactions()
+            write_table(interactions_df, output_dir, 'interactions', self.data_format)
+            interactions_summary = {
+                'rows': len(interactions_df),
+                'min_timestamp': interactions_df['timestamp'].min(),
+                'max_timestamp': interactions_df['timestamp'].max(),
+                'event_types': interactions_df['event_type'].value_counts().to_dict(),
+            }
+            print(f"Exported {len(interactions_df)} interactions")
+        
+        print("Exporting users...")
+        users_df = self.export_users()
+        write_table(users_df, output_dir, 'users', self.data_format)
+        print(f"Exported {len(users_df)} users")
+        
+        print("Exporting dishes...")
+        dishes_df = self.export_dishes()
+        write_table(dishes_df, output_dir, 'dishes', self.data_format)
+        print(f"Exported {len(dishes_df)} dishes")
+        
+        print("Exporting stores...")
+        stores_df = self.export_stores()
+        write_table(stores_df, output_dir, 'stores', self.data_format)
+        print(f"Exported {len(stores_df)} stores")
+        
+        print("Creating tags table...")
+        tags_df = self.export_tags()
+        write_table(tags_df, output_dir, 'tags', self.data_format)
         print(f"Exported {len(tags_df)} unique tags")
         
         print(f"\nData export completed! Files saved to {output_dir}")
         
         # Print summary statistics
         print("\n=== EXPORT SUMMARY ===")
-        print(f"Interactions: {len(interactions_df)}")
+        print(f"Interactions: {interactions_summary['rows']}")
         print(f"Users: {len(users_df)}")
         print(f"Dishes: {len(dishes_df)}")
         print(f"Stores: {len(stores_df)}")
         print(f"Tags: {len(tags_df)}")
         
-        if len(interactions_df) > 0:
-            print(f"Date range: {interactions_df['timestamp'].min()} to {interactions_df['timestamp'].max()}")
-            print(f"Event types: {interactions_df['event_type'].value_counts().to_dict()}")
+        if interactions_summary['rows'] > 0:
+            print(f"Date range: {interactions_summary['min_timestamp']} to {interactions_summary['max_timestamp']}")
+            print(f"Event types: {interactions_summary['event_types']}")
+    
+    # --- Incremental export ---
+    
+    @staticmethod
+    def _id_variants(values) -> List[Any]:
+        """Exported ids are strings; match both the string and the ObjectId form in queries."""
+        ids = []
+        for value in pd.unique(pd.Series(values).dropna()):
+            ids.append(value)
+            if ObjectId.is_valid(value):
+                ids.append(ObjectId(value))
+        return ids
+    
+    @staticmethod
+    def _load_state(output_dir: str) -> Dict[str, Any]:
+        path = os.path.join(output_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    @staticmethod
+    def _save_state(output_dir: str, state: Dict[str, Any]) -> None:
+        path = os.path.join(output_dir, STATE_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(path + '.tmp', path)
+    
+    def _partition_name(self, output_dir: str, state: Dict[str, Any], run_start: datetime) -> str:
+        """
+        Partition file name for this run: its start time to the microsecond, never
+        a name already written or compacted (a second run in the same instant would
+        otherwise overwrite a partition the snapshot already contains).
+        """
+        stem = f"part-{run_start.strftime('%Y%m%dT%H%M%S%f')}"
+        taken = {f for names in state.get('compacted', {}).values() for f in names}
+        name = f"{stem}.{self.data_format}"
+        while name in taken or any(
+            os.path.exists(os.path.join(output_dir, PARTITION_DIR, table, name)) for table in SNAPSHOT_KEYS
+        ):
+            name = f"{stem}-{uuid.uuid4().hex[:8]}.{self.data_format}"
+        return name
+    
+    def export_incremental(self, output_dir: str, overlap_seconds: int = 300, stream: bool = False) -> None:
+        """
+        Export only records changed since the last run into append-only partitions
+        (incremental/<table>/part-<time>.<format>), then compact them into the snapshot.
+        
+        The watermark is the start time of the previous successful run; documents
+        are selected by `updatedAt` (or `createdAt` when absent) after the watermark
+        minus `overlap_seconds`, to tolerate clock skew. Rows exported twice are
+        de-duplicated during compaction. Derived columns are refreshed too: users
+        with new orders, dishes with new order items and dishes of stores with new
+        ratings are re-exported. Deleted documents are only removed by a full export.
+        
+        Args:
+            output_dir: Directory holding the snapshot files
+            overlap_seconds: Safety overlap subtracted from the watermark
+            stream: Bounded-memory interactions export for the initial full run
+        """
+        state = self._load_state(output_dir)
+        snapshots_exist = all(table_path(output_dir, name) for name in SNAPSHOT_KEYS)
+        run_start = datetime.now(timezone.utc)
+        
+        if not state.get('watermark') or not snapshots_exist:
+            print("No previous export state found, running a full export...")
+            self.export_all(output_dir, stream=stream)
+            # Older partitions are already contained in the fresh full snapshot
+            compacted = {}
+            for name in SNAPSHOT_KEYS:
+                partition_dir = os.path.join(output_dir, PARTITION_DIR, name)
+                if os.path.isdir(partition_dir):
+                    compacted[name] = sorted(f for f in os.listdir(partition_dir) if f.startswith('part-'))
+            self._save_state(output_dir, {'watermark': run_start.isoformat(), 'compacted': compacted})
+            return
+        
+        watermark = datetime.fromisoformat(state['watermark'])
+        if watermark.tzinfo is None:
+            # State files written before watermarks were timezone-aware hold naive UTC
+            watermark = watermark.replace(tzinfo=timezone.utc)
+        since = watermark - timedelta(seconds=overlap_seconds)
+        print(f"Incremental export of changes since {since.isoformat()}...")
+        
+        interactions_df = self.export_interactions(since=since)
+        new_ratings = interactions_df[interactions_df['event_type'] == 'rating']
+        changes = {
+            'interactions': interactions_df,
+            'users': self.export_users(since=since, user_ids=self._id_variants(interactions_df['user_id'])),
+            'dishes': self.export_dishes(
+                since=since,
+                dish_ids=self._id_variants(interactions_df['dish_id']),
+                store_ids=self._id_variants(new_ratings['store_id'])
+            ),
+            'stores': self.export_stores(since=since),
+        }
+        
+        partition_name = self._partition_name(output_dir, state, run_start)
+        for name, df in changes.items():
+            if df.empty:
+                continue
+            partition_dir = os.path.join(output_dir, PARTITION_DIR, name)
+            os.makedirs(partition_dir, exist_ok=True)
+            write_frame(df, os.path.join(partition_dir, partition_name))
+            print(f"  {name}: {len(df)} changed rows -> {partition_name}")
+        
+        # Tags are small reference tables: always refreshed in full
+        write_table(self.export_tags(), output_dir, 'tags', self.data_format)
+        
+        self.compact(output_dir, state)
+        state['watermark'] = run_start.isoformat()
+        self._save_state(output_dir, state)
+    
+    def compact(self, output_dir: str, state: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Merge partitions not yet compacted into the snapshot files, keeping the
+        latest version of each row (see SNAPSHOT_KEYS). Partitions are kept on disk;
+        the state file records which ones are already part of the snapshot.
+        """
+        state = state if state is not None else self._load_state(output_dir)
+        compacted = state.setdefault('compacted', {})
+        
+        for name, keys in SNAPSHOT_KEYS.items():
+            partition_dir = os.path.join(output_dir, PARTITION_DIR, name)
+            if not os.path.isdir(partition_dir):
+                continue
+            done = set(compacted.get(name, []))
+            pending = sorted(f for f in os.listdir(partition_dir) if f.startswith('part-') and f not in done)
+            if not pending:
+                continue
+            
+            frames = [read_table(output_dir, name)] if table_path(output_dir, name) else []
+            frames += [read_frame(os.path.join(partition_dir, f)) for f in pending]
+            merged = pd.concat(frames, ignore_index=True)
+            if 'timestamp' in keys:
+                merged['timestamp'] = pd.to_datetime(merged['timestamp'], format='ISO8601')
+            merged = merged.drop_duplicates(subset=keys, keep='last')
+            
+            snapshot_path = write_table(merged, output_dir, name, self.data_format)
+            compacted[name] = sorted(done | set(pending))
+            print(f"Compacted {len(pending)} partition(s) into {os.path.basename(snapshot_path)} ({len(merged)} rows)")
+        
+        self._save_state(output_dir, state)
 
 
 def main():
@@ -482,14 +834,25 @@ def main():
                        help='MongoDB connection URI')
     parser.add_argument('--output', default='data', 
                        help='Output directory for exported data')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                       help='Cursor batch size and max ids per $in query')
+    parser.add_argument('--format', choices=['parquet', 'csv'], default=None,
+                       help='Output format (default: DATA_FORMAT or parquet, CSV if pyarrow is missing)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Write interactions batch by batch to bound memory on large histories')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Export only changes since the last run and compact them into the snapshot')
     
     args = parser.parse_args()
     
     # Create data exporter
-    exporter = DataExporter(args.mongodb_uri)
+    exporter = DataExporter(args.mongodb_uri, batch_size=args.batch_size, data_format=args.format)
     
     # Export all data
-    exporter.export_all(args.output)
+    if args.incremental:
+        exporter.export_incremental(args.output, stream=args.stream)
+    else:
+        exporter.export_all(args.output, stream=args.stream)
 
 
 if __name__ == "__main__":
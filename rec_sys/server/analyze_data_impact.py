@@ -32,7 +32,7 @@ def analyze_learning_dynamics():
     dish_id_to_idx = {d: i for i, d in enumerate(dish_ids)} # Map ID to Matrix Index
     
     # 2. Find the "Richest" User (Most interactions)
-    interactions = evaluator.data['interactions']
+    interactions = evaluator.load_interactions()
     user_counts = interactions.groupby('user_id').size()
     target_user_id = user_counts.idxmax()
     total_interactions = user_counts[target_user_id]
@@ -0,0 +1,361 @@
+# job_queue.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# Lifecycle states (the fine-grained pipeline phase lives in `status`, e.g. EXPORTING)
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+TERMINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job when cancellation was requested."""
+
+
+class JobLost(JobCancelled):
+    """Raised inside a running job that is no longer RUNNING in the store (e.g. failed by recover_stale)."""
+
+
+class JobStore:
+    """
+    Durable job records in SQLite. Every operation opens its own short-lived
+    connection, so the store can be used from the API event loop, the worker
+    thread and several API worker processes at once.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            state TEXT NOT NULL,
+            status TEXT NOT NULL,
+            message TEXT,
+            error TEXT,
+            result TEXT,
+            progress REAL NOT NULL DEFAULT 0,
+            steps TEXT NOT NULL DEFAULT '{}',
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            start_time TEXT,
+            end_time TEXT,
+            last_updated TEXT NOT NULL,
+            heartbeat_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, created_at);
+    """
+
+    def __init__(self, db_path: str, stale_after_seconds: float = 120.0):
+        self.db_path = db_path
+        self.stale_after_seconds = stale_after_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["steps"] = json.loads(job["steps"]) if job["steps"] else {}
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job.pop("heartbeat_at", None)
+        return job
+
+    # --- Queries ---
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 50, state: str = None, job_type: str = None) -> List[Dict[str, Any]]:
+        query, params = "SELECT * FROM jobs WHERE 1=1", []
+        if state:
+            query += " AND state = ?"
+            params.append(state)
+        if job_type:
+            query += " AND type = ?"
+            params.append(job_type)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            return [self._to_dict(r) for r in conn.execute(query, params).fetchall()]
+
+    def has_active(self, job_type: str = None) -> bool:
+        query = "SELECT 1 FROM jobs WHERE state IN (?, ?)"
+        params: list = [PENDING, RUNNING]
+        if job_type:
+            query += " AND type = ?"
+            params.append(job_type)
+        with self._connect() as conn:
+            return conn.execute(query + " LIMIT 1", params).fetchone() is not None
+
+    # --- Mutations ---
+
+    def create(self, job_type: str) -> Dict[str, Any]:
+        now = datetime.now().isoformat()
+        job_id = f"{job_type}_{uuid.uuid4()}"
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, type, state, status, created_at, last_updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, PENDING, PENDING, now, now),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, only_if_state: Optional[str] = None, **fields) -> bool:
+        """
+        Writes `fields` and refreshes the heartbeat. With `only_if_state` the row is
+        only touched while the job is still in that state; returns whether it was.
+        """
+        if not fields:
+            return True
+        for key in ("result", "steps"):
+            if key in fields and not isinstance(fields[key], str):
+                fields[key] = json.dumps(fields[key], ensure_ascii=False, default=str)
+        fields["last_updated"] = datetime.now().isoformat()
+        fields["heartbeat_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        query, params = f"UPDATE jobs SET {assignments} WHERE job_id = ?", [*fields.values(), job_id]
+        if only_if_state is not None:
+            query += " AND state = ?"
+            params.append(only_if_state)
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount > 0
+
+    def heartbeat(self, job_id: str) -> bool:
+        """
+        Marks a running job alive and returns whether it should stop: cancellation
+        was requested, or it is no longer RUNNING (failed by recover_stale).
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND state = ?", (time.time(), job_id, RUNNING)
+            )
+            row = conn.execute("SELECT state, cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is None or row["state"] != RUNNING or bool(row["cancel_requested"])
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically moves the oldest PENDING job to RUNNING, but only when no other
+        job is running (one pipeline at a time, across all API worker processes).
+        """
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT 1 FROM jobs WHERE state = ? LIMIT 1", (RUNNING,)).fetchone():
+                    conn.execute("COMMIT")
+                    return None
+                row = conn.execute(
+                    "SELECT job_id FROM jobs WHERE state = ? ORDER BY created_at LIMIT 1", (PENDING,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET state = ?, start_time = ?, last_updated = ?, heartbeat_at = ? WHERE job_id = ?",
+                    (RUNNING, now, now, time.time(), row["job_id"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["job_id"])
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Pending jobs are cancelled immediately; running jobs are flagged for the worker."""
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, status = ?, end_time = ?, last_updated = ?, message = ? "
+                "WHERE job_id = ? AND state = ?",
+                (CANCELLED, CANCELLED, now, now, "Cancelled before start.", job_id, PENDING),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, last_updated = ? WHERE job_id = ? AND state = ?",
+                (now, job_id, RUNNING),
+            )
+        return self.get(job_id)
+
+    def recover_stale(self) -> int:
+        """
+        Fails RUNNING jobs whose worker stopped heart-beating (process killed or
+        server restarted), so a dead job can never block the queue forever.
+        """
+        cutoff = time.time() - self.stale_after_seconds
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, status = ?, error = ?, end_time = ?, last_updated = ? "
+                "WHERE state = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (FAILED, FAILED, "Interrupted: worker stopped responding (restart?).", now, now, RUNNING, cutoff),
+            )
+            return cursor.rowcount
+
+    def prune(self, keep: int):
+        """Keeps only the `keep` most recent finished jobs."""
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE state IN ({','.join('?' * len(TERMINAL_STATES))}) AND job_id NOT IN ("
+                f"  SELECT job_id FROM jobs WHERE state IN ({','.join('?' * len(TERMINAL_STATES))})"
+                "   ORDER BY created_at DESC LIMIT ?)",
+                (*TERMINAL_STATES, *TERMINAL_STATES, keep),
+            )
+
+
+class JobQueue:
+    """
+    Single background worker that runs queued MLOps jobs one at a time.
+
+    Handlers are called as `handler(job_id, update_status, is_cancelled)`:
+      - update_status(job_id, status, message=None, result=None, error=None, progress=None)
+        records the current phase; each new phase is timed as a step. It raises
+        JobCancelled when cancellation was requested (JobLost when the job was
+        failed behind its back), so every update is a checkpoint.
+      - is_cancelled() can be polled from long-running loops / subprocess waits.
+
+    While a handler runs, a keep-alive thread refreshes the job's heartbeat every
+    `heartbeat_interval` seconds (default: a quarter of the store's stale timeout),
+    so steps that never call back are not mistaken for a dead worker.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Callable], history_limit: int = 200,
+                 poll_interval: float = 2.0, heartbeat_interval: Optional[float] = None):
+        self.store = store
+        self.handlers = handlers
+        self.history_limit = history_limit
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval or max(store.stale_after_seconds / 4, 1.0)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.store.recover_stale()
+        self._thread = threading.Thread(target=self._run, name="job-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def submit(self, job_type: str) -> Dict[str, Any]:
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = self.store.create(job_type)
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.request_cancel(job_id)
+
+    # --- Worker ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.store.recover_stale()
+                job = self.store.claim_next()
+            except Exception as e:
+                print(f"[job-queue] Store error: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._execute(job)
+            try:
+                self.store.prune(self.history_limit)
+            except Exception as e:
+                print(f"[job-queue] Prune failed: {e}")
+
+    def _keep_alive(self, job_id: str, done: threading.Event):
+        while not done.wait(self.heartbeat_interval):
+            try:
+                self.store.heartbeat(job_id)
+            except Exception as e:
+                print(f"[job-queue] Heartbeat failed for {job_id}: {e}")
+
+    def _execute(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        steps: Dict[str, Dict[str, Any]] = {}
+        current = {"status": None, "started": None}
+
+        def close_step(now: float):
+            if current["status"] is not None:
+                steps[current["status"]]["seconds"] = round(now - current["started"], 3)
+
+        def is_cancelled() -> bool:
+            return self.store.heartbeat(job_id)
+
+        def update_status(job_id_: str, status: str, message: str = None, result: Any = None,
+                          error: str = None, progress: float = None):
+            now = time.time()
+            fields: Dict[str, Any] = {"status": status}
+            if status != current["status"]:
+                close_step(now)
+                current["status"], current["started"] = status, now
+                steps[status] = {"started_at": datetime.now().isoformat(), "seconds": None}
+                fields["steps"] = steps
+            if message: fields["message"] = message
+            if result is not None: fields["result"] = result
+            if error: fields["error"] = error
+            if progress is not None: fields["progress"] = round(float(progress), 1)
+            if status in TERMINAL_STATES:
+                close_step(now)
+                fields["steps"] = steps
+            if not self.store.update(job_id_, only_if_state=RUNNING, **fields):
+                raise JobLost(f"Job {job_id_} is no longer running.")
+            print(f"Job {job_id_} updated: {status}")
+
+            if status not in TERMINAL_STATES and is_cancelled():
+                raise JobCancelled(f"Job {job_id_} was cancelled.")
+
+        handler = self.handlers[job["type"]]
+        final_state, final_fields = COMPLETED, {"progress": 100.0}
+        done = threading.Event()
+        keep_alive = threading.Thread(
+            target=self._keep_alive, args=(job_id, done), name=f"job-heartbeat-{job_id}", daemon=True
+        )
+        keep_alive.start()
+        try:
+            handler(job_id, update_status, is_cancelled)
+        except JobCancelled as e:
+            final_state, final_fields = CANCELLED, {"message": str(e)}
+        except Exception as e:
+            print(f"[job-queue] Job {job_id} failed: {e}")
+            final_state, final_fields = FAILED, {}
+            if not (self.store.get(job_id) or {}).get("error"):
+                final_fields["error"] = str(e)
+        finally:
+            done.set()
+            keep_alive.join()
+
+        # A job failed externally (e.g. by recover_stale) keeps that state
+        close_step(time.time())
+        finished = self.store.update(
+            job_id, only_if_state=RUNNING, state=final_state, status=final_state, steps=steps,
+            end_time=datetime.now().isoformat(), **final_fields
+        )
+        if not finished:
+            print(f"[job-queue] Job {job_id} was no longer running; result discarded.")
+            return
+        print(f"[{job_id}] Job finished: {final_state}")
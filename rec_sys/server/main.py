@@ -1,36 +1,44 @@
 import os
 import sys
-import io
 import json
-import math
-import uuid
-import torch
+import traceback
 import numpy as np
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+from typing import Optional, List, Dict, Any, TYPE_CHECKING
 from contextlib import asynccontextmanager
-from PIL import Image
 
 # --- Third Party Imports ---
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request, Response
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.status import HTTP_504_GATEWAY_TIMEOUT
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
-from transformers import AutoFeatureExtractor, AutoModelForImageClassification
 from dotenv import load_dotenv
 
 # --- Local Imports ---
 # Add parent directory to path to ensure imports work
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from server.src.evaluate import ModelEvaluator
-from server.src.llm_service import LLMService
+# Heavy modules (torch, transformers, google.genai) are imported lazily by the
+# service loaders below so the API can start serving before they are ready.
+from server.src.micro_batcher import MicroBatcher
+from server.src.body_limit import BodySizeLimitMiddleware
+from server.src.api_response import DishResponseTable, FastJSONResponse
+from server.src.image_cache import ImagePredictionCache
+from server.src.service_readiness import ServiceReadiness
+from server.src.shared_artifacts import configure_torch_threads
+
+if TYPE_CHECKING:
+    from server.src.evaluate import ModelEvaluator
+    from server.src.llm_service import LLMService
+    from server.src.image_classifier import FoodImageClassifier
 from run_pipeline import (
     run_export_task,
     run_train_eval_task
 )
+from job_queue import JobQueue, JobStore
 
 # --- Configuration ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -42,18 +50,80 @@ DATA_DIR = "server/src/data/exported_data/"
 TAGS_PATH = "./data/dish_tags.json"
 TEST_SCENARIOS_PATH = "./data/test_scenarios.json"
 
+# Multi-worker serving (see server/serve.py): immutable recommender artifacts are
+# memory-mapped from this directory and torch threads are sized per worker.
+SHARED_ARTIFACT_DIR = os.getenv("SHARED_ARTIFACT_DIR") or None
+# Compact users / dishes tables the recommender loads instead of the full export
+SERVING_DATA_DIR = os.getenv("SERVING_DATA_DIR", "./server/model/serving") or None
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+
+# Image inference micro-batching: concurrent uploads arriving within the wait
+# window are classified together in one forward pass.
+IMAGE_BATCH_MAX_SIZE = int(os.getenv("IMAGE_BATCH_MAX_SIZE", "8"))
+IMAGE_BATCH_MAX_WAIT_MS = float(os.getenv("IMAGE_BATCH_MAX_WAIT_MS", "15"))
+# Recommendation micro-batching (/dish/recommend, /dish/similar, /tags/*): concurrent
+# requests are embedded and scored together (one batched matmul + top-k per batch).
+RECOMMEND_BATCH_MAX_SIZE = int(os.getenv("RECOMMEND_BATCH_MAX_SIZE", "32"))
+RECOMMEND_BATCH_MAX_WAIT_MS = float(os.getenv("RECOMMEND_BATCH_MAX_WAIT_MS", "5"))
+# Image classifier serving backend: "fp32" | "int8" (dynamic quantization) | "onnx" (onnxruntime)
+IMAGE_MODEL_BACKEND = os.getenv("IMAGE_MODEL_BACKEND", "fp32")
+# Base path of the exported graph (the file name gets the model name and weights version)
+IMAGE_MODEL_ONNX_PATH = os.getenv("IMAGE_MODEL_ONNX_PATH", "./server/model/food_classifier.onnx")
+# Prediction cache keyed by SHA-256 of the upload; optional dHash for near-duplicates
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "2048"))
+IMAGE_CACHE_PERCEPTUAL = os.getenv("IMAGE_CACHE_PERCEPTUAL", "false").lower() == "true"
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "4"))
+# Image size limit. The /tag/predict request body (image + multipart framing) is capped
+# by BodySizeLimitMiddleware before it is parsed: by Content-Length, or by counting the
+# bytes as they arrive, so an oversized upload is never fully received or spooled.
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# MLOps jobs (export / train) are persisted in SQLite so status survives restarts
+# and is shared by every API worker process.
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./server/jobs.sqlite3")
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "200"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+
 # --- Global State ---
 # We initialize these as None and load them in lifespan
-evaluator_instance: Optional[ModelEvaluator] = None
-llm_service_instance: Optional[LLMService] = None
-extractor = None
-tag_model = None
+evaluator_instance: Optional["ModelEvaluator"] = None
+llm_service_instance: Optional["LLMService"] = None
+image_classifier: Optional["FoodImageClassifier"] = None
+image_batcher: Optional[MicroBatcher] = None
+recommend_batcher: Optional[MicroBatcher] = None
+similar_batcher: Optional[MicroBatcher] = None
+tags_batcher: Optional[MicroBatcher] = None
+# One thread runs every recommender batch, so batches never compete for torch threads
+recommender_executor: Optional[ThreadPoolExecutor] = None
+image_cache = ImagePredictionCache(
+    max_entries=IMAGE_CACHE_SIZE,
+    use_perceptual_hash=IMAGE_CACHE_PERCEPTUAL,
+    max_distance=IMAGE_CACHE_MAX_DISTANCE
+)
 dish_tags = {}
 test_behaviors = {}
-
-# Job Management
-job_statuses: Dict[str, Dict[str, Any]] = {}
-is_processing_running = False 
+# Response fields of every dish, NaN-cleaned once per (re)load of the recommender
+dish_response_table: Optional[DishResponseTable] = None
+SIMILAR_DISH_COLUMNS = ("name", "price", "category")
+
+# Per-feature readiness: /dish/* can serve while the image model is still loading.
+# /health/ready only waits for the critical services to settle (not to be "ready").
+READINESS_CRITICAL_SERVICES = [
+    s.strip() for s in os.getenv("READINESS_CRITICAL_SERVICES", "recommender").split(",") if s.strip()
+]
+readiness = ServiceReadiness(["image", "recommender", "llm"], critical=READINESS_CRITICAL_SERVICES)
+
+# Job Management: one job runs at a time; others wait as PENDING.
+# Created in lifespan, so importing this module does not open the SQLite store.
+job_queue: Optional[JobQueue] = None
+
+def create_job_queue() -> JobQueue:
+    return JobQueue(
+        JobStore(JOB_DB_PATH, stale_after_seconds=JOB_STALE_SECONDS),
+        handlers={"export": run_export_task, "train": run_train_eval_task},
+        history_limit=JOB_HISTORY_LIMIT
+    )
 
 # ==================================================
 # HELPER FUNCTIONS
@@ -70,65 +140,139 @@ def to_serializable(obj):
         return [to_serializable(i) for i in obj]
     return obj
 
-def update_job_status(job_id: str, status: str, message: str = None, result: Any = None, error: str = None):
-    """Callback to update background job status."""
-    global is_processing_running
-    if job_id in job_statuses:
-        job_statuses[job_id]['status'] = status
-        if message: job_statuses[job_id]['message'] = message
-        if result: job_statuses[job_id]['result'] = result
-        if error: job_statuses[job_id]['error'] = error
-        job_statuses[job_id]['last_updated'] = datetime.now().isoformat()
-        
-        # Release lock if finished
-        if status in ["COMPLETED", "FAILED"]:
-            is_processing_running = False
-            
-        print(f"Job {job_id} updated: {status}")
+async def read_upload_limited(upload: UploadFile, max_bytes: int) -> bytes:
+    """
+    Reads an upload whose request body was already capped by BodySizeLimitMiddleware;
+    checks the file part itself (the body limit includes the multipart framing).
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(413, f"Image exceeds the {max_bytes // (1024 * 1024)}MB upload limit.")
+    data = await upload.read()
+    if len(data) > max_bytes:
+        raise HTTPException(413, f"Image exceeds the {max_bytes // (1024 * 1024)}MB upload limit.")
+    return data
+
+def require_ready(service: str, detail: str):
+    """Raises 503, telling the caller whether the feature is still loading or unavailable."""
+    if readiness.is_ready(service):
+        return
+    state = readiness.state(service)
+    if state in ("pending", "loading"):
+        raise HTTPException(503, f"{detail} (still loading, retry shortly).")
+    raise HTTPException(503, detail)
 
 # ==================================================
 # LIFESPAN (Startup Logic)
 # ==================================================
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    global evaluator_instance, llm_service_instance, extractor, tag_model, dish_tags, test_behaviors
-    
-    print("--- Startup: Initializing Services ---")
+def load_image_service():
+    global image_classifier, image_batcher, dish_tags
+
+    if os.path.exists(TAGS_PATH):
+        with open(TAGS_PATH, "r", encoding="utf-8") as f:
+            dish_tags = json.load(f)
+
+    with readiness.phase("image", "import"):
+        from server.src.image_classifier import FoodImageClassifier
+        configure_torch_threads(API_WORKERS)
+    with readiness.phase("image", "load_model"):
+        classifier = FoodImageClassifier(
+            "nateraw/food", backend=IMAGE_MODEL_BACKEND, onnx_path=IMAGE_MODEL_ONNX_PATH
+        )
+
+    # The batcher starts its collector lazily on the event loop at the first request
+    image_batcher = MicroBatcher(
+        classifier.predict_batch,
+        max_batch_size=IMAGE_BATCH_MAX_SIZE,
+        max_wait_ms=IMAGE_BATCH_MAX_WAIT_MS,
+        name="image-inference"
+    )
+    image_classifier = classifier
+    print(f"✅ Image Recognition Model Loaded ({IMAGE_MODEL_BACKEND}).")
+    return "ready"
+
+# Batch functions resolve the evaluator at run time, so /admin/reload-model swaps it in place
+def run_recommend_batch(items: List[Dict]) -> List[Any]:
+    return evaluator_instance.get_recommendations_batch(items)
+
+def run_similar_batch(items: List[Dict]) -> List[Any]:
+    return evaluator_instance.get_similar_dishes_batch(items)
+
+def run_tags_batch(items: List[Dict]) -> List[Any]:
+    return evaluator_instance.recommend_tags_batch(items)
+
+def create_recommender_batchers():
+    global recommend_batcher, similar_batcher, tags_batcher, recommender_executor
+
+    recommender_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommender")
+    options = dict(
+        max_batch_size=RECOMMEND_BATCH_MAX_SIZE,
+        max_wait_ms=RECOMMEND_BATCH_MAX_WAIT_MS,
+        executor=recommender_executor
+    )
+    recommend_batcher = MicroBatcher(run_recommend_batch, name="recommend", **options)
+    similar_batcher = MicroBatcher(run_similar_batch, name="similar", **options)
+    tags_batcher = MicroBatcher(run_tags_batch, name="tags", **options)
+
+def load_recommender_service():
+    global evaluator_instance, dish_response_table
+
+    if not (os.path.exists(MODEL_PATH) and os.path.exists(MODEL_INFO_PATH)):
+        print(f"⚠️ Recommender Warning: Model files missing at {MODEL_PATH}")
+        return "unavailable"
+
+    with readiness.phase("recommender", "import"):
+        from server.src.evaluate import ModelEvaluator
+        configure_torch_threads(API_WORKERS)
+    with readiness.phase("recommender", "load_model"):
+        evaluator_instance = ModelEvaluator(
+            MODEL_PATH, MODEL_INFO_PATH, DATA_DIR,
+            shared_artifact_dir=SHARED_ARTIFACT_DIR, serving_data_dir=SERVING_DATA_DIR
+        )
+    dish_response_table = DishResponseTable(evaluator_instance.data["dishes"])
+    create_recommender_batchers()
+    print("✅ Recommendation Model Loaded.")
+    return "ready"
+
+def load_llm_service():
+    global llm_service_instance
+
+    with readiness.phase("llm", "import"):
+        from server.src.llm_service import LLMService
+    with readiness.phase("llm", "init_client"):
+        llm_service_instance = LLMService()
 
-    # 1. Load Image Recognition Model
-    try:
-        if os.path.exists(TAGS_PATH):
-            with open(TAGS_PATH, "r", encoding="utf-8") as f:
-                dish_tags = json.load(f)
-        
-        extractor = AutoFeatureExtractor.from_pretrained("nateraw/food")
-        tag_model = AutoModelForImageClassification.from_pretrained("nateraw/food")
-        tag_model.eval()
-        print("✅ Image Recognition Model Loaded.")
-    except Exception as e:
-        print(f"⚠️ Image Model Warning: {e}")
+    if not llm_service_instance.client:
+        print("⚠️ LLM Warning: Client not initialized (Check API Key).")
+        return "unavailable"
+    print("✅ LLM Service Loaded.")
+    return "ready"
 
-    # 2. Load Recommendation Model (Two-Tower)
+async def init_service(name: str, loader):
+    """Runs one blocking loader in a worker thread and records its readiness."""
+    readiness.set_state(name, "loading")
     try:
-        if os.path.exists(MODEL_PATH) and os.path.exists(MODEL_INFO_PATH):
-            evaluator_instance = ModelEvaluator(MODEL_PATH, MODEL_INFO_PATH, DATA_DIR)
-            print("✅ Recommendation Model Loaded.")
-        else:
-            print(f"⚠️ Recommender Warning: Model files missing at {MODEL_PATH}")
+        state = await asyncio.to_thread(loader)
+        readiness.set_state(name, state)
     except Exception as e:
-        print(f"❌ Recommender Error: {e}")
+        print(f"❌ {name} failed to initialize: {e}")
+        readiness.set_state(name, "failed", error=str(e))
+
+async def init_all_services():
+    # Independent services load in parallel; none of them blocks the others
+    await asyncio.gather(
+        init_service("image", load_image_service),
+        init_service("recommender", load_recommender_service),
+        init_service("llm", load_llm_service),
+    )
+    print(readiness.format_report())
 
-    # 3. Load LLM Service (Gemini)
-    try:
-        llm_service_instance = LLMService()
-        if llm_service_instance.client:
-            print("✅ LLM Service Loaded.")
-        else:
-            print("⚠️ LLM Warning: Client not initialized (Check API Key).")
-    except Exception as e:
-        print(f"❌ LLM Error: {e}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global test_behaviors, job_queue
+
+    print("--- Startup: Initializing Services (in background) ---")
 
-    # 4. Load Test Scenarios
+    # Test scenarios are a small JSON file: load them inline
     try:
         if os.path.exists(TEST_SCENARIOS_PATH):
             with open(TEST_SCENARIOS_PATH, "r", encoding="utf-8") as f:
@@ -136,8 +280,21 @@ async def lifespan(app: FastAPI):
     except Exception:
         print("⚠️ Warning: test_scenarios.json not found.")
 
+    # Start serving immediately; each feature reports 503 until its service is ready
+    init_task = asyncio.create_task(init_all_services())
+    job_queue = create_job_queue()
+    job_queue.start()
+
     yield
     print("--- Shutdown: Application stopping ---")
+    if not init_task.done():
+        init_task.cancel()
+    for batcher in (image_batcher, recommend_batcher, similar_batcher, tags_batcher):
+        if batcher:
+            await batcher.stop()
+    if recommender_executor:
+        recommender_executor.shutdown(wait=False)
+    job_queue.stop()
 
 # ==================================================
 # APP SETUP
@@ -161,6 +318,12 @@ app = FastAPI(title="Dish Recognition & Recommendation API", version="1.0", life
 #         return response
 # app.add_middleware(DelayMiddleware, delay=6.0)
 
+# Added before CORS so the 413 responses still carry the CORS headers
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={"/tag/predict": IMAGE_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES}
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -176,6 +339,13 @@ class DishTextRequest(BaseModel):
     name: str
     description: Optional[str] = None
 
+class DishEnrichRequest(BaseModel):
+    name: str
+    description: Optional[str] = None
+    dish_id: Optional[str] = None
+    dish_data: Optional[Dict] = None # price, category, store_id... used for the embedding refresh
+    update_embedding: bool = False
+
 class UserProfile(BaseModel):
     age: int | None = None
     gender: str | None = None
@@ -187,10 +357,22 @@ class DishProfile(BaseModel):
     taste: Optional[List[str]] = []
     price_range: Optional[str] = 'any'
 
+class RecommendationConstraints(BaseModel):
+    # Applied as masks before scoring, so `top_k` results are returned even when selective
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    categories: Optional[List[str]] = None
+    store_ids: Optional[List[str]] = None
+    exclude_tags: Optional[List[str]] = None
+    exclude_allergy_tags: bool = True   # user's allergy_tags
+    exclude_disliked_tags: bool = True  # user's disliked_tags
+
 class RecommendationRequest(BaseModel):
     user_id: str | None = None
     user_profile: UserProfile | None = None
     top_k: int = 10
+    constraints: Optional[RecommendationConstraints] = None
+    exclude_seen: bool = False  # skip dishes the user already ordered
 
 class SimilarDishRequest(BaseModel):
     dish_id: Optional[str] = None
@@ -216,6 +398,16 @@ class OptimizedDescriptionResponse(BaseModel):
     original_description: Optional[str]
     new_description: str
 
+class DishEnrichmentResponse(BaseModel):
+    taste_tags: List[str]
+    method_tags: List[str]
+    ingredient_tags: List[str]
+    culture_tags: List[str]
+    original_name: str
+    original_description: Optional[str]
+    new_description: str
+    embedding_updated: bool = False
+
 class TagRecommendationResponse(BaseModel):
     user_id: str
     recommended_tags: List[Dict[str, Any]]
@@ -227,6 +419,10 @@ class UpdateUserRequest(BaseModel):
 class UpdateDishRequest(BaseModel):
     dish_id: str
     dish_data: Dict # Contains price, category, tags, etc.
+
+class UpdateSeenRequest(BaseModel):
+    user_id: str
+    dish_ids: List[str] # Dishes just ordered by the user
     
 # ==================================================
 # EMBEDING UPDATE
@@ -237,7 +433,7 @@ def refresh_user_data(request: UpdateUserRequest):
     Call this when a user updates their profile/tags.
     Updates the in-memory data so recommendations change immediately.
     """
-    if not evaluator_instance: raise HTTPException(503, "Model not loaded.")
+    require_ready("recommender", "Model not loaded.")
     
     try:
         evaluator_instance.update_live_user_data(request.user_id, request.user_data)
@@ -251,7 +447,7 @@ def refresh_dish_embedding(request: UpdateDishRequest):
     Call this when a restaurant adds/edits a dish.
     Calculates the new vector and puts it in the cache.
     """
-    if not evaluator_instance: raise HTTPException(503, "Model not loaded.")
+    require_ready("recommender", "Model not loaded.")
     
     try:
         evaluator_instance.update_dish_embedding(request.dish_id, request.dish_data)
@@ -260,86 +456,130 @@ def refresh_dish_embedding(request: UpdateDishRequest):
         print(e)
         raise HTTPException(500, str(e))
 
+@app.post("/refresh/seen")
+def refresh_seen_dishes(request: UpdateSeenRequest):
+    """
+    Call this when a user places an order.
+    Adds the dishes to the user's seen set used by `exclude_seen` recommendations.
+    """
+    require_ready("recommender", "Model not loaded.")
+
+    try:
+        added = evaluator_instance.mark_dishes_seen(request.user_id, request.dish_ids)
+        return {"status": "success", "message": f"{added} new dishes marked as seen for user {request.user_id}."}
+    except Exception as e:
+        raise HTTPException(500, str(e))
+
 # ==================================================
 # ADMIN & MLOPS ENDPOINTS
 # ==================================================
 
+def submit_job(job_type: str) -> Dict[str, Any]:
+    """Queues a job; a second export (or train) is refused while one is pending or running."""
+    if job_queue.store.has_active(job_type):
+        raise HTTPException(status_code=409, detail=f"A {job_type} job is already queued or running.")
+    return job_queue.submit(job_type)
+
 @app.post("/admin/export-data")
-async def trigger_export(background_tasks: BackgroundTasks):
-    global is_processing_running
-    if is_processing_running:
-        raise HTTPException(status_code=409, detail="Process already running.")
-    
-    is_processing_running = True
-    job_id = f"export_{uuid.uuid4()}"
-    job_statuses[job_id] = {
-        "job_id": job_id, "type": "export", "status": "PENDING",
-        "start_time": datetime.now().isoformat(), "last_updated": datetime.now().isoformat()
-    }
-    background_tasks.add_task(run_export_task, job_id, update_job_status)
-    return {"message": "Data export started.", "job_id": job_id}
+async def trigger_export():
+    job = await asyncio.to_thread(submit_job, "export")
+    return {"message": "Data export queued.", "job_id": job["job_id"]}
 
 @app.post("/admin/train-model")
-async def trigger_training(background_tasks: BackgroundTasks):
-    global is_processing_running
-    if is_processing_running:
-        raise HTTPException(status_code=409, detail="Process already running.")
-    
-    is_processing_running = True
-    job_id = f"train_{uuid.uuid4()}"
-    job_statuses[job_id] = {
-        "job_id": job_id, "type": "train", "status": "PENDING",
-        "start_time": datetime.now().isoformat(), "last_updated": datetime.now().isoformat()
-    }
-    background_tasks.add_task(run_train_eval_task, job_id, update_job_status)
-    return {"message": "Model training started.", "job_id": job_id}
+async def trigger_training():
+    job = await asyncio.to_thread(submit_job, "train")
+    return {"message": "Model training queued.", "job_id": job["job_id"]}
 
 @app.post("/admin/reload-model")
 async def reload_active_model():
-    global evaluator_instance
-    if is_processing_running:
-         raise HTTPException(status_code=409, detail="Cannot reload while training.")
+    global evaluator_instance, dish_response_table
+    if await asyncio.to_thread(job_queue.store.has_active):
+         raise HTTPException(status_code=409, detail="Cannot reload while a job is queued or running.")
     
     try:
-        evaluator_instance = ModelEvaluator(MODEL_PATH, MODEL_INFO_PATH, DATA_DIR)
+        from server.src.evaluate import ModelEvaluator
+        evaluator = await asyncio.to_thread(
+            ModelEvaluator, MODEL_PATH, MODEL_INFO_PATH, DATA_DIR,
+            shared_artifact_dir=SHARED_ARTIFACT_DIR, serving_data_dir=SERVING_DATA_DIR
+        )
+        table = await asyncio.to_thread(DishResponseTable, evaluator.data["dishes"])
+        evaluator_instance, dish_response_table = evaluator, table
+        if recommend_batcher is None:
+            create_recommender_batchers()
+        readiness.set_state("recommender", "ready")
         return {"message": "Model reloaded successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
 
 @app.get("/admin/job-status/{job_id}")
 async def get_job_status(job_id: str):
-    status = job_statuses.get(job_id)
+    status = await asyncio.to_thread(job_queue.store.get, job_id)
     if not status: raise HTTPException(404, "Job ID not found.")
     return status
 
+@app.get("/admin/jobs")
+async def list_jobs(limit: int = 50, state: Optional[str] = None, type: Optional[str] = None):
+    """Most recent jobs first; filter by state (PENDING/RUNNING/COMPLETED/FAILED/CANCELLED) or type."""
+    jobs = await asyncio.to_thread(job_queue.store.list, min(max(limit, 1), 500), state, type)
+    return {"jobs": jobs, "count": len(jobs)}
+
+@app.post("/admin/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Pending jobs are dropped; running jobs stop at their next checkpoint (subprocesses are killed)."""
+    job = await asyncio.to_thread(job_queue.cancel, job_id)
+    if not job: raise HTTPException(404, "Job ID not found.")
+    if job["state"] in ("COMPLETED", "FAILED"):
+        raise HTTPException(409, f"Job already finished with state {job['state']}.")
+    return {"message": "Cancellation requested.", "job": job}
+
 # ==================================================
 # FEATURE 1: IMAGE RECOGNITION
 # ==================================================
 @app.post("/tag/predict")
 async def predict_dish(image: UploadFile = File(...)):
-    if not tag_model or not extractor:
-        raise HTTPException(503, "Image model not initialized.")
+    require_ready("image", "Image model not initialized.")
     if not image.content_type.startswith("image/"):
         raise HTTPException(400, "File must be an image.")
 
-    try:
-        image_bytes = await image.read()
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        inputs = extractor(images=img, return_tensors="pt")
+    image_bytes = await read_upload_limited(image, IMAGE_MAX_UPLOAD_BYTES)
+
+    # 1. Exact re-upload: answer straight from the content-hash cache
+    cache_key = image_cache.content_key(image_bytes)
+    cached = image_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    # 2. Near-duplicate (re-encoded / resized copy), if perceptual hashing is enabled
+    phash = None
+    if image_cache.use_perceptual_hash:
+        try:
+            phash = await asyncio.to_thread(image_cache.perceptual_hash, image_bytes)
+            cached = image_cache.get_similar(phash)
+            if cached is not None:
+                image_cache.put(cache_key, cached, phash)
+                return {**cached, "cached": True}
+        except Exception as e:
+            print(f"Perceptual hash skipped: {e}")
 
-        with torch.no_grad():
-            outputs = tag_model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            pred_idx = probs.argmax(-1).item()
+    try:
+        # Decoding + inference run on the batcher's executor, off the event loop
+        prediction = await image_batcher.submit(image_bytes)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Prediction error: {e}")
 
-        pred_label = tag_model.config.id2label[pred_idx]
-        confidence = float(probs[0][pred_idx].item())
+    try:
+        pred_label = prediction["label"]
+        confidence = prediction["confidence"]
         tags = dish_tags.get(pred_label, [])
 
-        return to_serializable({
+        result = to_serializable({
             "success": True, "predicted_label": pred_label,
             "confidence": round(confidence, 4), "tags": tags
         })
+        image_cache.put(cache_key, result, phash)
+        return {**result, "cached": False}
     except Exception as e:
         raise HTTPException(500, f"Prediction error: {e}")
 
@@ -348,87 +588,140 @@ async def predict_dish(image: UploadFile = File(...)):
 # ==================================================
 @app.post("/text/extract-tags", response_model=TaggingResponse)
 async def extract_tags_from_text(request: DishTextRequest):
-    if not llm_service_instance or not llm_service_instance.client:
-        raise HTTPException(503, "LLM Service unavailable.")
+    require_ready("llm", "LLM Service unavailable.")
     return await llm_service_instance.extract_tags(request.name, request.description)
 
 @app.post("/text/optimize-description", response_model=OptimizedDescriptionResponse)
 async def optimize_dish_description(request: DishTextRequest):
-    if not llm_service_instance or not llm_service_instance.client:
-        raise HTTPException(503, "LLM Service unavailable.")
+    require_ready("llm", "LLM Service unavailable.")
     desc = request.description if request.description else request.name
     return await llm_service_instance.optimize_description(request.name, desc)
 
+@app.post("/text/enrich-dish", response_model=DishEnrichmentResponse)
+async def enrich_dish(request: DishEnrichRequest):
+    """
+    Tags + rewritten description from a single Gemini call.
+    With `update_embedding` and a `dish_id`, the extracted tags are also pushed
+    into the recommender so the dish is immediately recommendable.
+    """
+    require_ready("llm", "LLM Service unavailable.")
+
+    result = await llm_service_instance.enrich_dish(request.name, request.description)
+    result["embedding_updated"] = False
+
+    if request.update_embedding and request.dish_id:
+        if not readiness.is_ready("recommender"):
+            print("Skipping embedding update: recommender not loaded.")
+            return result
+        dish_data = {"name": request.name, **(request.dish_data or {})}
+        dish_data.update(llm_service_instance.tags_to_dish_columns(result))
+        try:
+            await asyncio.to_thread(evaluator_instance.update_dish_embedding, request.dish_id, dish_data)
+            result["embedding_updated"] = True
+        except Exception as e:
+            print(f"Embedding update failed for dish {request.dish_id}: {e}")
+
+    return result
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formats a payload as a single Server-Sent Events message."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/text/optimize-description/stream")
+async def optimize_dish_description_stream(request: DishTextRequest, http_request: Request):
+    """
+    Streaming variant of /text/optimize-description.
+    Emits `chunk` events as Gemini generates text, then a final `done` event
+    carrying the same payload as the non-streaming endpoint.
+    """
+    require_ready("llm", "LLM Service unavailable.")
+    desc = request.description if request.description else request.name
+
+    async def event_stream():
+        parts = []
+        chunks = llm_service_instance.optimize_description_stream(request.name, desc)
+        try:
+            async for text in chunks:
+                # Stop pulling tokens from Gemini as soon as the client goes away
+                if await http_request.is_disconnected():
+                    print("Client disconnected, cancelling description stream.")
+                    break
+                parts.append(text)
+                yield format_sse({"text": text}, event="chunk")
+            else:
+                yield format_sse({
+                    "original_name": request.name,
+                    "original_description": desc,
+                    "new_description": "".join(parts).strip()
+                }, event="done")
+        except asyncio.CancelledError:
+            print("Description stream cancelled by client.")
+            raise
+        except Exception as e:
+            print(f"Lỗi khi stream mô tả: {e}")
+            yield format_sse({"error": str(e)}, event="error")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ==================================================
 # FEATURE 3: RECOMMENDATIONS
 # ==================================================
 
 @app.post("/tags/recommend", response_model=TagRecommendationResponse)
-def recommend_tags(request: RecommendationRequest):
-    if not evaluator_instance: raise HTTPException(503, "Model not loaded.")
+async def recommend_tags(request: RecommendationRequest):
+    require_ready("recommender", "Model not loaded.")
     
     try:
         if request.user_id:
-            raw_results = evaluator_instance.recommend_tags_for_user(request.user_id, top_k=request.top_k)
+            raw_results = await tags_batcher.submit({"user_id": request.user_id, "top_k": request.top_k})
             formatted_results = [{"tag": t, "score": round(s, 4)} for t, s in raw_results]
-            return {"user_id": request.user_id, "recommended_tags": formatted_results}
+            return FastJSONResponse({"user_id": request.user_id, "recommended_tags": formatted_results})
         else:
             raise HTTPException(501, "Cold start tag recommendation not implemented")
     except Exception as e:
         raise HTTPException(500, str(e))
 
 @app.post("/tags/recommend-for-order")
-def recommend_tags_for_order(request: OrderTagRequest):
-    if not evaluator_instance: raise HTTPException(503, "Model not loaded.")
+async def recommend_tags_for_order(request: OrderTagRequest):
+    require_ready("recommender", "Model not loaded.")
     
     try:
-        raw_results = evaluator_instance.get_tags_for_order(request.dish_ids, top_k=request.top_k)
+        raw_results = await tags_batcher.submit({"dish_ids": request.dish_ids, "top_k": request.top_k})
         formatted_results = [{"tag": t, "score": round(s, 4)} for t, s in raw_results]
-        return {"input_dishes": request.dish_ids, "recommended_tags": formatted_results}
+        return FastJSONResponse({"input_dishes": request.dish_ids, "recommended_tags": formatted_results})
     except Exception as e:
         raise HTTPException(500, str(e))
 
 @app.post("/dish/recommend")
-def recommend(request: RecommendationRequest):
-    if not evaluator_instance: raise HTTPException(503, "Model not loaded.")
+async def recommend(request: RecommendationRequest):
+    require_ready("recommender", "Model not loaded.")
 
     try:
-        # Helper for safe casting (prevents JSON errors)
-        def safe_cast(val):
-            if isinstance(val, float) and (math.isnan(val) or math.isinf(val)): return None
-            if isinstance(val, np.generic): return val.item()
-            return val
-
-        def enrich_results(recs):
-            results = []
-            for rec in recs:
-                dish_id = rec[0] if isinstance(rec, tuple) else rec.get('dish_id')
-                score = rec[1] if isinstance(rec, tuple) else rec.get('score')
-                
-                dish_info = evaluator_instance.data["dishes"][evaluator_instance.data["dishes"]["id"] == dish_id]
-                if dish_info.empty: continue
-                
-                row = dish_info.iloc[0]
-                results.append({
-                    "dish_id": safe_cast(row["id"]),
-                    "name": safe_cast(row.get("name")),
-                    "cuisine": safe_cast(row.get("cuisine")),
-                    "price": safe_cast(row.get("price")),
-                    "category": safe_cast(row.get("category")),
-                    "score": safe_cast(score)
-                })
-            return results
+        constraints = request.constraints.dict() if request.constraints else None
 
         if request.user_id:
-            recs = evaluator_instance.get_recommendations(request.user_id, top_k=request.top_k)
-            enriched = enrich_results(recs)
-            return to_serializable({"user_id": request.user_id, "recommendations": enriched, "count": len(enriched)})
+            recs = await recommend_batcher.submit({
+                "user_id": request.user_id, "top_k": request.top_k,
+                "constraints": constraints, "exclude_seen": request.exclude_seen
+            })
+            # Dish fields come from the table prepared at load time (NaN already None)
+            enriched = dish_response_table.records(recs)
+            return FastJSONResponse({"user_id": request.user_id, "recommendations": enriched, "count": len(enriched)})
             
         elif request.user_profile:
-            result = evaluator_instance.evaluate_cold_start_user({"user_profile": request.user_profile.dict()})
-            enriched = enrich_results(result.get("recommendations", []))
-            result["recommendations"] = enriched
-            return to_serializable(result)
+            result = await asyncio.to_thread(
+                evaluator_instance.evaluate_cold_start_user,
+                {"user_profile": request.user_profile.dict()}, constraints=constraints, top_k=request.top_k
+            )
+            result["recommendations"] = dish_response_table.records(result.get("recommendations", []))
+            return FastJSONResponse(result)
         
         else:
             raise HTTPException(400, "Provide user_id or user_profile")
@@ -437,21 +730,12 @@ def recommend(request: RecommendationRequest):
         raise HTTPException(500, f"Recommendation error: {e}")
 
 @app.post("/dish/similar")
-def get_similar_dishes(request: SimilarDishRequest):
-    if not evaluator_instance: raise HTTPException(503, "Model not loaded.")
-
-    # Reuse safe_cast logic...
-    def safe_cast(val):
-        if isinstance(val, float) and (math.isnan(val) or math.isinf(val)): return None
-        if isinstance(val, np.generic): return val.item()
-        return val
+async def get_similar_dishes(request: SimilarDishRequest):
+    require_ready("recommender", "Model not loaded.")
 
     try:
         raw_recs = []
         response_meta = {}
-        
-        # Debug print
-        print(f"Incoming Request: {request}")
 
         if request.dish_id:
             # CHECK IF ID EXISTS FIRST
@@ -459,14 +743,15 @@ def get_similar_dishes(request: SimilarDishRequest):
                 # Return 404 so Node knows it's a specific "Not Found" error, not a server crash
                 raise HTTPException(status_code=404, detail=f"Dish ID {request.dish_id} not found in model cache (Try retraining).")
                 
-            raw_recs = evaluator_instance.get_similar_dishes(
-                request.dish_id, top_k=request.top_k, store_id_filter=request.store_id_filter
-            )
+            raw_recs = await similar_batcher.submit({
+                "dish_id": request.dish_id, "top_k": request.top_k, "store_id_filter": request.store_id_filter
+            })
             response_meta = {"scenario": "existing_dish", "source_dish_id": request.dish_id}
             
         elif request.dish_profile:
             print("Running Cold Start Logic...")
-            result = evaluator_instance.evaluate_cold_start_dish(
+            result = await asyncio.to_thread(
+                evaluator_instance.evaluate_cold_start_dish,
                 {"dish_profile": request.dish_profile.dict()}, 
                 top_k=request.top_k, store_id_filter=request.store_id_filter
             )
@@ -475,26 +760,9 @@ def get_similar_dishes(request: SimilarDishRequest):
         else:
             raise HTTPException(400, "Provide dish_id or dish_profile")
 
-        # Enrich
-        detailed = []
-        for rec in raw_recs:
-            dish_id, score = rec[0], rec[1]
-            # Check if dish exists in dataframe before accessing
-            if dish_id not in evaluator_instance.data["dishes"]["id"].values:
-                continue
-                
-            dish_info = evaluator_instance.data["dishes"][evaluator_instance.data["dishes"]["id"] == dish_id]
-            row = dish_info.iloc[0]
-            detailed.append({
-                "dish_id": safe_cast(row["id"]),
-                "name": safe_cast(row.get("name")),
-                "price": safe_cast(row.get("price")),
-                "category": safe_cast(row.get("category")),
-                "score": safe_cast(score)
-            })
-            
-        response_meta["similar_dishes"] = detailed
-        return to_serializable(response_meta)
+        # Enrich (dishes missing from the table are skipped)
+        response_meta["similar_dishes"] = dish_response_table.records(raw_recs, columns=SIMILAR_DISH_COLUMNS)
+        return FastJSONResponse(response_meta)
 
     except HTTPException as he:
         raise he # Re-raise HTTP exceptions (like 404)
@@ -504,7 +772,7 @@ def get_similar_dishes(request: SimilarDishRequest):
         raise HTTPException(500, f"Similarity error: {str(e)}")
 @app.post("/behavior/test")
 def evaluate_behavior(request: BehaviorTestRequest):
-    if not evaluator_instance: raise HTTPException(503, "Model not loaded.")
+    require_ready("recommender", "Model not loaded.")
     behavior = request.behavior_name
     if behavior not in test_behaviors: raise HTTPException(404, f"Unknown behavior: {behavior}")
 
@@ -529,4 +797,28 @@ def evaluate_behavior(request: BehaviorTestRequest):
 
 @app.get("/")
 def root():
-    return {"message": "Dish Recognition & Recommendation API is running 🚀"}
\ No newline at end of file
+    return {"message": "Dish Recognition & Recommendation API is running 🚀"}
+
+@app.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/batching")
+def batching_metrics():
+    """Queue depth and batch sizes of the inference micro-batchers (to tune max size / max wait)."""
+    batchers = {
+        "image": image_batcher, "recommend": recommend_batcher,
+        "similar": similar_batcher, "tags": tags_batcher,
+    }
+    return {name: batcher.stats() for name, batcher in batchers.items() if batcher is not None}
+
+@app.get("/health/ready")
+def readiness_report(response: Response):
+    """
+    Per-feature readiness and startup-time breakdown. 503 until the critical services
+    have settled ("unavailable" counts as settled) or if one of them failed.
+    """
+    report = readiness.report()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
\ No newline at end of file
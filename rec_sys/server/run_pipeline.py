@@ -1,10 +1,15 @@
 # run_pipeline.py
 import os
+import csv
 import subprocess
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Callable, List, Optional
+
+from job_queue import JobCancelled
 
 # --- Paths (Adjust as needed) ---
 # Assuming Node.js scripts are in a 'scripts/export_scripts' relative path
@@ -23,6 +28,19 @@ EXPORT_SCRIPTS = {
     "cooking_tags": "src/data/export_script/cooking_method_tag.js",
     "culture_tags": "src/data/export_script/culture_tag.js",
 }
+# CSV written by each script (relative to BASE_DIR), used to report row counts
+EXPORT_OUTPUTS = {
+    "users": "src/data/exported_data/users.csv",
+    "dishes": "src/data/exported_data/dishes.csv",
+    "stores": "src/data/exported_data/stores.csv",
+    "interactions": "src/data/exported_data/interaction.csv",
+    "food_tags": "src/data/exported_data/food_tags.csv",
+    "taste_tags": "src/data/exported_data/taste_tags.csv",
+    "cooking_tags": "src/data/exported_data/cooking_method_tags.csv",
+    "culture_tags": "src/data/exported_data/culture_tags.csv",
+}
+# The scripts are independent Mongo round trips: run a bounded number at once
+EXPORT_MAX_WORKERS = int(os.getenv("EXPORT_MAX_WORKERS", "4"))
 TRAIN_SCRIPT = "server/train.py"
 EVALUATE_SCRIPT = "scripts/evaluate_notebook_cli.py"
 
@@ -31,14 +49,64 @@ EVALUATION_OUTPUT_PATH = os.path.join(MODEL_SAVE_DIR, "evaluation_results.json")
 # --- End Paths ---
 
 # --- Status Update Function (Signature only) ---
-def update_status_func(job_id: str, status: str, message: str = None, result: Any = None, error: str = None):
+def update_status_func(job_id: str, status: str, message: str = None, result: Any = None, error: str = None,
+                       progress: float = None):
     pass
 
+def _never_cancelled() -> bool:
+    return False
+
+def _run_cancellable(cmd: List[str], is_cancelled: Callable[[], bool], poll_seconds: float = 1.0,
+                     **popen_kwargs) -> subprocess.CompletedProcess:
+    """
+    subprocess.run(..., capture_output=True, check=True) that also polls
+    `is_cancelled` while waiting and kills the child when the job is cancelled.
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **popen_kwargs)
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=poll_seconds)
+            break
+        except subprocess.TimeoutExpired:
+            if is_cancelled():
+                process.kill()
+                process.communicate()
+                raise JobCancelled(f"Cancelled while running: {' '.join(cmd)}")
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
 # --- Pipeline Steps ---
 
-def export_data(job_id: str, update_status):
+def _count_csv_rows(path: str) -> Optional[int]:
+    """Data rows in an exported CSV (quoted multi-line fields count once)."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+def _export_one(name: str, script_path: str, cwd: str, env: Dict[str, str],
+                is_cancelled: Callable[[], bool]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    _run_cancellable(
+        ["node", script_path],
+        is_cancelled,
+        cwd=cwd, # Run from 'server/' folder
+        text=True,
+        encoding='utf-8',
+        env=env
+    )
+    output_path = os.path.join(BASE_DIR, EXPORT_OUTPUTS[name]) if name in EXPORT_OUTPUTS else None
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "rows": _count_csv_rows(output_path) if output_path else None,
+    }
+
+def export_data(job_id: str, update_status, is_cancelled: Optional[Callable[[], bool]] = None):
+    is_cancelled = is_cancelled or _never_cancelled
     current_status = "EXPORTING"
-    update_status(job_id, status=current_status, message="Starting data export...")
+    update_status(job_id, status=current_status, message="Starting data export...", progress=0)
     print(f"[{job_id}] Initializing data export pipeline...")
 
     # 1. Determine the Node Execution Root (Where package.json/.env usually are)
@@ -50,67 +118,111 @@ def export_data(job_id: str, update_status):
     if "MONGODB_URL" not in env_vars:
             print(f"[{job_id}] ⚠️ WARNING: MONGODB_URL not found in Python environment!")
 
-    for name, relative_path in EXPORT_SCRIPTS.items():
-        # 2. Construct absolute path using BASE_DIR + relative_path
-        # This prevents the "double path" error
-        absolute_script_path = os.path.join(BASE_DIR, relative_path)
-        
-        # Normalize path for Windows (changes / to \)
-        absolute_script_path = os.path.normpath(absolute_script_path)
-
-        update_status(job_id, status=current_status, message=f"Exporting {name}...")
-        print(f"[{job_id}] Script Path: {absolute_script_path}")
-
+    # 2. Resolve every script up front so a missing file fails before anything runs
+    # (normpath changes / to \ on Windows)
+    script_paths = {
+        name: os.path.normpath(os.path.join(BASE_DIR, relative_path))
+        for name, relative_path in EXPORT_SCRIPTS.items()
+    }
+    for name, absolute_script_path in script_paths.items():
         if not os.path.exists(absolute_script_path):
             error_msg = f"Script file not found: {absolute_script_path}"
             print(f"[{job_id}] ❌ {error_msg}")
             update_status(job_id, status="FAILED", error=error_msg)
             raise RuntimeError(error_msg)
 
-        try:
-            result = subprocess.run(
-                ["node", absolute_script_path],
-                cwd=node_execution_cwd, # Run from 'server/' folder
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                check=True,
-                env=env_vars
+    # 3. Run the scripts concurrently. The first failure (or a job cancellation)
+    # sets `abort`, which kills the sibling node processes at their next poll.
+    abort = threading.Event()
+    should_stop = lambda: abort.is_set() or is_cancelled()
+    exports: Dict[str, Dict[str, Any]] = {}
+    pipeline_start = time.perf_counter()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, EXPORT_MAX_WORKERS), thread_name_prefix="export")
+    try:
+        futures = {
+            executor.submit(_export_one, name, path, node_execution_cwd, env_vars, should_stop): name
+            for name, path in script_paths.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                exports[name] = future.result()
+
+            except subprocess.CalledProcessError as e:
+                abort.set()
+                stderr_safe = e.stderr or "No error output captured."
+                full_error_msg = f"Failed to export {name}.\nDetails:\n{stderr_safe}"
+                print(f"[{job_id}] ❌ {full_error_msg}")
+
+                update_status(job_id, status="FAILED", error=f"Export failed for {name}: {stderr_safe[:200]}",
+                              result={"exports": exports})
+                raise RuntimeError(f"Export pipeline stopped at {name}.")
+
+            except JobCancelled:
+                abort.set()
+                raise
+
+            except Exception as e:
+                abort.set()
+                error_msg = f"Unexpected Python error while exporting {name}: {str(e)}"
+                update_status(job_id, status="FAILED", error=error_msg)
+                raise RuntimeError(error_msg)
+
+            print(f"[{job_id}] Exported {name}: {exports[name]['rows']} rows in {exports[name]['seconds']}s")
+            update_status(
+                job_id, status=current_status, message=f"Exported {name} ({len(exports)}/{len(futures)})",
+                result={"exports": exports}, progress=100.0 * len(exports) / len(futures)
             )
-            # print(f"[{job_id}] Output: {result.stdout}") # Optional debug
-
-        except subprocess.CalledProcessError as e:
-            stderr_safe = e.stderr or "No error output captured."
-            # ... (keep your existing error handling logic) ...
-            
-            full_error_msg = f"Failed to export {name}.\nDetails:\n{stderr_safe}"
-            print(f"[{job_id}] ❌ {full_error_msg}")
-            
-            update_status(job_id, status="FAILED", error=f"Export failed for {name}: {stderr_safe[:200]}")
-            raise RuntimeError(f"Export pipeline stopped at {name}.")
-            
-        except Exception as e:
-            # ... (keep your existing generic error handling) ...
-            error_msg = f"Unexpected Python error: {str(e)}"
-            update_status(job_id, status="FAILED", error=error_msg)
-            raise RuntimeError(error_msg)
+    except BaseException:
+        abort.set()
+        raise
+    finally:
+        # Waits for the (killed) siblings so no node process outlives the job
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # 4. Typed Parquet copies for DataPreprocessor (CSV stays the fallback)
+    from src.columnar_io import convert_csv_directory
+    update_status(job_id, status=current_status, message="Converting exports to Parquet...",
+                  result={"exports": exports})
+    output_dirs: Dict[str, List[str]] = {}
+    for relative_output in EXPORT_OUTPUTS.values():
+        output_path = os.path.join(BASE_DIR, relative_output)
+        output_dirs.setdefault(os.path.dirname(output_path), []).append(
+            os.path.splitext(os.path.basename(output_path))[0]
+        )
+    try:
+        converted = [
+            stem for directory, stems in output_dirs.items()
+            for stem in convert_csv_directory(directory, stems)
+        ]
+        print(f"[{job_id}] Converted {len(converted)} exports to Parquet.")
+    except Exception as e:
+        print(f"[{job_id}] ⚠️ Parquet conversion failed, training will read the CSVs: {e}")
 
-    print(f"[{job_id}] ✅ All export scripts completed successfully.")
-def train_model(job_id: str, update_status):
+    total_seconds = round(time.perf_counter() - pipeline_start, 3)
+    update_status(job_id, status=current_status, message="All exports finished.",
+                  result={"exports": exports, "total_seconds": total_seconds}, progress=100)
+    print(f"[{job_id}] ✅ All export scripts completed successfully in {total_seconds}s.")
+def train_model(job_id: str, update_status, is_cancelled: Optional[Callable[[], bool]] = None):
     """Trains the model using the exported data."""
+    is_cancelled = is_cancelled or _never_cancelled
     # Initial status set
-    update_status(job_id, status="TRAINING", message="Starting model training...")
+    update_status(job_id, status="TRAINING", message="Starting model training...", progress=0)
     
     print(f"[{job_id}] Running model training...")
     
     try:
-        result = subprocess.run(
+        result = _run_cancellable(
             ["python", TRAIN_SCRIPT],
-            capture_output=True, text=True, check=True,
+            is_cancelled, text=True,
         )
         print(f"[{job_id}] Model training complete.")
-        update_status(job_id, status="TRAINING", message="Model training complete.")
+        update_status(job_id, status="TRAINING", message="Model training complete.", progress=70)
         
+    except JobCancelled:
+        raise
+
     except subprocess.CalledProcessError as e:
         error_message = f"Model training failed: {e.stderr[:500]}"
         print(f"[{job_id}] ERROR: {error_message}\nFull stderr:\n{e.stderr}")
@@ -128,25 +240,28 @@ def train_model(job_id: str, update_status):
         raise RuntimeError(error_message)
 
 
-def evaluate_model(job_id: str, update_status):
+def evaluate_model(job_id: str, update_status, is_cancelled: Optional[Callable[[], bool]] = None):
     """Runs the model evaluation script."""
-    update_status(job_id, status="EVALUATING", message="Running model evaluation...")
+    is_cancelled = is_cancelled or _never_cancelled
+    update_status(job_id, status="EVALUATING", message="Running model evaluation...", progress=70)
     print(f"[{job_id}] Running model evaluation...")
     
     try:
-        result = subprocess.run(
+        result = _run_cancellable(
             ["python", EVALUATE_SCRIPT],
-            capture_output=True, 
+            is_cancelled,
             text=True, 
-            check=True,
             encoding='utf-8'
         )
         
         print(f"[{job_id}] Model evaluation complete.")
         
-        update_status(job_id, status="COMPLETED", message="Model evaluation complete.")
+        update_status(job_id, status="EVALUATING", message="Model evaluation complete.", progress=100)
 
 
+    except JobCancelled:
+        raise
+
     except subprocess.CalledProcessError as e:
         # Fix encoding here too just in case stderr has special chars
         error_message = f"Model evaluation failed: {e.stderr[:500]}"
@@ -161,39 +276,14 @@ def evaluate_model(job_id: str, update_status):
         raise RuntimeError(error_message)
 
 
-# --- Wrappers for Background Tasks ---
-def run_export_task(job_id: str, update_status_callback):
-    global is_processing_running
-    try:
-        export_data(job_id, update_status_callback)
-        # Only reached if export_data doesn't raise an error
-        update_status_callback(job_id, status="COMPLETED", message="Data export finished successfully.")
-    except RuntimeError as e: # Catch the specific error raised by export_data on failure
-        # Status "FAILED" was already set inside export_data
-        print(f"Export task failed for job {job_id} due to subprocess error: {e}")
-    except Exception as e: # Catch other unexpected errors in this wrapper
-        print(f"Unexpected error in export task wrapper for job {job_id}: {e}")
-        # Ensure status is set to FAILED if not already set
-        update_status_callback(job_id, status="FAILED", error=f"Unexpected wrapper error: {str(e)}")
-    finally:
-        is_processing_running = False # Release lock *always*
-        print(f"[{job_id}] Export task finished or failed, lock released.")
+# --- Job Handlers (run by job_queue.JobQueue, one job at a time) ---
+# Failures and cancellations propagate to the queue, which records the final state.
+def run_export_task(job_id: str, update_status_callback, is_cancelled: Optional[Callable[[], bool]] = None):
+    export_data(job_id, update_status_callback, is_cancelled)
+    update_status_callback(job_id, status="COMPLETED", message="Data export finished successfully.", progress=100)
 
-def run_train_eval_task(job_id: str, update_status_callback):
-    global is_processing_running
-    eval_results = None
-    try:
-        # --- Make sure calls inside train/evaluate provide 'status' ---
-        train_model(job_id, update_status_callback)
-        eval_results = evaluate_model(job_id, update_status_callback)
-        # --- Ensure success call provides 'status' ---
-        update_status_callback(job_id, status="COMPLETED", message="Training and evaluation finished successfully.", result=eval_results) # Ensure status="COMPLETED"
-    except Exception as e:
-        # --- Ensure error call provides 'status' ---
-        print(f"Train/Eval task failed for job {job_id}: {e}")
-        update_status_callback(job_id, status="FAILED", error=str(e)) # Ensure status="FAILED"
-    finally:
-        # --- CRITICAL: Ensure lock is released ---
-        is_processing_running = False # Release lock *always*
-        print(f"[{job_id}] Train/Eval task finished, lock released.")
-        # ----------------------------------------
\ No newline at end of file
+def run_train_eval_task(job_id: str, update_status_callback, is_cancelled: Optional[Callable[[], bool]] = None):
+    train_model(job_id, update_status_callback, is_cancelled)
+    eval_results = evaluate_model(job_id, update_status_callback, is_cancelled)
+    update_status_callback(job_id, status="COMPLETED", message="Training and evaluation finished successfully.",
+                           result=eval_results, progress=100)
@@ -0,0 +1,85 @@
+"""
+Multi-worker launcher for the recommendation API.
+
+Builds the immutable recommender artifacts (dish embedding matrix + ids) ONCE,
+writes them under SHARED_ARTIFACT_DIR, then starts N uvicorn workers that
+memory-map them instead of each recomputing and holding a private copy. Model
+weights are loaded with torch's mmap loader in shared mode, and torch intra-op
+threads are sized per worker (cpu_count // workers) to avoid oversubscription.
+
+Run from the project root (same as `uvicorn server.main:app`):
+    python server/serve.py --workers 4 --port 8000
+"""
+
+import os
+import sys
+import argparse
+import multiprocessing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+MODEL_PATH = './server/model/best_model.pth'
+MODEL_INFO_PATH = './server/model/model_info.json'
+DATA_DIR = "server/src/data/exported_data/"
+DEFAULT_ARTIFACT_DIR = "./server/model/shared"
+DEFAULT_SERVING_DATA_DIR = "./server/model/serving"
+
+
+def prepare_shared_artifacts(artifact_dir: str, force: bool = False):
+    """Computes the dish embedding index and serving tables once, for the workers to mmap / read."""
+    from server.src.shared_artifacts import shared_artifacts_valid, configure_torch_threads
+
+    if not (os.path.exists(MODEL_PATH) and os.path.exists(MODEL_INFO_PATH)):
+        print(f"Model files missing at {MODEL_PATH}; workers will start without the recommender.")
+        return
+    from server.src.contextual_scoring import ItemContextScorer, UserProjectionCache
+    has_static = all(
+        os.path.exists(os.path.join(artifact_dir, name))
+        for name in (ItemContextScorer.STATIC_FILE, UserProjectionCache.STATIC_FILE, UserProjectionCache.IDS_FILE)
+    )
+    if not force and has_static and shared_artifacts_valid(artifact_dir, MODEL_PATH, DATA_DIR):
+        print(f"Shared artifacts in {artifact_dir} are up to date.")
+        return
+
+    configure_torch_threads(1)
+    from server.src.evaluate import ModelEvaluator
+    serving_data_dir = os.getenv("SERVING_DATA_DIR", DEFAULT_SERVING_DATA_DIR) or None
+    evaluator = ModelEvaluator(MODEL_PATH, MODEL_INFO_PATH, DATA_DIR, serving_data_dir=serving_data_dir)
+    evaluator.save_shared_artifacts(artifact_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the API with several workers sharing model artifacts')
+    parser.add_argument('--workers', type=int, default=int(os.getenv("API_WORKERS", "2")))
+    parser.add_argument('--host', default=os.getenv("API_HOST", "0.0.0.0"))
+    parser.add_argument('--port', type=int, default=int(os.getenv("API_PORT", "8000")))
+    parser.add_argument('--artifact-dir', default=os.getenv("SHARED_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild shared artifacts even if up to date')
+    parser.add_argument('--prepare-only', action='store_true', help='Only build the shared artifacts')
+    args = parser.parse_args()
+
+    # Build artifacts in a throwaway process so the supervisor itself stays small
+    ctx = multiprocessing.get_context("spawn")
+    builder = ctx.Process(target=prepare_shared_artifacts, args=(args.artifact_dir, args.rebuild))
+    builder.start()
+    builder.join()
+    if builder.exitcode != 0:
+        print("Failed to build shared artifacts; workers will compute their own.")
+
+    if args.prepare_only:
+        return
+
+    # Inherited by every worker process
+    os.environ["SHARED_ARTIFACT_DIR"] = args.artifact_dir
+    os.environ["API_WORKERS"] = str(args.workers)
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")]))
+
+    import uvicorn
+    uvicorn.run("server.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import json
+import math
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from starlette.responses import Response
+
+from server.src.id_vocab import IdVocabulary
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# Dish fields returned next to the score by the recommendation endpoints
+DISH_RESPONSE_COLUMNS = ('name', 'cuisine', 'price', 'category')
+
+
+def _to_builtin(value: Any) -> Any:
+    """Python scalar for a NumPy / pandas value; missing and non-finite values become None."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _jsonable(obj: Any) -> Any:
+    # Stdlib fallback only: orjson handles NumPy scalars / arrays natively
+    if isinstance(obj, np.ndarray):
+        return [_jsonable(v) for v in obj.tolist()]
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    return _to_builtin(obj)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response rendered by orjson, which serializes NumPy scalars and arrays
+    directly (NaN / inf become null). Endpoints return it as-is, skipping
+    FastAPI's recursive jsonable_encoder pass. Without orjson it falls back to
+    the stdlib encoder.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            _jsonable(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+class DishResponseTable:
+    """
+    The dish fields the API returns, converted once when the model is loaded:
+    one list of Python values per column (NaN -> None, NumPy -> builtin), so
+    building a response is an id lookup per result instead of a DataFrame filter
+    and per-field casting.
+    """
+
+    def __init__(self, dishes_df: pd.DataFrame, columns: Sequence[str] = DISH_RESPONSE_COLUMNS):
+        df = dishes_df[dishes_df['id'].notna()].drop_duplicates(subset='id', keep='first')
+        self._rows = IdVocabulary(df['id'].astype(object), start=0, specials={})
+        self._ids = [_to_builtin(v) for v in df['id'].astype(object)]
+        self._columns: Dict[str, List[Any]] = {
+            col: [_to_builtin(v) for v in df[col].astype(object)] for col in columns if col in df.columns
+        }
+
+    def records(self, recs: Iterable[Tuple[str, float]],
+                columns: Sequence[str] = DISH_RESPONSE_COLUMNS) -> List[Dict[str, Any]]:
+        """[{dish_id, <columns>, score}] for (dish_id, score) results; unknown dishes are skipped."""
+        results = []
+        for dish_id, score in recs:
+            row = self._rows.get(dish_id)
+            if row is None:
+                continue
+            record = {"dish_id": self._ids[row]}
+            for col in columns:
+                values = self._columns.get(col)
+                record[col] = values[row] if values is not None else None
+            record["score"] = _to_builtin(score)
+            results.append(record)
+        return results
+
+    def __contains__(self, dish_id: str) -> bool:
+        return dish_id in self._rows
+
+    def __len__(self) -> int:
+        return self._rows.num_keys
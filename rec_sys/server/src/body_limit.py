@@ -0,0 +1,79 @@
+import json
+from typing import Dict
+
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware capping the request body size of selected paths before the
+    endpoint (and Starlette's multipart parser) sees it: a declared
+    Content-Length over the limit is refused right away, otherwise the body is
+    counted as it is received and the request is aborted with 413 as soon as it
+    goes over, so an oversized upload is never fully read or spooled.
+
+    `limits` maps a path to its maximum body size in bytes.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                if int(content_length) > max_bytes:
+                    await self._reject(send, max_bytes)
+                    return
+            except ValueError:
+                pass
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Answer 413 here: the app may turn the error below into its own
+                    # response (e.g. a 400 from the body parser), which is then dropped
+                    if not response_started and not rejected:
+                        rejected = True
+                        await self._reject(send, max_bytes)
+                    raise RequestBodyTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except RequestBodyTooLarge:
+            pass
+
+    @staticmethod
+    async def _reject(send, max_bytes: int):
+        body = json.dumps({"detail": f"Request body exceeds the {max_bytes // (1024 * 1024)}MB upload limit."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
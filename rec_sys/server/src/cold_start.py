@@ -0,0 +1,115 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import torch
+
+# price_range value -> (min_price, max_price), bounds inclusive and optional
+PRICE_BANDS = {
+    'budget': (None, 60000),
+    'mid': (60000, 70000),
+    'premium': (70000, None),
+}
+
+# Preference fields that name tags (each one contributes the mean of its tag centroids)
+TAG_PREFERENCES = ('cuisine', 'taste')
+
+
+def price_bands_of(price) -> List[str]:
+    """The bands (see PRICE_BANDS) containing `price`; none for a missing price."""
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return []
+    if math.isnan(price):
+        return []
+    return [
+        band for band, (min_price, max_price) in PRICE_BANDS.items()
+        if (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
+    ]
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [v for v in value if isinstance(v, str)]
+
+
+class ColdStartEmbedder:
+    """
+    Builds a proxy embedding for a user / dish without history from its preferences.
+
+    The vector is a normalized weighted sum of precomputed centroids: the mean of
+    the tag centroids for each tag preference (cuisine, taste) plus the centroid of
+    the requested price band, so building one costs O(number of tags) instead of a
+    catalog scan. Results are cached by preference signature (call `clear()` once
+    the centroids change); unknown tags are ignored, and with nothing known the
+    catalog centroid is used. The cache is shared by the request threads and
+    guarded by a lock.
+    """
+
+    def __init__(self, tag_centroids: Dict[str, torch.Tensor], price_centroids: Dict[str, torch.Tensor],
+                 fallback: torch.Tensor, tag_weight: float = 1.0, price_weight: float = 1.0,
+                 cache_size: int = 1024):
+        self.tag_centroids = tag_centroids
+        self.price_centroids = price_centroids
+        self.fallback = fallback
+        self.tag_weight = tag_weight
+        self.price_weight = price_weight
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, torch.Tensor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(preferences: Optional[Dict]) -> Tuple:
+        """Order-insensitive key of the preference fields the embedding depends on."""
+        preferences = preferences or {}
+        tags = tuple(tuple(sorted(set(_as_list(preferences.get(field))))) for field in TAG_PREFERENCES)
+        return tags + (preferences.get('price_range') or 'any',)
+
+    def _mean(self, tags: Iterable[str]) -> Optional[torch.Tensor]:
+        vectors = [self.tag_centroids[tag] for tag in tags if tag in self.tag_centroids]
+        return torch.stack(vectors).mean(dim=0) if vectors else None
+
+    def _compose(self, signature: Tuple) -> torch.Tensor:
+        *tag_groups, price_range = signature
+        parts = []
+        for tags in tag_groups:
+            centroid = self._mean(tags)
+            if centroid is not None:
+                parts.append(self.tag_weight * centroid)
+        band = self.price_centroids.get(price_range)
+        if band is not None:
+            parts.append(self.price_weight * band)
+
+        if not parts:
+            return self.fallback
+        return torch.nn.functional.normalize(torch.stack(parts).sum(dim=0), p=2, dim=0)
+
+    def embedding(self, preferences: Optional[Dict]) -> torch.Tensor:
+        key = self.signature(preferences)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                return vector
+
+        # Composed outside the lock: a concurrent miss on the same key just computes it twice
+        vector = self._compose(key)
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cache)
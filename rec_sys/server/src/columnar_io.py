@@ -0,0 +1,201 @@
+import os
+import ast
+import json
+import tempfile
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+    PARQUET_AVAILABLE = False
+
+# Column typing shared by the exporters and DataPreprocessor. Columns are only
+# converted when present, so one registry covers every exported table.
+LIST_COLUMNS = {
+    # dishes
+    'food_tags', 'taste_tags', 'cooking_method_tags', 'culture_tags', 'dish_tags',
+    # users
+    'liked_tags', 'disliked_tags', 'allergy_tags', 'recent_history_dishes',
+    'allergy', 'dislike_taste', 'dislike_food', 'dislike_cooking_method', 'dislike_culture',
+    'like_taste', 'like_food', 'like_cooking_method', 'like_culture',
+    # stores
+    'system_categories',
+}
+TIMESTAMP_COLUMNS = {'timestamp', 'created_at', 'updated_at'}
+STRUCT_COLUMNS = {'context'}
+
+PARQUET_COMPRESSION = "zstd"
+
+
+def parse_list(x: Any) -> list:
+    """Python list from a typed value, a JSON string or a Python-literal string."""
+    if isinstance(x, list):
+        return x
+    if isinstance(x, (np.ndarray, tuple)):
+        return list(x)
+    if not isinstance(x, str) or not x.strip():
+        return []
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            value = parse(x)
+            return list(value) if isinstance(value, (list, tuple)) else []
+        except (ValueError, SyntaxError, TypeError):
+            continue
+    return []
+
+
+def parse_struct(x: Any) -> Dict[str, Any]:
+    """Dict from a typed value, a JSON string or a Python-literal string."""
+    if isinstance(x, dict):
+        return x
+    if not isinstance(x, str) or not x.strip():
+        return {}
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            value = parse(x)
+            return value if isinstance(value, dict) else {}
+        except (ValueError, SyntaxError, TypeError):
+            continue
+    return {}
+
+
+def to_typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Parses list / timestamp / struct columns so they can be stored with real types."""
+    df = df.copy()
+    for col in df.columns:
+        if col in LIST_COLUMNS:
+            df[col] = [[str(v) for v in parse_list(x)] for x in df[col]]
+        elif col in TIMESTAMP_COLUMNS:
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='ISO8601')
+        elif col in STRUCT_COLUMNS:
+            df[col] = [parse_struct(x) for x in df[col]]
+    return df
+
+
+def _to_csv_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Serializes typed list / struct columns back to JSON text for CSV."""
+    df = df.copy()
+    for col in df.columns:
+        if col in LIST_COLUMNS or col in STRUCT_COLUMNS:
+            df[col] = [
+                json.dumps(list(x) if isinstance(x, np.ndarray) else x, ensure_ascii=False)
+                if isinstance(x, (list, dict, np.ndarray)) else x
+                for x in df[col]
+            ]
+    return df
+
+
+def _to_arrow_table(df: pd.DataFrame) -> "pa.Table":
+    df = to_typed_frame(df)
+    fields, arrays = [], []
+    for col in df.columns:
+        if col in LIST_COLUMNS:
+            array = pa.array(df[col].tolist(), type=pa.list_(pa.string()))
+        elif col in STRUCT_COLUMNS:
+            # Struct fields are the union of keys; with no keys at all (e.g. an
+            # empty context column) a struct cannot be stored, so keep JSON text
+            values = df[col].tolist()
+            if any(values):
+                array = pa.array(values)
+            else:
+                array = pa.array([json.dumps(v) for v in values], type=pa.string())
+        else:
+            array = pa.Array.from_pandas(df[col])
+        fields.append(pa.field(col, array.type))
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def write_frame(df: pd.DataFrame, path: str) -> str:
+    """
+    Writes a DataFrame as Parquet (typed) or CSV, based on the file extension.
+    The file is written under a unique temporary name and moved into place, so
+    concurrent writers never share a partial file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        if path.endswith(".parquet"):
+            pq.write_table(_to_arrow_table(df), tmp_path, compression=PARQUET_COMPRESSION)
+        else:
+            _to_csv_frame(df).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    """Reads a Parquet or CSV file; Parquet list columns come back as Python lists."""
+    if not path.endswith(".parquet"):
+        return pd.read_csv(path)
+
+    df = pd.read_parquet(path)
+    for col in df.columns:
+        if col in LIST_COLUMNS:
+            df[col] = [list(x) if x is not None else [] for x in df[col]]
+        elif col in STRUCT_COLUMNS and df[col].dtype == object:
+            df[col] = [parse_struct(x) for x in df[col]]
+    return df
+
+
+def resolve_format(fmt: Optional[str] = None) -> str:
+    """'parquet' unless CSV is requested or pyarrow is not installed."""
+    fmt = (fmt or os.getenv("DATA_FORMAT", "parquet")).lower()
+    if fmt == "parquet" and not PARQUET_AVAILABLE:
+        print("⚠️ pyarrow is not installed, falling back to CSV.")
+        return "csv"
+    return fmt
+
+
+def table_path(directory: str, stem: str) -> Optional[str]:
+    """
+    The file to load for a table: `<stem>.parquet` when it exists and is at least
+    as new as `<stem>.csv` (Node exports rewrite the CSV), otherwise the CSV.
+    """
+    parquet_path = os.path.join(directory, f"{stem}.parquet")
+    csv_path = os.path.join(directory, f"{stem}.csv")
+    has_parquet = PARQUET_AVAILABLE and os.path.exists(parquet_path)
+    has_csv = os.path.exists(csv_path)
+    if has_parquet and (not has_csv or os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)):
+        return parquet_path
+    return csv_path if has_csv else None
+
+
+def read_table(directory: str, stem: str) -> pd.DataFrame:
+    path = table_path(directory, stem)
+    if path is None:
+        raise FileNotFoundError(os.path.join(directory, f"{stem}.csv"))
+    return read_frame(path)
+
+
+def write_table(df: pd.DataFrame, directory: str, stem: str, fmt: Optional[str] = None) -> str:
+    return write_frame(df, os.path.join(directory, f"{stem}.{resolve_format(fmt)}"))
+
+
+def convert_csv_directory(directory: str, stems: Iterable[str]) -> Dict[str, str]:
+    """Writes a typed Parquet copy of each `<stem>.csv` (used after the Node exports)."""
+    converted = {}
+    if not PARQUET_AVAILABLE:
+        return converted
+    for stem in stems:
+        csv_path = os.path.join(directory, f"{stem}.csv")
+        if not os.path.exists(csv_path):
+            continue
+        try:
+            df = pd.read_csv(csv_path)
+        except pd.errors.EmptyDataError:
+            continue
+        converted[stem] = write_frame(df, os.path.join(directory, f"{stem}.parquet"))
+    return converted
@@ -0,0 +1,172 @@
+import os
+import json
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+
+from src.id_vocab import IdVocabulary
+
+
+def time_bucket(timestamp) -> Tuple[int, int]:
+    """(day_of_week, hour) of a timestamp, the same features the dataset encodes."""
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.weekday(), timestamp.hour
+
+
+def build_bucket_table(context_projection: Callable, device: torch.device = None) -> torch.Tensor:
+    """
+    The time/day contribution for every day of week x hour, as a (7, 24, dim)
+    table, from a model's `item_context_projection` / `user_context_projection`.
+    """
+    days = torch.arange(7).repeat_interleave(24)
+    hours = torch.arange(24).repeat(7)
+    with torch.no_grad():
+        table = context_projection((hours.float() / 24.0).to(device), days.to(device))
+    return table.reshape(7, 24, -1)
+
+
+class ItemContextScorer:
+    """
+    Scores dishes for the request's time of day / day of week without re-running
+    the item tower.
+
+    The item tower output is normalize(P_i + c(h, d)), where P_i is the dish's
+    static partial projection (stored here as one (num_dishes x dim) matrix) and
+    c(h, d) is the time/day contribution, which does not depend on the dish. All
+    7 x 24 contributions are precomputed, so a contextual dot product is
+
+        (P_i . q + c . q) / sqrt(|P_i|^2 + 2 P_i . c + |c|^2)
+
+    i.e. two matrix-vector products per request instead of 168 catalog embeddings.
+    Rows are aligned with the DishEmbeddingIndex rows.
+    """
+
+    STATIC_FILE = "dish_static_projection.npy"
+
+    def __init__(self, static: np.ndarray, bucket_table: torch.Tensor, device: torch.device = None):
+        self.device = device or torch.device("cpu")
+        self.bucket_table = bucket_table.to(self.device)  # (7 days, 24 hours, dim)
+        self._set_static(static)
+
+    def _set_static(self, static: np.ndarray):
+        self._array = static
+        self.static = torch.from_numpy(static).to(self.device)
+        self.sq_norms = (self.static * self.static).sum(dim=1)
+
+    def context_vector(self, timestamp) -> torch.Tensor:
+        day, hour = time_bucket(timestamp)
+        return self.bucket_table[day, hour]
+
+    def scores(self, query: torch.Tensor, timestamp, rows: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """Dot products between `query` and every (or every candidate) dish embedding at `timestamp`."""
+        static = self.static if rows is None else self.static[rows]
+        sq_norms = self.sq_norms if rows is None else self.sq_norms[rows]
+        context = self.context_vector(timestamp)
+        query = query.to(self.device)
+
+        numerator = static @ query + torch.dot(context, query)
+        norms = torch.sqrt(torch.clamp(sq_norms + 2 * (static @ context) + torch.dot(context, context), min=1e-24))
+        return numerator / norms
+
+    def scores_batch(self, queries: torch.Tensor, timestamp) -> torch.Tensor:
+        """Scores of every dish for several queries at one timestamp, as a (num_dishes x num_queries) matrix."""
+        context = self.context_vector(timestamp)
+        queries = queries.to(self.device)
+
+        numerator = self.static @ queries.T + (queries @ context)[None, :]
+        norms = torch.sqrt(torch.clamp(self.sq_norms + 2 * (self.static @ context) + torch.dot(context, context), min=1e-24))
+        return numerator / norms[:, None]
+
+    def __len__(self) -> int:
+        return self.static.shape[0]
+
+    # --- Updates ---
+
+    def upsert(self, row: int, static_vector: torch.Tensor):
+        """Overwrites row `row` or appends it (row == len), mirroring DishEmbeddingIndex.upsert."""
+        values = static_vector.detach().to("cpu", torch.float32).numpy()
+        if row < len(self):
+            if not self._array.flags.writeable:
+                self._array = np.array(self._array)
+            self._array[row] = values
+            self._set_static(self._array)
+        else:
+            self._set_static(np.concatenate([self._array, values[None, :]], axis=0))
+
+    # --- Persistence (shared artifacts) ---
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, self.STATIC_FILE), np.ascontiguousarray(self._array, dtype=np.float32))
+
+    @classmethod
+    def load(cls, directory: str, bucket_table: torch.Tensor, device: torch.device = None,
+             mmap: bool = True) -> Optional["ItemContextScorer"]:
+        """Loads the static projections saved next to the dish index (None if absent)."""
+        path = os.path.join(directory, cls.STATIC_FILE)
+        if not os.path.exists(path):
+            return None
+        return cls(np.load(path, mmap_mode="c" if mmap else None), bucket_table, device=device)
+
+
+class UserProjectionCache:
+    """
+    Each user's static partial user projection (id, age, gender and pooled
+    liked / disliked / allergy tags), so a request only adds the cached time/day
+    contribution for its bucket and normalizes: a vector add instead of a user
+    tower pass. Profiles updated live are kept as per-user overrides.
+    """
+
+    STATIC_FILE = "user_static_projection.npy"
+    IDS_FILE = "user_ids.json"
+
+    def __init__(self, ids: List[str], static: np.ndarray, bucket_table: torch.Tensor, device: torch.device = None):
+        if len(ids) != static.shape[0]:
+            raise ValueError(f"{len(ids)} ids for a matrix with {static.shape[0]} rows.")
+        self.device = device or torch.device("cpu")
+        self.bucket_table = bucket_table.to(self.device)  # (7 days, 24 hours, dim)
+        self.rows = IdVocabulary(ids, start=0, specials={})
+        self._array = static
+        self.static = torch.from_numpy(static).to(self.device)
+        self._overrides = {}
+
+    def get(self, user_id: str) -> Optional[torch.Tensor]:
+        """The cached static projection of a user (None when not cached)."""
+        if user_id in self._overrides:
+            return self._overrides[user_id]
+        row = self.rows.get(user_id)
+        return None if row is None else self.static[row]
+
+    def set(self, user_id: str, static_vector: torch.Tensor):
+        """Caches a recomputed projection, e.g. after a live profile update."""
+        self._overrides[user_id] = static_vector.detach().to(self.device)
+
+    def embedding(self, static_vector: torch.Tensor, timestamp) -> torch.Tensor:
+        """Normalized user embedding at `timestamp` (equal to forward_user at that time)."""
+        day, hour = time_bucket(timestamp)
+        return torch.nn.functional.normalize(static_vector + self.bucket_table[day, hour], p=2, dim=-1)
+
+    def __len__(self) -> int:
+        return self.rows.num_keys
+
+    # --- Persistence (shared artifacts) ---
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, self.STATIC_FILE), np.ascontiguousarray(self._array, dtype=np.float32))
+        with open(os.path.join(directory, self.IDS_FILE), "w", encoding="utf-8") as f:
+            json.dump(list(self.rows.keys_in_order()), f)
+
+    @classmethod
+    def load(cls, directory: str, bucket_table: torch.Tensor, device: torch.device = None,
+             mmap: bool = True) -> Optional["UserProjectionCache"]:
+        """Loads the saved user projections (None if absent)."""
+        path = os.path.join(directory, cls.STATIC_FILE)
+        ids_path = os.path.join(directory, cls.IDS_FILE)
+        if not (os.path.exists(path) and os.path.exists(ids_path)):
+            return None
+        with open(ids_path, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(ids, np.load(path, mmap_mode="c" if mmap else None), bucket_table, device=device)
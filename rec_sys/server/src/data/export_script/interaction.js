@@ -19,15 +19,36 @@ require("../../../../../models/dishes.model");
 require("../../../../../models/orders.model");
 require("../../../../../models/order_items.model");
 require("../../../../../models/ratings.model");
+require("../../../../../models/order_ship_infos.model");
 
 // 🧩 Load models
 const Order = mongoose.model("orders");
 const OrderItem = mongoose.model("order_items");
 const Rating = mongoose.model("ratings");
+const OrderShipInfo = mongoose.model("order_ship_infos");
 
 const exportDir = path.join(__dirname, '..', 'exported_data');
 const OUTPUT_PATH = path.join(exportDir, 'interaction.csv');
 
+// Context is exported as plain columns (device, location, time_of_day) so the
+// Python loader never has to parse a per-row dict. Buckets use local time.
+const LOCAL_UTC_OFFSET_HOURS = 7; // Asia/Ho_Chi_Minh
+function timeOfDay(date) {
+  if (!date) return "";
+  const hour = (date.getUTCHours() + LOCAL_UTC_OFFSET_HOURS) % 24;
+  if (hour >= 5 && hour < 10) return "morning";
+  if (hour >= 10 && hour < 14) return "lunch";
+  if (hour >= 14 && hour < 17) return "afternoon";
+  if (hour >= 17 && hour < 21) return "dinner";
+  return "late_night";
+}
+
+// Timestamps are written as "YYYY-MM-DD HH:MM:SS.mmm" (UTC), matching
+// INTERACTION_TIMESTAMP_FORMAT in data_preprocessor.py
+function formatTimestamp(date) {
+  return date ? date.toISOString().replace("T", " ").replace("Z", "") : "";
+}
+
 async function exportInteractions() {
   try {
     console.log("⏳ Fetching orders...");
@@ -45,6 +66,17 @@ async function exportInteractions() {
     console.log("⏳ Fetching ratings...");
     const ratings = await Rating.find().lean();
 
+    console.log("⏳ Fetching ship locations...");
+    const shipInfos = await OrderShipInfo.find({}, "orderId shipLocation").lean();
+    const shipLocationMap = {};
+    shipInfos.forEach(info => {
+      const coords = info.shipLocation?.coordinates;
+      if (Array.isArray(coords) && coords.length === 2) {
+        // GeoJSON Point: [lng, lat]
+        shipLocationMap[info.orderId.toString()] = { lat: coords[1], lon: coords[0] };
+      }
+    });
+
     // Map ratings by orderId + dishId for quick lookup
     const ratingMap = {};
     ratings.forEach(r => {
@@ -52,7 +84,7 @@ async function exportInteractions() {
       ratingMap[key] = r.ratingValue || "";
     });
 
-    let csv = "interaction_id,user_id,dish_id,store_id,order_id,rating_value,quantity,final_price,status,timestamp,context\n";
+    let csv = "interaction_id,user_id,dish_id,store_id,order_id,rating_value,quantity,final_price,status,timestamp,device,location_lat,location_lon,time_of_day\n";
 
     orderItems.forEach((item, index) => {
       const order = item.orderId;
@@ -66,10 +98,13 @@ async function exportInteractions() {
       const quantity = item.quantity || 1;
       const final_price = item.lineTotal || item.price * item.quantity || 0;
       const status = order.status || "pending";
-      const timestamp = order.createdAt?.toISOString().replace("T", " ").replace("Z", "") || "";
-      const context = ""; // left empty intentionally
+      const createdAt = order.createdAt ? new Date(order.createdAt) : null;
+      const timestamp = formatTimestamp(createdAt);
+      const device = order.device || "unknown"; // not tracked on orders yet
+      const location = shipLocationMap[order_id] || { lat: "", lon: "" };
+      const time_of_day = timeOfDay(createdAt);
 
-      csv += `interaction_${index + 1},${user_id},${dish_id},${store_id},${order_id},${rating_value},${quantity},${final_price},${status},${timestamp},${context}\n`;
+      csv += `interaction_${index + 1},${user_id},${dish_id},${store_id},${order_id},${rating_value},${quantity},${final_price},${status},${timestamp},${device},${location.lat},${location.lon},${time_of_day}\n`;
     });
 
     // Create export folder if needed
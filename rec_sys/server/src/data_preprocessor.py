@@ -1,8 +1,9 @@
 import ast
 import os
+import json
 import sys
 import random
-from typing import Dict, Any
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
 import numpy as np
@@ -11,6 +12,24 @@ import torch
 # Add parent directory to path to allow importing local modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.columnar_io import parse_struct, read_frame, table_path
+
+# interaction.js writes "YYYY-MM-DD HH:MM:SS.mmm"; parsing with an explicit format
+# avoids per-row format inference. Other layouts fall back to ISO 8601 parsing.
+INTERACTION_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Interaction context, exported as plain columns (formerly a per-row dict string)
+CONTEXT_COLUMNS = ['device', 'location_lat', 'location_lon', 'time_of_day']
+CONTEXT_DEFAULTS = {'device': 'unknown', 'time_of_day': 'unknown'}
+LOCAL_UTC_OFFSET_HOURS = 7  # Asia/Ho_Chi_Minh, same buckets as interaction.js
+TIME_OF_DAY_BINS = [0, 5, 10, 14, 17, 21, 24]
+TIME_OF_DAY_LABELS = ['late_night', 'morning', 'lunch', 'afternoon', 'dinner', 'late_night']
+
+# Compact in-memory dtypes: repeated string ids / labels become categoricals
+# (one copy of each distinct string + small integer codes) and numbers are downcast.
+ID_COLUMNS = ['id', 'user_id', 'dish_id', 'store_id']
+CATEGORICAL_COLUMNS = ['category', 'gender', 'device', 'time_of_day', 'status', 'event_type', 'interaction_type']
+
 # Set random seeds to ensure results are reproducible
 torch.manual_seed(42)
 np.random.seed(42)
@@ -26,30 +45,36 @@ class DataPreprocessor:
     def __init__(self, data_dir: str):
         self.data_dir = data_dir
 
-    def load_data(self) -> Dict[str, pd.DataFrame]:
+    def load_data(self, tables: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
         """
-        Loads all required CSV files from the data directory into a dictionary of DataFrames.
+        Loads all required tables from the data directory into a dictionary of DataFrames.
+        Typed Parquet files (list / timestamp / struct columns) are preferred when
+        present and up to date; otherwise the CSV export is read.
+        `tables` restricts loading to those keys (e.g. ['users', 'dishes'] for serving).
         """
         data = {}
         files_to_load = {
-            'users': 'users.csv',
-            'dishes': 'dishes.csv',
-            'interactions': 'interaction.csv',
-            'stores': 'stores.csv',
+            'users': 'users',
+            'dishes': 'dishes',
+            'interactions': 'interaction',
+            'stores': 'stores',
             
-            'food_tags': 'food_tags.csv',
-            'taste_tags': 'taste_tags.csv',
-            'cooking_method_tags': 'cooking_method_tags.csv',
-            'culture_tags': 'culture_tags.csv'
+            'food_tags': 'food_tags',
+            'taste_tags': 'taste_tags',
+            'cooking_method_tags': 'cooking_method_tags',
+            'culture_tags': 'culture_tags'
         }
+        if tables is not None:
+            files_to_load = {key: stem for key, stem in files_to_load.items() if key in tables}
 
         print(f"Loading data from: {self.data_dir}...")
 
-        for key, filename in files_to_load.items():
-            file_path = os.path.join(self.data_dir, filename)
+        for key, stem in files_to_load.items():
+            file_path = table_path(self.data_dir, stem) or os.path.join(self.data_dir, f"{stem}.csv")
+            filename = os.path.basename(file_path)
             
             try:
-                df = pd.read_csv(file_path)
+                df = read_frame(file_path)
                 
                 # Check for empty files immediately
                 if df.empty:
@@ -75,12 +100,17 @@ class DataPreprocessor:
     def _safe_literal_eval(self, x: Any, default_value: Any = None) -> Any:
         """
         Safely parses a string containing a Python literal (like a dict or list).
+        Values already typed (lists / dicts from Parquet) are returned as-is.
         Returns a default value if parsing fails or input is not a string.
         """
         if default_value is None:
             default_value = {}
 
-        if pd.isna(x) or not isinstance(x, str):
+        if isinstance(x, (list, dict)):
+            return x
+        if isinstance(x, np.ndarray):
+            return x.tolist()
+        if not isinstance(x, str) or pd.isna(x):
             return default_value
 
         try:
@@ -89,6 +119,117 @@ class DataPreprocessor:
             # If data is corrupted or malformed, return the default
             return default_value
 
+    def _parse_timestamps(self, values: pd.Series) -> pd.Series:
+        """Vectorized timestamp parsing with the export's explicit format."""
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        parsed = pd.to_datetime(values, format=INTERACTION_TIMESTAMP_FORMAT, errors='coerce')
+        # Rows in another layout (e.g. older exports) get a second, ISO 8601 pass
+        retry = parsed.isna() & values.notna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(values[retry], format='ISO8601', errors='coerce')
+        return parsed
+
+    def _expand_context(self, interactions: pd.DataFrame) -> pd.DataFrame:
+        """
+        Ensures the CONTEXT_COLUMNS exist as plain columns. New exports already have
+        them; a legacy `context` column is expanded by parsing each distinct
+        value once (not once per row), and a missing time_of_day is derived from
+        the timestamp with vectorized binning.
+        """
+        if 'context' in interactions.columns:
+            raw = interactions.pop('context')
+            present = raw.map(lambda x: isinstance(x, dict) or (isinstance(x, str) and x.strip() not in ('', '{}')))
+            if present.any():
+                values = raw[present]
+                codes, uniques = pd.factorize(values.map(lambda x: x if isinstance(x, str) else json.dumps(x, sort_keys=True)))
+                parsed = [parse_struct(u) for u in uniques]
+                expanded = pd.DataFrame([parsed[c] for c in codes], index=values.index)
+                for col in CONTEXT_COLUMNS:
+                    if col in expanded.columns and col not in interactions.columns:
+                        interactions[col] = expanded[col].reindex(interactions.index)
+
+        if 'time_of_day' not in interactions.columns:
+            interactions['time_of_day'] = np.nan
+        interactions['time_of_day'] = interactions['time_of_day'].astype(object)
+        missing_bucket = interactions['time_of_day'].isna() | (interactions['time_of_day'] == '')
+        if missing_bucket.any():
+            local_hours = (interactions.loc[missing_bucket, 'timestamp'].dt.hour + LOCAL_UTC_OFFSET_HOURS) % 24
+            interactions.loc[missing_bucket, 'time_of_day'] = pd.cut(
+                local_hours, bins=TIME_OF_DAY_BINS, labels=TIME_OF_DAY_LABELS, right=False, ordered=False
+            ).astype(object)
+
+        for col in CONTEXT_COLUMNS:
+            if col not in interactions.columns:
+                interactions[col] = CONTEXT_DEFAULTS.get(col, np.nan)
+            elif col in CONTEXT_DEFAULTS:
+                interactions[col] = interactions[col].fillna(CONTEXT_DEFAULTS[col])
+        return interactions
+
+    def compact_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Shrinks a loaded table in place: id and low-cardinality label columns become
+        categoricals, integer columns are downcast to the smallest integer type and
+        float columns to float32 only when every value survives the round-trip
+        exactly (e.g. whole prices); others such as ratings or coordinates stay float64.
+        """
+        for col in df.columns:
+            values = df[col]
+            if col in ID_COLUMNS or col in CATEGORICAL_COLUMNS:
+                is_text = pd.api.types.is_string_dtype(values) or pd.api.types.is_object_dtype(values)
+                if is_text and values.map(lambda x: isinstance(x, str) or x is None or x != x).all():
+                    df[col] = values.astype('category')
+            elif pd.api.types.is_bool_dtype(values):
+                continue
+            elif pd.api.types.is_integer_dtype(values):
+                df[col] = pd.to_numeric(values, downcast='integer')
+            elif pd.api.types.is_float_dtype(values):
+                original = values.to_numpy(dtype=np.float64)
+                narrowed = original.astype(np.float32)
+                if np.array_equal(narrowed.astype(np.float64), original, equal_nan=True):
+                    df[col] = narrowed
+        return df
+
+    def preprocess_users(self, users: pd.DataFrame) -> pd.DataFrame:
+        """Parses the users' tag list columns (missing columns become empty lists)."""
+        # Convert the new CSV columns from string "['A', 'B']" to Python Lists ['A', 'B']
+        # If column is missing (old CSV), fill with empty list
+        for col in ['liked_tags', 'disliked_tags', 'allergy_tags']:
+            if col in users.columns:
+                users[col] = users[col].apply(
+                    lambda x: self._safe_literal_eval(x, default_value=[])
+                )
+            else:
+                print(f"Warning: '{col}' missing in users.csv. Filling with empty lists.")
+                users[col] = [[] for _ in range(len(users))]
+        return users
+
+    def preprocess_dishes(self, dishes: pd.DataFrame) -> pd.DataFrame:
+        """Fills missing dish price / rating / category and tag columns."""
+        # Define default values for essential columns
+        defaults = {
+            'price': 0,
+            'rating': 3.0,
+            'category': 'unknown_category'
+        }
+
+        # Fill missing numerical/categorical values
+        for col, default_val in defaults.items():
+            if col not in dishes.columns:
+                print(f"Warning: '{col}' column missing in dishes. Creating it with default: {default_val}")
+                dishes[col] = default_val
+            else:
+                dishes[col] = dishes[col].fillna(default_val)
+
+        # Fill missing tag columns with an empty list string representation
+        tag_cols = ['food_tags', 'taste_tags', 'cooking_method_tags', 'culture_tags']
+        for tag_col in tag_cols:
+            if tag_col not in dishes.columns:
+                dishes[tag_col] = '[]'
+            else:
+                dishes[tag_col] = dishes[tag_col].fillna('[]')
+        return dishes
+
     def preprocess_data(self, data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
         """
         Cleans and prepares the raw data for model training.
@@ -102,54 +243,27 @@ class DataPreprocessor:
 
         # Convert timestamps and remove invalid rows
         initial_count = len(data['interactions'])
-        data['interactions']['timestamp'] = pd.to_datetime(data['interactions']['timestamp'], errors='coerce')
+        data['interactions']['timestamp'] = self._parse_timestamps(data['interactions']['timestamp'])
         data['interactions'].dropna(subset=['timestamp'], inplace=True)
         
         dropped_count = initial_count - len(data['interactions'])
         if dropped_count > 0:
             print(f"Cleaned Interactions: Dropped {dropped_count} rows due to invalid timestamps.")
 
-        # Parse 'context' column from string to dictionary
-        data['interactions']['context'] = data['interactions']['context'].apply(
-            lambda x: self._safe_literal_eval(x, default_value={})
-        )
+        # Context as real columns (device, location, time_of_day)
+        data['interactions'] = self._expand_context(data['interactions'])
 
         # 2. Handle Users
         if 'users' in data and not data['users'].empty:
-            # Convert the new CSV columns from string "['A', 'B']" to Python Lists ['A', 'B']
-            # If column is missing (old CSV), fill with empty list
-            for col in ['liked_tags', 'disliked_tags', 'allergy_tags']:
-                if col in data['users'].columns:
-                    data['users'][col] = data['users'][col].apply(
-                        lambda x: self._safe_literal_eval(x, default_value=[])
-                    )
-                else:
-                    print(f"Warning: '{col}' missing in users.csv. Filling with empty lists.")
-                    data['users'][col] = [[] for _ in range(len(data['users']))]
+            data['users'] = self.preprocess_users(data['users'])
 
         # 3. Handle Dishes
         if 'dishes' in data and not data['dishes'].empty:
-            # Define default values for essential columns
-            defaults = {
-                'price': 0,
-                'rating': 3.0,
-                'category': 'unknown_category'
-            }
-
-            # Fill missing numerical/categorical values
-            for col, default_val in defaults.items():
-                if col not in data['dishes'].columns:
-                    print(f"Warning: '{col}' column missing in dishes. Creating it with default: {default_val}")
-                    data['dishes'][col] = default_val
-                else:
-                    data['dishes'][col] = data['dishes'][col].fillna(default_val)
+            data['dishes'] = self.preprocess_dishes(data['dishes'])
 
-            # Fill missing tag columns with an empty list string representation
-            tag_cols = ['food_tags', 'taste_tags', 'cooking_method_tags', 'culture_tags']
-            for tag_col in tag_cols:
-                if tag_col not in data['dishes'].columns:
-                    data['dishes'][tag_col] = '[]'
-                else:
-                    data['dishes'][tag_col] = data['dishes'][tag_col].fillna('[]')
+        # 4. Compact dtypes (categorical ids / labels, downcast numerics)
+        for key in ('interactions', 'users', 'dishes', 'stores'):
+            if key in data and not data[key].empty:
+                data[key] = self.compact_dtypes(data[key])
 
         return data
\ No newline at end of file
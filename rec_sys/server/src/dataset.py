@@ -6,16 +6,17 @@ from torch.utils.data import Dataset
 from typing import Dict, List, Tuple, Any
 from datetime import datetime
 from src.data_preprocessor import DataPreprocessor
+from src.id_vocab import IdVocabulary, FrameRowLookup
 import random
 
-class FoodRecommendationDataset(Dataset):
+class FeatureEncoder:
     """
-    PyTorch Dataset that prepares user, dish, and context features 
-    for the recommendation model.
+    Vocabularies, id -> row lookups and feature encoders built from the users and
+    dishes tables only. Used on its own for serving (no interaction history) and
+    as the base of FoodRecommendationDataset for training.
     """
 
-    def __init__(self, interactions_df: pd.DataFrame, users_df: pd.DataFrame, 
-                 dishes_df: pd.DataFrame):
+    def __init__(self, users_df: pd.DataFrame, dishes_df: pd.DataFrame):
         
         # 1. Basic Validation
         if users_df.empty or 'id' not in users_df.columns:
@@ -23,14 +24,13 @@ class FoodRecommendationDataset(Dataset):
         if dishes_df.empty or 'id' not in dishes_df.columns:
             raise ValueError("Dishes DataFrame is empty or missing 'id' column.")
 
-        self.interactions_df = interactions_df
         self.users_df = users_df
         self.dishes_df = dishes_df
 
         # 2. Create Fast Lookups (Index -> Data Row)
-        # This makes retrieving user/dish details during training much faster
-        self.users_lookup = users_df.set_index('id').to_dict('index')
-        self.dishes_lookup = dishes_df.set_index('id').to_dict('index')
+        # Rows are read from the frames' column arrays, not copied into a dict per row
+        self.users_lookup = FrameRowLookup(users_df)
+        self.dishes_lookup = FrameRowLookup(dishes_df)
 
         # 3. Build Vocabularies (Map Strings -> Integer IDs)
         self._create_vocabularies()
@@ -40,36 +40,30 @@ class FoodRecommendationDataset(Dataset):
         Maps categorical data (IDs, Tags) to integers for the Embedding layers.
         """
         # --- Entity Vocabularies ---
-        # We add <UNK> (Unknown) at index 0 to handle missing or new items safely
-        
+        # We add <UNK> (Unknown) at index 0 to handle missing or new items safely.
+        # Vocabularies are sorted id arrays searched with np.searchsorted; the
+        # numbering (first appearance + 1) is unchanged so checkpoints stay valid.
+
         # Users
-        user_ids = self.users_df['id'].unique()
-        self.user_vocab = {uid: idx + 1 for idx, uid in enumerate(user_ids)}
-        self.user_vocab['<UNK>'] = 0
+        self.user_vocab = IdVocabulary(self.users_df['id'].unique())
         self.user_vocab_size = len(self.user_vocab)
 
         # Dishes
-        dish_ids = self.dishes_df['id'].unique()
-        self.dish_vocab = {did: idx + 1 for idx, did in enumerate(dish_ids)}
-        self.dish_vocab['<UNK>'] = 0
+        self.dish_vocab = IdVocabulary(self.dishes_df['id'].unique())
         self.dish_vocab_size = len(self.dish_vocab)
 
         # Stores
         store_ids = self.dishes_df['store_id'].dropna().unique() if 'store_id' in self.dishes_df.columns else []
-        self.store_vocab = {sid: idx + 1 for idx, sid in enumerate(store_ids)}
-        self.store_vocab['<UNK>'] = 0
+        self.store_vocab = IdVocabulary(store_ids)
         self.store_vocab_size = len(self.store_vocab)
 
         # Categories
         categories = self.dishes_df['category'].dropna().unique() if 'category' in self.dishes_df.columns else []
-        self.category_vocab = {cat: idx + 1 for idx, cat in enumerate(categories)}
-        self.category_vocab['<UNK>'] = 0
+        self.category_vocab = IdVocabulary(categories)
         self.category_vocab_size = len(self.category_vocab)
 
         # --- Combined Tag Vocabulary ---
         # We merge Food, Taste, Cooking, and Culture tags into one large vocabulary
-        self.tag_vocab = {'<PAD>': 0, '<UNK>': 1} 
-        tag_id_counter = 2
         all_unique_tags = set()
         
         tag_cols = ['food_tags', 'taste_tags', 'cooking_method_tags', 'culture_tags']
@@ -82,90 +76,9 @@ class FoodRecommendationDataset(Dataset):
                     if isinstance(tag_list, list):
                         all_unique_tags.update(tag for tag in tag_list if isinstance(tag, str))
 
-        for tag in sorted(list(all_unique_tags)):
-            self.tag_vocab[tag] = tag_id_counter
-            tag_id_counter += 1
+        self.tag_vocab = IdVocabulary(sorted(all_unique_tags), start=2, specials={'<PAD>': 0, '<UNK>': 1})
             
         self.tag_vocab_size = len(self.tag_vocab)
-        print(f"Dataset Initialized: {len(self.interactions_df)} interactions.")
-        print(f" - Vocab Sizes: User={self.user_vocab_size}, Dish={self.dish_vocab_size}, Tags={self.tag_vocab_size}")
-
-    def __len__(self):
-        return len(self.interactions_df)
-
-    def __getitem__(self, idx):
-        row = self.interactions_df.iloc[idx]
-        timestamp = row['timestamp']
-
-        # --- 1. NEGATIVE SAMPLING STRATEGY (Crucial) ---
-        # We flip a coin. 50% of the time, we show the model a "Fake" (Negative) dish.
-        # This teaches the model to differentiate between good and bad matches.
-        if random.random() < 0.5:
-            # --- NEGATIVE BRANCH ---
-            # 1. Get Real User
-            user_id = row['user_id']
-            user_data = self.users_lookup.get(user_id)
-            if user_data is None: 
-                # Fallback for safety
-                user_features = self._get_dummy_user_features(timestamp)
-            else:
-                user_features = self._encode_user_features(user_data, user_id, timestamp)
-
-            # 2. Pick a Random "Wrong" Dish
-            all_dish_ids = list(self.dish_vocab.keys())
-            # Remove special tokens
-            for token in ['<UNK>', '<PAD>', 0]:
-                if token in all_dish_ids: all_dish_ids.remove(token)
-            
-            # Pick random dish that is NOT the current one
-            current_dish_id = row['dish_id']
-            neg_dish_id = random.choice(all_dish_ids)
-            while neg_dish_id == current_dish_id:
-                neg_dish_id = random.choice(all_dish_ids)
-
-            neg_dish_data = self.dishes_lookup.get(neg_dish_id)
-            
-            # 3. Encode Negative Dish
-            # Handle potential lookup failure for random dish
-            if neg_dish_data is None:
-                 dish_features = self._get_dummy_dish_features(timestamp)
-            else:
-                 dish_features = self._encode_dish_features(neg_dish_data, neg_dish_id, timestamp)
-
-            # LABEL IS 0.0 FOR NEGATIVE SAMPLE
-            return user_features, dish_features, torch.tensor(0.0, dtype=torch.float)
-
-        else:
-            # --- 2. POSITIVE BRANCH (Real Data) ---
-            user_id = row['user_id']
-            dish_id = row['dish_id']
-            
-            user_data = self.users_lookup.get(user_id)
-            dish_data = self.dishes_lookup.get(dish_id)
-
-            if user_data is None: user_features = self._get_dummy_user_features(timestamp)
-            else: user_features = self._encode_user_features(user_data, user_id, timestamp)
-
-            if dish_data is None: dish_features = self._get_dummy_dish_features(timestamp)
-            else: dish_features = self._encode_dish_features(dish_data, dish_id, timestamp)
-
-            # --- FIX COLUMN NAME HERE ---
-            # Check 'status' column instead of 'interaction_type'
-            status = str(row.get('status', '')).lower().strip()
-            
-            # Check 'rating_value' if it exists (optional, but good practice)
-            rating = row.get('rating_value')
-            has_rating = pd.notna(rating) and str(rating).strip() != ''
-
-            if status == 'done' or has_rating:
-                label = 1.0
-            else:
-                # If the row exists but status isn't done, do we treat it as 1 or 0?
-                # Usually, if it's in the transaction table, it implies interest, 
-                # but sticking to 'done' is safer.
-                label = 0.0
-
-            return user_features, dish_features, torch.tensor(label, dtype=torch.float)
 
     # --- Feature Encoding Methods ---
 
@@ -246,8 +159,12 @@ class FoodRecommendationDataset(Dataset):
     # --- Helper Methods ---
 
     def _safe_literal_eval(self, x, default=None):
-        """Safely parses string representation of python objects."""
-        if pd.isna(x) or not isinstance(x, str):
+        """Safely parses string representation of python objects (typed lists/dicts pass through)."""
+        if isinstance(x, (list, dict)):
+            return x
+        if isinstance(x, np.ndarray):
+            return x.tolist()
+        if not isinstance(x, str) or pd.isna(x):
             return default
         try:
             return ast.literal_eval(x)
@@ -260,4 +177,91 @@ class FoodRecommendationDataset(Dataset):
 
     def _get_dummy_dish_features(self, timestamp):
         """Returns default/unknown features for missing dishes."""
-        return self._encode_dish_features({}, 'dummy_dish', timestamp)
\ No newline at end of file
+        return self._encode_dish_features({}, 'dummy_dish', timestamp)
+
+
+class FoodRecommendationDataset(FeatureEncoder, Dataset):
+    """
+    PyTorch Dataset that prepares user, dish, and context features 
+    for the recommendation model.
+    """
+
+    def __init__(self, interactions_df: pd.DataFrame, users_df: pd.DataFrame, 
+                 dishes_df: pd.DataFrame):
+        super().__init__(users_df, dishes_df)
+        self.interactions_df = interactions_df
+        print(f"Dataset Initialized: {len(self.interactions_df)} interactions.")
+        print(f" - Vocab Sizes: User={self.user_vocab_size}, Dish={self.dish_vocab_size}, Tags={self.tag_vocab_size}")
+
+    def __len__(self):
+        return len(self.interactions_df)
+
+    def __getitem__(self, idx):
+        row = self.interactions_df.iloc[idx]
+        timestamp = row['timestamp']
+
+        # --- 1. NEGATIVE SAMPLING STRATEGY (Crucial) ---
+        # We flip a coin. 50% of the time, we show the model a "Fake" (Negative) dish.
+        # This teaches the model to differentiate between good and bad matches.
+        if random.random() < 0.5:
+            # --- NEGATIVE BRANCH ---
+            # 1. Get Real User
+            user_id = row['user_id']
+            user_data = self.users_lookup.get(user_id)
+            if user_data is None: 
+                # Fallback for safety
+                user_features = self._get_dummy_user_features(timestamp)
+            else:
+                user_features = self._encode_user_features(user_data, user_id, timestamp)
+
+            # 2. Pick a Random "Wrong" Dish
+            # Sample a vocabulary index (special tokens excluded) and map it back to its id
+            num_dishes = self.dish_vocab.num_slots
+            current_dish_id = row['dish_id']
+            neg_dish_id = self.dish_vocab.key_at(random.randint(1, num_dishes))
+            while neg_dish_id == current_dish_id and num_dishes > 1:
+                neg_dish_id = self.dish_vocab.key_at(random.randint(1, num_dishes))
+
+            neg_dish_data = self.dishes_lookup.get(neg_dish_id)
+            
+            # 3. Encode Negative Dish
+            # Handle potential lookup failure for random dish
+            if neg_dish_data is None:
+                 dish_features = self._get_dummy_dish_features(timestamp)
+            else:
+                 dish_features = self._encode_dish_features(neg_dish_data, neg_dish_id, timestamp)
+
+            # LABEL IS 0.0 FOR NEGATIVE SAMPLE
+            return user_features, dish_features, torch.tensor(0.0, dtype=torch.float)
+
+        else:
+            # --- 2. POSITIVE BRANCH (Real Data) ---
+            user_id = row['user_id']
+            dish_id = row['dish_id']
+            
+            user_data = self.users_lookup.get(user_id)
+            dish_data = self.dishes_lookup.get(dish_id)
+
+            if user_data is None: user_features = self._get_dummy_user_features(timestamp)
+            else: user_features = self._encode_user_features(user_data, user_id, timestamp)
+
+            if dish_data is None: dish_features = self._get_dummy_dish_features(timestamp)
+            else: dish_features = self._encode_dish_features(dish_data, dish_id, timestamp)
+
+            # --- FIX COLUMN NAME HERE ---
+            # Check 'status' column instead of 'interaction_type'
+            status = str(row.get('status', '')).lower().strip()
+            
+            # Check 'rating_value' if it exists (optional, but good practice)
+            rating = row.get('rating_value')
+            has_rating = pd.notna(rating) and str(rating).strip() != ''
+
+            if status == 'done' or has_rating:
+                label = 1.0
+            else:
+                # If the row exists but status isn't done, do we treat it as 1 or 0?
+                # Usually, if it's in the transaction table, it implies interest, 
+                # but sticking to 'done' is safer.
+                label = 0.0
+
+            return user_features, dish_features, torch.tensor(label, dtype=torch.float)
@@ -0,0 +1,125 @@
+import os
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+class DishEmbeddingIndex:
+    """
+    Dish vectors stored as one contiguous (num_dishes x dim) float32 matrix plus
+    an id -> row map.
+
+    Behaves like the old `Dict[dish_id, Tensor]` cache (`in`, `[]`, `keys()`,
+    `values()`, `items()`, `len()`), but retrieval is a single matmul + top-k and
+    the matrix can be saved to / memory-mapped from a .npy file, so several
+    API worker processes share one copy of it through the OS page cache.
+    """
+
+    MATRIX_FILE = "dish_embeddings.npy"
+    IDS_FILE = "dish_ids.json"
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, device: torch.device = None):
+        if len(ids) != matrix.shape[0]:
+            raise ValueError(f"{len(ids)} ids for a matrix with {matrix.shape[0]} rows.")
+        self.device = device or torch.device("cpu")
+        self.ids: List[str] = list(ids)
+        self.id_to_row: Dict[str, int] = {dish_id: row for row, dish_id in enumerate(self.ids)}
+        self._set_matrix(matrix)
+
+    def _set_matrix(self, matrix: np.ndarray):
+        self._array = matrix
+        # On CPU the tensor shares memory with the (possibly memory-mapped) array
+        self.matrix = torch.from_numpy(matrix).to(self.device)
+
+    # --- Dict-like access (backwards compatible with the old cache) ---
+
+    def __contains__(self, dish_id: str) -> bool:
+        return dish_id in self.id_to_row
+
+    def __getitem__(self, dish_id: str) -> torch.Tensor:
+        return self.matrix[self.id_to_row[dish_id]]
+
+    def __setitem__(self, dish_id: str, vector: torch.Tensor):
+        self.upsert(dish_id, vector)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def keys(self) -> List[str]:
+        return list(self.ids)
+
+    def values(self) -> Iterator[torch.Tensor]:
+        return (self.matrix[row] for row in range(len(self.ids)))
+
+    def items(self) -> Iterator[Tuple[str, torch.Tensor]]:
+        return ((dish_id, self.matrix[row]) for row, dish_id in enumerate(self.ids))
+
+    # --- Updates ---
+
+    def upsert(self, dish_id: str, vector: torch.Tensor) -> int:
+        """Overwrites an existing row or appends a new one. Returns the row index."""
+        values = vector.detach().to("cpu", torch.float32).numpy()
+        row = self.id_to_row.get(dish_id)
+
+        if row is not None:
+            if not self._array.flags.writeable:
+                self._set_matrix(np.array(self._array))
+            # Copy-on-write memmaps only copy the touched page, not the whole file
+            self._array[row] = values
+            if self.matrix.device.type != "cpu":
+                self.matrix[row] = vector.to(self.matrix.device)
+            return row
+
+        row = len(self.ids)
+        self.ids.append(dish_id)
+        self.id_to_row[dish_id] = row
+        self._set_matrix(np.concatenate([self._array, values[None, :]], axis=0))
+        return row
+
+    # --- Retrieval ---
+
+    def search(self, query: torch.Tensor, top_k: int, rows: Optional[torch.Tensor] = None) -> List[Tuple[str, float]]:
+        """Dot-product top-k over all rows, or only over the given candidate rows."""
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        if matrix.shape[0] == 0 or top_k <= 0:
+            return []
+        return self.top_k(matrix @ query.to(matrix.device), top_k, rows)
+
+    def top_k(self, scores: torch.Tensor, top_k: int, rows: Optional[torch.Tensor] = None) -> List[Tuple[str, float]]:
+        """Top-k (dish_id, score) from precomputed scores for all rows, or for the candidate `rows`."""
+        if scores.shape[0] == 0 or top_k <= 0:
+            return []
+        values, indices = torch.topk(scores, min(top_k, scores.shape[0]))
+        if rows is not None:
+            indices = rows.to(indices.device)[indices]
+        return [(self.ids[i], float(v)) for i, v in zip(indices.tolist(), values.tolist())]
+
+    # --- Persistence (shared artifacts) ---
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, self.MATRIX_FILE), np.ascontiguousarray(self._array, dtype=np.float32))
+        with open(os.path.join(directory, self.IDS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.ids, f)
+
+    @classmethod
+    def load(cls, directory: str, device: torch.device = None, mmap: bool = True) -> "DishEmbeddingIndex":
+        """
+        Loads a saved index. With `mmap`, the matrix is mapped copy-on-write:
+        reads hit the shared page cache and live updates stay private to the process.
+        """
+        matrix = np.load(os.path.join(directory, cls.MATRIX_FILE), mmap_mode="c" if mmap else None)
+        with open(os.path.join(directory, cls.IDS_FILE), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(ids, matrix, device=device)
+
+    @classmethod
+    def from_vectors(cls, ids: List[str], vectors: List[torch.Tensor], dim: int,
+                     device: torch.device = None) -> "DishEmbeddingIndex":
+        if vectors:
+            matrix = torch.stack(vectors).detach().to("cpu", torch.float32).numpy()
+        else:
+            matrix = np.zeros((0, dim), dtype=np.float32)
+        return cls(ids, np.ascontiguousarray(matrix), device=device)
@@ -0,0 +1,143 @@
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.columnar_io import parse_list
+
+TAG_COLUMNS = ('food_tags', 'taste_tags', 'cooking_method_tags', 'culture_tags')
+SCALAR_COLUMNS = ('category', 'store_id')
+
+
+class DishFilterIndex:
+    """
+    Attribute index over dish rows, aligned with the DishEmbeddingIndex rows.
+
+    For every tag column (and category / store_id) it keeps one packed bitset
+    per value (value -> set of dish rows), plus the rows sorted by price. A
+    metadata filter then becomes a few bitwise AND / OR operations over
+    num_dishes / 8 bytes and a binary search, instead of parsing every dish row.
+    Masks returned by the query methods are boolean arrays of length `num_rows`.
+    """
+
+    def __init__(self):
+        self.num_rows = 0
+        self._bits: Dict[str, Dict[str, np.ndarray]] = {col: {} for col in (*TAG_COLUMNS, *SCALAR_COLUMNS)}
+        self._row_values: Dict[int, Dict[str, frozenset]] = {}
+        self.prices = np.zeros(0, dtype=np.float64)
+        self._price_order: Optional[np.ndarray] = None
+        self._sorted_prices: Optional[np.ndarray] = None
+
+    @classmethod
+    def build(cls, dishes_df: pd.DataFrame, id_to_row: Mapping[str, int]) -> "DishFilterIndex":
+        index = cls()
+        index._grow(len(id_to_row))
+        columns = [col for col in (*TAG_COLUMNS, *SCALAR_COLUMNS, 'price') if col in dishes_df.columns]
+        ids = dishes_df['id'].tolist()
+        values = {col: dishes_df[col].tolist() for col in columns}
+        for i, dish_id in enumerate(ids):
+            row = id_to_row.get(dish_id)
+            if row is not None:
+                index.set_row(row, {col: values[col][i] for col in columns})
+        return index
+
+    # --- Updates ---
+
+    @staticmethod
+    def _values(column: str, raw: Any) -> frozenset:
+        if column in TAG_COLUMNS:
+            return frozenset(str(t) for t in parse_list(raw) if isinstance(t, str))
+        if raw is None or (isinstance(raw, float) and np.isnan(raw)):
+            return frozenset()
+        return frozenset([str(raw)])
+
+    def _grow(self, num_rows: int):
+        if num_rows <= self.num_rows:
+            return
+        self.prices = np.concatenate([self.prices, np.full(num_rows - self.num_rows, np.nan)])
+        self.num_rows = num_rows
+
+    def set_row(self, row: int, dish_data: Dict[str, Any]):
+        """Indexes (or re-indexes) one dish row, e.g. after `update_dish_embedding`."""
+        self._grow(row + 1)
+        old = self._row_values.get(row, {})
+        new = {col: self._values(col, dish_data.get(col)) for col in self._bits}
+        byte, mask = row >> 3, np.uint8(0x80 >> (row & 7))
+
+        for col, values in new.items():
+            previous = old.get(col, frozenset())
+            for value in previous - values:
+                self._bits[col][value][byte] &= ~mask
+            for value in values - previous:
+                bits = self._bits[col].get(value)
+                if bits is None or len(bits) <= byte:
+                    bits = self._fit(bits, byte + 1)
+                    self._bits[col][value] = bits
+                bits[byte] |= mask
+        self._row_values[row] = new
+
+        price = dish_data.get('price')
+        try:
+            self.prices[row] = float(price) if price is not None else np.nan
+        except (TypeError, ValueError):
+            self.prices[row] = np.nan
+        self._price_order = None  # re-sorted lazily on the next price query
+
+    @staticmethod
+    def _fit(bits: Optional[np.ndarray], num_bytes: int) -> np.ndarray:
+        out = np.zeros(max(num_bytes, 1), dtype=np.uint8)
+        if bits is not None:
+            out[:len(bits)] = bits[:num_bytes]
+        return out
+
+    # --- Queries ---
+
+    def _unpack(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(self._fit(bits, (self.num_rows + 7) >> 3), count=self.num_rows).astype(bool)
+
+    def all_rows(self) -> np.ndarray:
+        return np.ones(self.num_rows, dtype=bool)
+
+    def rows_with_any(self, values: Iterable[str], columns: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Rows having at least one of `values` in any of `columns` (default: all tag columns)."""
+        num_bytes = (self.num_rows + 7) >> 3
+        acc = np.zeros(max(num_bytes, 1), dtype=np.uint8)
+        values = {str(v) for v in values}
+        for col in (columns or TAG_COLUMNS):
+            by_value = self._bits.get(col, {})
+            for value in values:
+                bits = by_value.get(value)
+                if bits is not None:
+                    acc[:len(bits)] |= bits[:len(acc)]
+        return self._unpack(acc)
+
+    def _sorted_by_price(self):
+        if self._price_order is None:
+            known = np.flatnonzero(~np.isnan(self.prices))
+            order = known[np.argsort(self.prices[known], kind='stable')]
+            self._price_order, self._sorted_prices = order, self.prices[order]
+        return self._price_order, self._sorted_prices
+
+    def price_between(self, min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Rows with min_price <= price <= max_price (either bound optional)."""
+        if min_price is None and max_price is None:
+            return self.all_rows()
+        order, sorted_prices = self._sorted_by_price()
+        lo = 0 if min_price is None else np.searchsorted(sorted_prices, min_price, side='left')
+        hi = len(sorted_prices) if max_price is None else np.searchsorted(sorted_prices, max_price, side='right')
+        mask = np.zeros(self.num_rows, dtype=bool)
+        mask[order[lo:hi]] = True
+        return mask
+
+    def row_tags(self, row: int) -> set:
+        """Tags (from every tag column) currently indexed for `row`."""
+        values = self._row_values.get(row, {})
+        return set().union(*(values.get(col, frozenset()) for col in TAG_COLUMNS))
+
+    def row_price(self, row: int) -> float:
+        return float(self.prices[row]) if row < self.num_rows else np.nan
+
+    def tag_rows(self) -> Dict[str, np.ndarray]:
+        """tag -> row indices of the dishes carrying it (in any tag column)."""
+        tags = set().union(*(self._bits[col].keys() for col in TAG_COLUMNS))
+        return {tag: np.flatnonzero(self.rows_with_any([tag])) for tag in tags}
@@ -5,15 +5,25 @@ import ast
 import torch
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple, Any, Optional
-from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple, Any, Optional
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.data_preprocessor import DataPreprocessor
-from src.dataset import FoodRecommendationDataset  # Assuming your file is named dataset.py
+from src.dataset import FeatureEncoder
+from src.serving_data import load_serving_tables
 from src.simple_two_tower_model import SimpleTwoTowerModel
+from src.dish_embedding_index import DishEmbeddingIndex
+from src.dish_filter_index import DishFilterIndex
+from src.seen_items import SeenItemsIndex
+from src.cold_start import ColdStartEmbedder, PRICE_BANDS, price_bands_of
+from src.contextual_scoring import ItemContextScorer, UserProjectionCache, build_bucket_table, time_bucket
+from src.shared_artifacts import shared_artifacts_valid, write_manifest
+
+# Static time the catalog vectors (similar dishes, tag centroids) are embedded at;
+# user recommendations are scored at the request time instead (ItemContextScorer).
+CATALOG_TIME = pd.to_datetime('2024-01-01 12:00:00')  # Monday, noon
 
 class ModelEvaluator:
     """
@@ -22,37 +32,77 @@ class ModelEvaluator:
     Includes features for Similarity Search and Tag Recommendation.
     """
 
-    def __init__(self, model_path: str, model_info_path: str, data_dir: str):
+    def __init__(self, model_path: str, model_info_path: str, data_dir: str, shared_artifact_dir: Optional[str] = None,
+                 serving_data_dir: Optional[str] = None):
         # 1. Setup Device
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"ModelEvaluator initialized on: {self.device}")
 
         self.data_dir = data_dir
+        self.model_path = model_path
+        # Multi-worker serving: immutable artifacts are memory-mapped from this
+        # directory so every worker process shares one copy of them.
+        self.shared_artifact_dir = shared_artifact_dir
+        self.use_shared = bool(shared_artifact_dir) and shared_artifacts_valid(shared_artifact_dir, model_path, data_dir)
         
         # 2. Load Configuration & Data
         with open(model_info_path, 'r', encoding='utf-8') as f:
             self.model_info = json.load(f)
 
-        self.preprocessor = DataPreprocessor(data_dir)
-        self.data = self.preprocessor.load_data()
-        self.data = self.preprocessor.preprocess_data(self.data)
+        # Serving needs only the users / dishes fields used for encoding and enrichment
+        # (no interaction history); `serving_data_dir` caches them as compact tables.
+        self.data = load_serving_tables(data_dir, serving_data_dir)
         
-        # 3. Initialize Persistent Dataset (for vocabularies and encoding helpers)
-        empty_interactions = pd.DataFrame(columns=['user_id', 'dish_id', 'timestamp', 'interaction_type', 'context'])
-        self.dataset = FoodRecommendationDataset(empty_interactions, self.data['users'], self.data['dishes'])
+        # 3. Initialize the Feature Encoder (vocabularies and encoding helpers)
+        self.dataset = FeatureEncoder(self.data['users'], self.data['dishes'])
 
         # 4. Load Model
         self.model = self._load_model(model_path)
         self.model.to(self.device)
 
         # 5. Precompute Embeddings (The "Index")
-        # We cache all dish vectors immediately so retrieval is fast
-        self.dish_embeddings_cache = self._precompute_all_dish_embeddings()
+        # We cache all dish vectors immediately so retrieval is fast. The static part
+        # of the item projection is kept too, so scoring can use the request's
+        # time/day by adding one of the 7 x 24 precomputed context contributions.
+        self.context_bucket_table = build_bucket_table(self.model.item_context_projection, self.device)
+        self.item_context_scorer = None
+        if self.use_shared:
+            print(f"Mapping shared dish embeddings from {shared_artifact_dir}...")
+            self.dish_embeddings_cache = DishEmbeddingIndex.load(shared_artifact_dir, device=self.device, mmap=True)
+            self.item_context_scorer = ItemContextScorer.load(
+                shared_artifact_dir, self.context_bucket_table, device=self.device, mmap=True
+            )
+        if self.item_context_scorer is None:
+            self.dish_embeddings_cache, self.item_context_scorer = self._precompute_all_dish_embeddings()
         
-        # 6. Compute Tag Centroids (For Tag Recommendation Popup)
+        # 6. Build the attribute index (tag -> dish bitsets, price-sorted rows)
+        self.dish_filter_index = DishFilterIndex.build(self.data['dishes'], self.dish_embeddings_cache.id_to_row)
+
+        # Static user projections: a request adds its time/day contribution instead
+        # of running the user tower
+        self.user_context_bucket_table = build_bucket_table(self.model.user_context_projection, self.device)
+        self.user_projection_cache = None
+        if self.use_shared:
+            self.user_projection_cache = UserProjectionCache.load(
+                shared_artifact_dir, self.user_context_bucket_table, device=self.device, mmap=True
+            )
+        if self.user_projection_cache is None:
+            self.user_projection_cache = self._precompute_user_projections()
+
+        # Per-user bitsets of already ordered dishes (opt-in exclusion at retrieval)
+        self.seen_items = SeenItemsIndex.build(self.data.get('user_seen'), self.dish_embeddings_cache.id_to_row)
+
+        # 7. Compute Tag Centroids (For Tag Recommendation Popup)
         self.tag_embeddings_map = self._compute_tag_centroids()
+        # Stacked so tag scoring is one matmul for a whole batch of queries
+        self.tag_index = self._stack_tag_centroids()
+
+        # Cold-start proxies are composed from tag and price-band centroids
+        self.cold_start_embedder = ColdStartEmbedder(
+            self.tag_embeddings_map, self._compute_price_centroids(), self._catalog_centroid()
+        )
 
-        # 7. Load Test Scenarios
+        # 8. Load Test Scenarios
         try:
             with open(os.path.join(data_dir, 'test_scenarios.json'), 'r', encoding='utf-8') as f:
                 self.test_scenarios = json.load(f)
@@ -62,6 +112,12 @@ class ModelEvaluator:
 
         self.live_user_data = {}
     
+    def load_interactions(self) -> pd.DataFrame:
+        """Loads the interaction history on demand (offline analysis only, not kept for serving)."""
+        preprocessor = DataPreprocessor(self.data_dir)
+        data = preprocessor.preprocess_data(preprocessor.load_data(tables=['interactions']))
+        return data['interactions']
+
     def _load_model(self, model_path: str) -> SimpleTwoTowerModel:
         """Reconstructs the model architecture and loads weights."""
         sizes = self.model_info['vocab_sizes']
@@ -74,68 +130,192 @@ class ModelEvaluator:
             embedding_dim=self.model_info['embedding_dim']
         )
         
-        checkpoint = torch.load(model_path, map_location=self.device)
-        model.load_state_dict(checkpoint['model_state_dict'])
+        # In shared mode the weights stay memory-mapped (read-only pages shared between
+        # workers) and `assign=True` makes the module use them without a private copy.
+        use_mmap = self.use_shared and self.device.type == "cpu"
+        checkpoint = torch.load(model_path, map_location=self.device, mmap=use_mmap)
+        model.load_state_dict(checkpoint['model_state_dict'], assign=use_mmap)
         model.eval()
         return model
 
+    def save_shared_artifacts(self, artifact_dir: str):
+        """Writes the immutable serving artifacts so worker processes can memory-map them."""
+        self.dish_embeddings_cache.save(artifact_dir)
+        self.item_context_scorer.save(artifact_dir)
+        self.user_projection_cache.save(artifact_dir)
+        write_manifest(artifact_dir, self.model_path, self.data_dir, extra={
+            "num_dishes": len(self.dish_embeddings_cache),
+            "embedding_dim": self.model_info['embedding_dim'],
+        })
+        print(f"Shared artifacts written to {artifact_dir}")
+
     # =========================================================================
     # PRE-COMPUTATION METHODS
     # =========================================================================
 
-    def _precompute_all_dish_embeddings(self) -> Dict[str, torch.Tensor]:
-        """Efficiently processes all dishes to create vector representations."""
+    def _catalog_context(self) -> torch.Tensor:
+        day, hour = time_bucket(CATALOG_TIME)
+        return self.context_bucket_table[day, hour]
+
+    def _precompute_all_dish_embeddings(self, batch_size: int = 256) -> Tuple[DishEmbeddingIndex, ItemContextScorer]:
+        """
+        Efficiently processes all dishes to create vector representations.
+        One item tower pass yields both the catalog vectors (at CATALOG_TIME) and the
+        static partial projections used for time-aware scoring.
+        """
         print("Caching dish embeddings...")
-        dish_vectors = {}
-        dummy_time = pd.to_datetime('2024-01-01 12:00:00') # Static time for catalog
-        
+        dish_ids, dish_vectors, dish_static = [], [], []
+        catalog_context = self._catalog_context()
+
+        # Encode features using Dataset helper
+        encoded = [
+            (row['id'], self.dataset._encode_dish_features(row.to_dict(), row['id'], CATALOG_TIME))
+            for _, row in self.data['dishes'].iterrows()
+        ]
+
         self.model.eval()
         with torch.no_grad():
-            for _, row in self.data['dishes'].iterrows():
-                dish_id = row['id']
-                # Encode features using Dataset helper
-                features = self.dataset._encode_dish_features(row.to_dict(), dish_id, dummy_time)
-                
-                # Add batch dimension and move to device
-                features_batch = {k: v.unsqueeze(0).to(self.device) for k, v in features.items()}
-                
-                # Forward pass through Item Tower
-                vector = self.model.forward_item(features_batch)
-                dish_vectors[dish_id] = vector.squeeze(0) # Store 1D vector
+            for start in range(0, len(encoded), batch_size):
+                chunk = encoded[start:start + batch_size]
+                # Stack into one batch and run a single Item Tower pass per chunk
+                features_batch = {
+                    k: torch.stack([features[k] for _, features in chunk]).to(self.device)
+                    for k in chunk[0][1]
+                }
+                static = self.model.item_static_projection(features_batch)
+                vectors = torch.nn.functional.normalize(static + catalog_context, p=2, dim=-1)
+                dish_ids.extend(dish_id for dish_id, _ in chunk)
+                dish_vectors.extend(vectors)
+                dish_static.extend(static)
+
+        dim = self.model_info['embedding_dim']
+        index = DishEmbeddingIndex.from_vectors(dish_ids, dish_vectors, dim, device=self.device)
+        static_matrix = (
+            torch.stack(dish_static).to("cpu", torch.float32).numpy() if dish_static
+            else np.zeros((0, dim), dtype=np.float32)
+        )
+        scorer = ItemContextScorer(np.ascontiguousarray(static_matrix), self.context_bucket_table, device=self.device)
+        print(f"Successfully cached {len(index)} dish embeddings.")
+        return index, scorer
+
+    def _user_static_projection(self, user_data: Dict, user_id: str) -> torch.Tensor:
+        features = self.dataset._encode_user_features(user_data, user_id, CATALOG_TIME)
+        batch_features = {k: v.unsqueeze(0).to(self.device) for k, v in features.items()}
+        with torch.no_grad():
+            return self.model.user_static_projection(batch_features).squeeze(0)
+
+    def _precompute_user_projections(self, batch_size: int = 256) -> UserProjectionCache:
+        """Runs the static part of the user tower once for every known user."""
+        print("Caching user projections...")
+        user_ids, user_static = [], []
+
+        # Same rows as the users lookup (duplicated ids keep the first one);
+        # the time features are ignored by user_static_projection
+        users = self.data['users']
+        users = users[users['id'].notna()].drop_duplicates(subset='id', keep='first')
+        encoded = [
+            (str(row['id']), self.dataset._encode_user_features(row.to_dict(), row['id'], CATALOG_TIME))
+            for _, row in users.iterrows()
+        ]
 
-        print(f"Successfully cached {len(dish_vectors)} dish embeddings.")
-        return dish_vectors
+        self.model.eval()
+        with torch.no_grad():
+            for start in range(0, len(encoded), batch_size):
+                chunk = encoded[start:start + batch_size]
+                features_batch = {
+                    k: torch.stack([features[k] for _, features in chunk]).to(self.device)
+                    for k in chunk[0][1]
+                }
+                user_ids.extend(user_id for user_id, _ in chunk)
+                user_static.extend(self.model.user_static_projection(features_batch))
+
+        dim = self.model_info['embedding_dim']
+        static_matrix = (
+            torch.stack(user_static).to("cpu", torch.float32).numpy() if user_static
+            else np.zeros((0, dim), dtype=np.float32)
+        )
+        cache = UserProjectionCache(
+            user_ids, np.ascontiguousarray(static_matrix), self.user_context_bucket_table, device=self.device
+        )
+        print(f"Successfully cached {len(cache)} user projections.")
+        return cache
 
     def _compute_tag_centroids(self) -> Dict[str, torch.Tensor]:
         """Creates 'Vectors' for tags by averaging vectors of dishes with those tags."""
         print("Computing Tag Embeddings...")
-        tag_to_vectors = defaultdict(list)
-        
-        for dish_id, vector in self.dish_embeddings_cache.items():
-            row = self.data['dishes'][self.data['dishes']['id'] == dish_id].iloc[0]
-            
-            all_tags = []
-            # Use dataset helper to parse lists safely
-            for col in ['food_tags', 'taste_tags', 'cooking_method_tags', 'culture_tags']:
-                tags = self.dataset._safe_literal_eval(row.get(col, '[]'))
-                if isinstance(tags, list):
-                    all_tags.extend([t for t in tags if isinstance(t, str)])
-            
-            for tag in all_tags:
-                tag_to_vectors[tag].append(vector)
 
-        # Compute Mean and Normalize
+        # Compute Mean and Normalize (dish rows per tag come from the bitset index)
         tag_embeddings = {}
-        for tag, vectors in tag_to_vectors.items():
-            if vectors:
-                stacked = torch.stack(vectors)
-                centroid = torch.mean(stacked, dim=0)
-                # L2 Normalization
-                centroid = torch.nn.functional.normalize(centroid, p=2, dim=0)
+        for tag, rows in self.dish_filter_index.tag_rows().items():
+            centroid = self._rows_centroid(rows)
+            if centroid is not None:
                 tag_embeddings[tag] = centroid
                 
         print(f"Computed embeddings for {len(tag_embeddings)} tags.")
         return tag_embeddings
+
+    def _rows_centroid(self, rows: np.ndarray) -> Optional[torch.Tensor]:
+        """L2-normalized mean of the catalog vectors at `rows` (None if there are none)."""
+        if len(rows) == 0:
+            return None
+        matrix = self.dish_embeddings_cache.matrix
+        centroid = torch.mean(matrix[torch.from_numpy(rows).to(matrix.device)], dim=0)
+        return torch.nn.functional.normalize(centroid, p=2, dim=0)
+
+    def _stack_tag_centroids(self) -> Tuple[List[str], torch.Tensor]:
+        """(tag names, stacked centroids) swapped as one tuple, so readers never see a mismatched pair."""
+        names = list(self.tag_embeddings_map)
+        matrix = (
+            torch.stack([self.tag_embeddings_map[tag] for tag in names]) if names
+            else torch.zeros((0, self.model_info['embedding_dim']), device=self.device)
+        )
+        return names, matrix
+
+    def _price_band_centroid(self, band: str) -> Optional[torch.Tensor]:
+        min_price, max_price = PRICE_BANDS[band]
+        return self._rows_centroid(np.flatnonzero(self.dish_filter_index.price_between(min_price, max_price)))
+
+    def _compute_price_centroids(self) -> Dict[str, torch.Tensor]:
+        """Normalized mean dish vector of each price band (see PRICE_BANDS)."""
+        centroids = {}
+        for band in PRICE_BANDS:
+            centroid = self._price_band_centroid(band)
+            if centroid is not None:
+                centroids[band] = centroid
+        return centroids
+
+    def _refresh_centroids(self, tags: Iterable[str], prices: Iterable[float]):
+        """
+        Recomputes the tag and price-band centroids a dish update touched (its old
+        and new tags / prices) plus the catalog centroid, then drops the cached
+        cold-start proxies built from the stale ones.
+        """
+        for tag in tags:
+            centroid = self._rows_centroid(np.flatnonzero(self.dish_filter_index.rows_with_any([tag])))
+            if centroid is None:
+                self.tag_embeddings_map.pop(tag, None)
+            else:
+                self.tag_embeddings_map[tag] = centroid
+        self.tag_index = self._stack_tag_centroids()
+
+        price_centroids = self.cold_start_embedder.price_centroids
+        for band in {band for price in prices for band in price_bands_of(price)}:
+            centroid = self._price_band_centroid(band)
+            if centroid is None:
+                price_centroids.pop(band, None)
+            else:
+                price_centroids[band] = centroid
+
+        self.cold_start_embedder.fallback = self._catalog_centroid()
+        self.cold_start_embedder.clear()
+
+    def _catalog_centroid(self) -> torch.Tensor:
+        """Normalized mean of all dish vectors (cold-start fallback)."""
+        matrix = self.dish_embeddings_cache.matrix
+        if len(matrix) == 0:
+            return torch.zeros(self.model_info['embedding_dim'], device=self.device)
+        return torch.nn.functional.normalize(torch.mean(matrix, dim=0), p=2, dim=0)
+
     # --- NEW: DYNAMIC UPDATE METHODS ---
     def update_live_user_data(self, user_id: str, user_data: Dict):
         """
@@ -145,6 +325,12 @@ class ModelEvaluator:
         """
         print(f"Updating live data for user {user_id}...")
         self.live_user_data[user_id] = user_data
+        # The cached static projection must follow the new profile
+        self.user_projection_cache.set(user_id, self._user_static_projection(user_data, user_id))
+
+    def mark_dishes_seen(self, user_id: str, dish_ids: List[str]) -> int:
+        """Records new orders so `exclude_seen` retrieval skips them right away."""
+        return self.seen_items.mark_seen(user_id, dish_ids)
 
     def update_dish_embedding(self, dish_id: str, dish_data: Dict):
         """
@@ -153,14 +339,11 @@ class ModelEvaluator:
         """
         print(f"Updating embedding for dish {dish_id}...")
         
-        # 1. Setup context
-        dummy_time = pd.to_datetime('2024-01-01 12:00:00')
-        
         self.model.eval()
         with torch.no_grad():
             # 2. Encode features using the dataset helper
             # Note: We need to ensure dish_data matches the structure expected by _encode_dish_features
-            features = self.dataset._encode_dish_features(dish_data, dish_id, dummy_time)
+            features = self.dataset._encode_dish_features(dish_data, dish_id, CATALOG_TIME)
             
             # 3. Clamp Indices (Reuse logic from _precompute)
             max_tag_idx = self.model.tag_embedding.num_embeddings - 1
@@ -173,123 +356,187 @@ class ModelEvaluator:
             features['store_id'] = torch.clamp(features['store_id'], min=0, max=max_store_idx)
             features['category'] = torch.clamp(features['category'], min=0, max=max_cat_idx)
 
-            # 4. Forward Pass
+            # 4. Forward Pass (static part once, catalog vector = static + catalog time context)
             features_batch = {k: v.unsqueeze(0).to(self.device) for k, v in features.items()}
-            vector = self.model.forward_item(features_batch)
+            static = self.model.item_static_projection(features_batch).squeeze(0)
+            vector = torch.nn.functional.normalize(static + self._catalog_context(), p=2, dim=-1)
             
             # 5. Update Cache
             # This overwrites the old vector or adds a new one
-            self.dish_embeddings_cache[dish_id] = vector.squeeze(0)
+            row = self.dish_embeddings_cache.upsert(dish_id, vector)
+            self.item_context_scorer.upsert(row, static)
+
+            # 6. Keep the attribute index in sync with the new row
+            old_tags, old_price = self.dish_filter_index.row_tags(row), self.dish_filter_index.row_price(row)
+            self.dish_filter_index.set_row(row, dish_data)
+
+            # 7. Tag / price-band centroids (tag popup and cold-start proxies) follow the new vector
+            self._refresh_centroids(
+                old_tags | self.dish_filter_index.row_tags(row),
+                [old_price, self.dish_filter_index.row_price(row)]
+            )
     # =========================================================================
     # CORE RETRIEVAL LOGIC
     # =========================================================================
 
-    def get_recommendations_for_embedding(self, user_emb: torch.Tensor, top_k: int = 10, store_id_filter: str = None) -> List[Tuple[str, float]]:
+    def get_recommendations_for_embedding(self, user_emb: torch.Tensor, top_k: int = 10, store_id_filter: str = None,
+                                          mask: Optional[np.ndarray] = None, timestamp=None) -> List[Tuple[str, float]]:
         """
         Core function: Finds nearest dishes to a given embedding vector.
-        Includes Store Filtering logic.
+        Includes Store Filtering logic; `mask` (one bool per dish row, see
+        `build_constraint_mask`) restricts scoring to the allowed rows. With a
+        `timestamp`, dishes are scored as embedded at that time of day / weekday,
+        otherwise the catalog vectors are used.
         """
-        # 1. Filter Candidates
-        candidate_dish_ids = []
+        index = self.dish_embeddings_cache
+
+        # 1. Filter Candidates (as row indices into the embedding matrix)
         if store_id_filter:
-            # Ensure consistent type comparison (string vs string)
-            filtered_df = self.data['dishes'][self.data['dishes']['store_id'].astype(str) == str(store_id_filter)]
-            cached_ids = set(self.dish_embeddings_cache.keys())
-            candidate_dish_ids = [did for did in filtered_df['id'] if did in cached_ids]
-        else:
-            candidate_dish_ids = list(self.dish_embeddings_cache.keys())
-
-        if not candidate_dish_ids:
-            # Handle empty result gracefully
+            store_mask = self._store_mask(store_id_filter)
+            mask = store_mask if mask is None else mask & store_mask
+
+        candidate_rows = None
+        if mask is not None:
+            rows = np.flatnonzero(mask[:len(index)])
+            if len(rows) == 0:
+                # Handle empty result gracefully
+                return []
+            candidate_rows = torch.from_numpy(rows)
+
+        # 2. Score all candidates with one matmul and keep the top-k
+        if timestamp is not None:
+            scores = self.item_context_scorer.scores(user_emb, timestamp, rows=candidate_rows)
+            return index.top_k(scores, top_k, rows=candidate_rows)
+        return index.search(user_emb, top_k, rows=candidate_rows)
+
+    def _store_mask(self, store_id_filter: str) -> np.ndarray:
+        return self.dish_filter_index.rows_with_any([str(store_id_filter)], columns=['store_id'])
+
+    def _top_k_masked(self, scores: torch.Tensor, top_k: int, mask: Optional[np.ndarray]) -> List[Tuple[str, float]]:
+        """Top-k over one column of precomputed scores (all rows), restricted to `mask`."""
+        index = self.dish_embeddings_cache
+        if mask is None:
+            return index.top_k(scores, top_k)
+        rows = np.flatnonzero(mask[:len(index)])
+        if len(rows) == 0:
             return []
+        rows = torch.from_numpy(rows)
+        return index.top_k(scores[rows.to(scores.device)], top_k, rows=rows)
 
-        # 2. Calculate Similarity
-        similarities = []
-        for dish_id in candidate_dish_ids:
-            dish_vec = self.dish_embeddings_cache[dish_id]
-            score = torch.dot(user_emb, dish_vec).item()
-            similarities.append((dish_id, score))
-        
-        # 3. Sort and Return
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:top_k]
+    def _user_data(self, user_id: str) -> Dict:
+        """Live profile first, then the exported users table ({} for unknown users)."""
+        if user_id in self.live_user_data:
+            return self.live_user_data[user_id]
+        return self.dataset.users_lookup.get(user_id) or {}
+
+    def build_constraint_mask(self, constraints: Optional[Dict], user_data: Optional[Dict] = None) -> Optional[np.ndarray]:
+        """
+        Turns retrieval constraints into a mask over dish rows, evaluated on the
+        attribute index before scoring (no over-fetching / post-filtering).
+
+        Keys (all optional): min_price, max_price, categories, store_ids,
+        exclude_tags, and exclude_allergy_tags / exclude_disliked_tags (default
+        True) which also exclude the user's `allergy_tags` / `disliked_tags`.
+        Returns None when nothing is constrained.
+        """
+        if not constraints:
+            return None
+        index = self.dish_filter_index
+        mask = None
+
+        def narrow(current, other):
+            return other if current is None else current & other
+
+        if constraints.get('min_price') is not None or constraints.get('max_price') is not None:
+            mask = narrow(mask, index.price_between(constraints.get('min_price'), constraints.get('max_price')))
+        if constraints.get('categories'):
+            mask = narrow(mask, index.rows_with_any(constraints['categories'], columns=['category']))
+        if constraints.get('store_ids'):
+            mask = narrow(mask, index.rows_with_any(constraints['store_ids'], columns=['store_id']))
+
+        excluded = set(constraints.get('exclude_tags') or [])
+        user_data = user_data or {}
+        for key, column in (('exclude_allergy_tags', 'allergy_tags'), ('exclude_disliked_tags', 'disliked_tags')):
+            if constraints.get(key, True):
+                tags = self.dataset._safe_literal_eval(user_data.get(column), default=[])
+                excluded.update(t for t in tags if isinstance(t, str))
+        if excluded:
+            mask = narrow(mask, ~index.rows_with_any(excluded))
+        return mask
 
     def get_user_embedding(self, user_id: str, timestamp=None) -> torch.Tensor:
         if timestamp is None:
             timestamp = pd.Timestamp.now()
         
-        # 1. Check Live Data First
-        if user_id in self.live_user_data:
-            user_data = self.live_user_data[user_id]
-        # 2. Fallback to CSV Data
-        elif user_id in self.dataset.users_lookup:
-            user_data = self.data['users'][self.data['users']['id'] == user_id].iloc[0].to_dict()
-        else:
-            # Fallback for completely new user not in CSV or Live
-            user_data = {} 
-
-        features = self.dataset._encode_user_features(user_data, user_id, timestamp)
-        batch_features = {k: v.unsqueeze(0).to(self.device) for k, v in features.items()}
-        
-        with torch.no_grad():
-            user_emb = self.model.forward_user(batch_features).squeeze(0)
-        return user_emb
-
-    def _find_dishes_by_preference(self, preferences: Dict, top_n: int = 10) -> List[str]:
-        """Finds dish IDs based on metadata filters (Cuisine, Taste, etc.)."""
-        df = self.data['dishes'].copy()
-
-        # Convert names to IDs if necessary, or assumes IDs are passed.
-        # For robustness, we check intersection of lists.
-        
-        def safe_check_overlap(row_val, target_set):
-            # Helper to check if row's tags overlap with target preferences
-            row_tags = set(self.dataset._safe_literal_eval(row_val))
-            # Filter out non-strings
-            row_tags = {t for t in row_tags if isinstance(t, str)}
-            return not row_tags.isdisjoint(target_set)
-
-        try:
-            filtered_df = df
-            
-            # 1. Cuisine / Culture
-            if 'cuisine' in preferences and preferences['cuisine']:
-                target = set(preferences['cuisine'])
-                filtered_df = filtered_df[filtered_df['culture_tags'].apply(lambda x: safe_check_overlap(x, target))]
-
-            # 2. Taste
-            if 'taste' in preferences and preferences['taste']:
-                target = set(preferences['taste'])
-                filtered_df = filtered_df[filtered_df['taste_tags'].apply(lambda x: safe_check_overlap(x, target))]
-            
-            # 3. Price
-            pref_price = preferences.get('price_range', 'any')
-            if pref_price == 'budget':
-                filtered_df = filtered_df[filtered_df['price'] <= 60000]
-            elif pref_price == 'premium':
-                filtered_df = filtered_df[filtered_df['price'] >= 70000]
-
-            if filtered_df.empty:
-                # Fallback to just top dishes if filter is too strict
-                return df['id'].head(top_n).tolist()
-            
-            return filtered_df['id'].head(top_n).tolist()
+        return self.user_projection_cache.embedding(self._cached_user_static(user_id), timestamp)
 
-        except Exception as e:
-            print(f"Warning: Preference filter error: {e}. Returning fallback.")
-            return df['id'].head(top_n).tolist()
+    def _cached_user_static(self, user_id: str) -> torch.Tensor:
+        # Cached static projection (live profiles included); otherwise computed from
+        # the CSV data ({} for a completely new user) without caching it
+        static = self.user_projection_cache.get(user_id)
+        if static is None:
+            static = self._user_static_projection(self._user_data(user_id), user_id)
+        return static
 
     # =========================================================================
     # API FEATURE 1: USER RECOMMENDATIONS
     # =========================================================================
 
-    def get_recommendations(self, user_id: str, top_k: int = 10, specific_timestamp=None) -> List[Tuple[str, float]]:
-        """Get recommendations for an existing user."""
+    def get_recommendations(self, user_id: str, top_k: int = 10, specific_timestamp=None,
+                            constraints: Optional[Dict] = None, exclude_seen: bool = False) -> List[Tuple[str, float]]:
+        """
+        Get recommendations for an existing user, optionally under `constraints`
+        (see build_constraint_mask). `exclude_seen` drops dishes the user already ordered.
+        """
         if user_id not in self.dataset.users_lookup:
             raise ValueError(f"User {user_id} not found in dataset.")
 
-        user_emb = self.get_user_embedding(user_id, specific_timestamp)
-        return self.get_recommendations_for_embedding(user_emb, top_k=top_k)
+        # User and dishes are embedded for the same request time
+        timestamp = specific_timestamp if specific_timestamp is not None else pd.Timestamp.now()
+        user_emb = self.get_user_embedding(user_id, timestamp)
+        mask = self._user_request_mask(user_id, constraints, exclude_seen)
+        return self.get_recommendations_for_embedding(user_emb, top_k=top_k, mask=mask, timestamp=timestamp)
+
+    def _user_request_mask(self, user_id: str, constraints: Optional[Dict], exclude_seen: bool) -> Optional[np.ndarray]:
+        mask = self.build_constraint_mask(constraints, self._user_data(user_id))
+        if exclude_seen:
+            seen = self.seen_items.mask(user_id, len(self.dish_embeddings_cache))
+            if seen is not None:
+                mask = ~seen if mask is None else mask & ~seen
+        return mask
+
+    def get_recommendations_batch(self, requests: List[Dict], timestamp=None) -> List[Any]:
+        """
+        get_recommendations for several requests at once (micro-batched serving).
+        Each request is a dict of get_recommendations arguments (user_id, top_k,
+        constraints, exclude_seen). All users are embedded for one timestamp and
+        scored against the catalog with a single matmul; top-k selection stays
+        per request. Returns one result list per request, or the Exception it raised.
+        """
+        timestamp = timestamp if timestamp is not None else pd.Timestamp.now()
+        results: List[Any] = [None] * len(requests)
+        valid, statics, masks = [], [], []
+        for i, request in enumerate(requests):
+            user_id = request['user_id']
+            try:
+                if user_id not in self.dataset.users_lookup:
+                    raise ValueError(f"User {user_id} not found in dataset.")
+                masks.append(self._user_request_mask(
+                    user_id, request.get('constraints'), request.get('exclude_seen', False)
+                ))
+                statics.append(self._cached_user_static(user_id))
+                valid.append(i)
+            except Exception as e:
+                results[i] = e
+        if not valid:
+            return results
+
+        with torch.no_grad():
+            user_embs = self.user_projection_cache.embedding(torch.stack(statics), timestamp)
+            scores = self.item_context_scorer.scores_batch(user_embs, timestamp)  # (num_dishes, batch)
+        for column, (i, mask) in enumerate(zip(valid, masks)):
+            results[i] = self._top_k_masked(scores[:, column], requests[i].get('top_k', 10), mask)
+        return results
 
     # =========================================================================
     # API FEATURE 2: SIMILAR DISHES (ITEM-TO-ITEM)
@@ -313,6 +560,36 @@ class ModelEvaluator:
         filtered = [(d_id, score) for d_id, score in all_similar if d_id != dish_id]
         return filtered[:top_k]
 
+    def get_similar_dishes_batch(self, requests: List[Dict]) -> List[Any]:
+        """
+        get_similar_dishes for several requests (dish_id, top_k, store_id_filter)
+        with one catalog matmul. Returns one result list per request, or the
+        Exception it raised.
+        """
+        index = self.dish_embeddings_cache
+        results: List[Any] = [None] * len(requests)
+        valid = []
+        for i, request in enumerate(requests):
+            if request['dish_id'] in index:
+                valid.append(i)
+            else:
+                results[i] = ValueError(f"Dish {request['dish_id']} not found in cache. Try retraining or reloading.")
+        if not valid:
+            return results
+
+        with torch.no_grad():
+            queries = torch.stack([index[requests[i]['dish_id']] for i in valid])
+            scores = index.matrix @ queries.T  # (num_dishes, batch)
+        for column, i in enumerate(valid):
+            request = requests[i]
+            top_k = request.get('top_k', 10)
+            store_id_filter = request.get('store_id_filter')
+            mask = self._store_mask(store_id_filter) if store_id_filter else None
+            # Fetch extra to filter out self
+            similar = self._top_k_masked(scores[:, column], top_k + 5, mask)
+            results[i] = [(d_id, score) for d_id, score in similar if d_id != request['dish_id']][:top_k]
+        return results
+
     # =========================================================================
     # API FEATURE 3: TAG RECOMMENDATION (POPUP)
     # =========================================================================
@@ -321,66 +598,70 @@ class ModelEvaluator:
         """
         Generates tag recommendations based on a list of dishes (e.g., current order).
         """
-        valid_embeddings = []
-        for dish_id in dish_ids:
-            if dish_id in self.dish_embeddings_cache:
-                valid_embeddings.append(self.dish_embeddings_cache[dish_id])
-        
-        if not valid_embeddings:
-            return []
-
-        # Calculate Centroid of the Order
-        stacked = torch.stack(valid_embeddings)
-        order_vector = torch.mean(stacked, dim=0)
-        order_vector = torch.nn.functional.normalize(order_vector, p=2, dim=0)
-
-        # Find closest tags
-        tag_scores = []
-        for tag, tag_vec in self.tag_embeddings_map.items():
-            score = torch.dot(order_vector, tag_vec).item()
-            tag_scores.append((tag, score))
-            
-        tag_scores.sort(key=lambda x: x[1], reverse=True)
-        return tag_scores[:top_k]
+        return self.recommend_tags_batch([{'dish_ids': dish_ids, 'top_k': top_k}])[0]
     
     def recommend_tags_for_user(self, user_id: str, top_k: int = 10) -> List[Tuple[str, float]]:
         """Recommends tags based on User History."""
-        if user_id not in self.dataset.users_lookup:
-            return []
-            
-        user_emb = self.get_user_embedding(user_id)
-        
-        tag_scores = []
-        for tag, tag_vec in self.tag_embeddings_map.items():
-            score = torch.dot(user_emb, tag_vec).item()
-            tag_scores.append((tag, score))
-            
-        tag_scores.sort(key=lambda x: x[1], reverse=True)
-        return tag_scores[:top_k]
+        return self.recommend_tags_batch([{'user_id': user_id, 'top_k': top_k}])[0]
+
+    def recommend_tags_batch(self, requests: List[Dict]) -> List[Any]:
+        """
+        Tag recommendations for several requests, each either {'user_id', 'top_k'}
+        (user embedding now) or {'dish_ids', 'top_k'} (normalized order centroid).
+        All queries are scored against the stacked tag centroids with one matmul.
+        """
+        results: List[Any] = [[] for _ in requests]
+        valid, queries = [], []
+        timestamp = pd.Timestamp.now()
+        with torch.no_grad():
+            for i, request in enumerate(requests):
+                if request.get('user_id') is not None:
+                    if request['user_id'] not in self.dataset.users_lookup:
+                        continue
+                    query = self.get_user_embedding(request['user_id'], timestamp)
+                else:
+                    # Calculate Centroid of the Order
+                    valid_embeddings = [
+                        self.dish_embeddings_cache[dish_id] for dish_id in request.get('dish_ids', [])
+                        if dish_id in self.dish_embeddings_cache
+                    ]
+                    if not valid_embeddings:
+                        continue
+                    order_vector = torch.mean(torch.stack(valid_embeddings), dim=0)
+                    query = torch.nn.functional.normalize(order_vector, p=2, dim=0)
+                valid.append(i)
+                queries.append(query)
+
+            tag_names, tag_matrix = self.tag_index
+            if not valid or not tag_names:
+                return results
+            # Find closest tags
+            scores = torch.stack(queries).to(tag_matrix.device) @ tag_matrix.T  # (batch, num_tags)
+
+        for row, i in enumerate(valid):
+            top_k = min(requests[i].get('top_k', 10), len(tag_names))
+            if top_k <= 0:
+                continue
+            values, indices = torch.topk(scores[row], top_k)
+            results[i] = [(tag_names[j], float(v)) for j, v in zip(indices.tolist(), values.tolist())]
+        return results
 
     # =========================================================================
     # API FEATURE 4: COLD START SCENARIOS
     # =========================================================================
 
-    def evaluate_cold_start_user(self, scenario: Dict) -> Dict[str, Any]:
+    def evaluate_cold_start_user(self, scenario: Dict, constraints: Optional[Dict] = None,
+                                 top_k: int = 10) -> Dict[str, Any]:
         """Evaluate cold start user based on profile/preferences."""
         user_profile = scenario.get('user_profile', {})
         preferences = user_profile.get('preferences', {})
         
-        # 1. Find dishes matching preferences
-        matching_dish_ids = self._find_dishes_by_preference(preferences, top_n=10)
-        
-        # 2. Create User Proxy Vector (Average of matching dishes)
-        vectors = [self.dish_embeddings_cache[did] for did in matching_dish_ids if did in self.dish_embeddings_cache]
-        
-        if vectors:
-            user_proxy_emb = torch.mean(torch.stack(vectors), dim=0)
-        else:
-            # Fallback: Average of ALL dishes
-            user_proxy_emb = torch.mean(torch.stack(list(self.dish_embeddings_cache.values())), dim=0)
+        # 1. User Proxy Vector (tag + price-band centroids of the preferences)
+        user_proxy_emb = self.cold_start_embedder.embedding(preferences)
             
-        # 3. Get Recommendations
-        recs = self.get_recommendations_for_embedding(user_proxy_emb, top_k=10)
+        # 2. Get Recommendations
+        mask = self.build_constraint_mask(constraints, preferences)
+        recs = self.get_recommendations_for_embedding(user_proxy_emb, top_k=top_k, mask=mask)
         
         return {
             'scenario': 'cold_start_user',
@@ -396,14 +677,7 @@ class ModelEvaluator:
         # (Conceptually: "What would a perfect user for this dish look like?")
         # Then find dishes similar to that concept.
         
-        matching_dish_ids = self._find_dishes_by_preference(dish_profile, top_n=10)
-        vectors = [self.dish_embeddings_cache[did] for did in matching_dish_ids if did in self.dish_embeddings_cache]
-        
-        if vectors:
-            dish_proxy_emb = torch.mean(torch.stack(vectors), dim=0)
-        else:
-            # Fallback
-            dish_proxy_emb = torch.mean(torch.stack(list(self.dish_embeddings_cache.values())), dim=0)
+        dish_proxy_emb = self.cold_start_embedder.embedding(dish_profile)
             
         similar_dishes = self.get_recommendations_for_embedding(
             dish_proxy_emb, 
@@ -443,15 +717,11 @@ class ModelEvaluator:
         # Use a sample user
         sample_user = self.data['users']['id'].iloc[0]
         
-        # Fetch many, then filter
-        raw_recs = self.get_recommendations(sample_user, top_k=50)
-        
-        budget_recs = []
-        for did, score in raw_recs:
-            price = self.data['dishes'][self.data['dishes']['id'] == did]['price'].iloc[0]
-            if price <= max_price:
-                budget_recs.append((did, score))
-                if len(budget_recs) >= 10: break
+        # The price limit is applied before scoring, so the list is never cut short
+        budget_recs = self.get_recommendations(
+            sample_user, top_k=10,
+            constraints={'max_price': max_price, 'exclude_allergy_tags': False, 'exclude_disliked_tags': False}
+        )
         
         return {
             'scenario': 'budget_conscious',
@@ -0,0 +1,182 @@
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+OBJECT_ID_HEX_LEN = 24
+OBJECT_ID_BYTES = 12
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and np.isnan(value))
+
+
+def _is_object_id(value: Any) -> bool:
+    # Lowercase only (the form str(ObjectId) produces): packing is lossy for
+    # case, and "ABC..." / "abc..." must stay distinct keys as in a dict
+    if not isinstance(value, str) or len(value) != OBJECT_ID_HEX_LEN or value != value.lower():
+        return False
+    try:
+        bytes.fromhex(value)
+        return True
+    except ValueError:
+        return False
+
+
+class IdVocabulary:
+    """
+    Read-only id -> embedding index mapping stored as arrays instead of a dict.
+
+    Keys are kept sorted (Mongo ObjectIds packed to 12-byte binaries, anything
+    else as a fixed-width string array) next to the index each key maps to, and
+    lookups use np.searchsorted. Numbering is the same as the previous dict
+    vocabularies: keys get `start`, `start + 1`, ... in the order given, and the
+    special tokens keep their fixed indices, so existing checkpoints still line up.
+
+    Supports the dict operations the encoders use: `vocab[key]`, `vocab.get()`,
+    `key in vocab`, `len(vocab)` (specials included) and `items()`.
+    """
+
+    def __init__(self, keys: Iterable, start: int = 1, specials: Optional[Dict[str, int]] = None):
+        self.specials = dict(specials if specials is not None else {'<UNK>': 0})
+        keys = pd.unique(pd.Series(list(keys), dtype=object))
+        keys = np.array([k for k in keys if not (isinstance(k, str) and k in self.specials)], dtype=object)
+        # A missing id (NaN / None) still takes up its index, as it did as a dict
+        # key, so the ids after it keep their numbers; it just cannot be looked up
+        present = np.array([not _is_missing(k) for k in keys], dtype=bool)
+        indices = np.flatnonzero(present)
+        keys = keys[present]
+
+        self.start = start
+        self.num_slots = len(present)
+        self.binary = len(keys) > 0 and all(_is_object_id(k) for k in keys)
+        packed = self._pack(keys)
+        order = np.argsort(packed, kind='stable')
+        self._sorted_keys = packed[order]
+        # Index assigned to each sorted key, and the sorted position of each index (-1: missing id)
+        self._sorted_index = (indices[order] + start).astype(np.int32)
+        self._position_of = np.full(self.num_slots, -1, dtype=np.int32)
+        self._position_of[indices[order]] = np.arange(len(order), dtype=np.int32)
+
+    def _pack(self, keys: np.ndarray) -> np.ndarray:
+        if self.binary:
+            return np.array([bytes.fromhex(k) for k in keys], dtype=f'S{OBJECT_ID_BYTES}')
+        return np.array([str(k) for k in keys], dtype=str) if len(keys) else np.array([], dtype=str)
+
+    def _unpack(self, value) -> str:
+        if self.binary:
+            # numpy drops trailing NUL bytes from 'S' scalars
+            return value.ljust(OBJECT_ID_BYTES, b'\0').hex()
+        return str(value)
+
+    def _query(self, key: Any):
+        if self.binary:
+            # Compared as an 'S12' scalar: numpy strips trailing NUL bytes on both sides
+            return np.bytes_(bytes.fromhex(key)).rstrip(b'\0') if _is_object_id(key) else None
+        return None if _is_missing(key) else str(key)
+
+    # --- Lookups ---
+
+    def get(self, key: Any, default: Optional[int] = None) -> Optional[int]:
+        if isinstance(key, str) and key in self.specials:
+            return self.specials[key]
+        query = self._query(key)
+        if query is None or len(self._sorted_keys) == 0:
+            return default
+        pos = int(np.searchsorted(self._sorted_keys, query))
+        if pos < len(self._sorted_keys) and self._sorted_keys[pos] == query:
+            return int(self._sorted_index[pos])
+        return default
+
+    def lookup(self, keys: Iterable, default: int = 0) -> np.ndarray:
+        """Vectorized `get` for many keys at once (unknown keys -> `default`)."""
+        keys = list(keys)
+        result = np.full(len(keys), default, dtype=np.int64)
+        if not keys or len(self._sorted_keys) == 0:
+            return result
+        queries = [self._query(k) for k in keys]
+        valid = np.array([q is not None for q in queries])
+        if not valid.any():
+            return result
+        packed = np.array([q for q in queries if q is not None], dtype=self._sorted_keys.dtype)
+        pos = np.searchsorted(self._sorted_keys, packed)
+        pos_clipped = np.minimum(pos, len(self._sorted_keys) - 1)
+        found = (pos < len(self._sorted_keys)) & (self._sorted_keys[pos_clipped] == packed)
+        hits = np.where(found, self._sorted_index[pos_clipped], default)
+        result[np.flatnonzero(valid)] = hits
+        return result
+
+    def key_at(self, index: int) -> Optional[str]:
+        """The key mapped to `index` (inverse lookup, specials excluded; None for a missing id)."""
+        pos = self._position_of[index - self.start]
+        return None if pos < 0 else self._unpack(self._sorted_keys[pos])
+
+    def keys_in_order(self) -> Iterator[str]:
+        """Non-special keys in index order."""
+        for pos in self._position_of:
+            if pos >= 0:
+                yield self._unpack(self._sorted_keys[pos])
+
+    @property
+    def num_keys(self) -> int:
+        return len(self._sorted_keys)
+
+    # --- dict compatibility ---
+
+    def __getitem__(self, key: Any) -> int:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self.num_slots + len(self.specials)
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        yield from self.specials.items()
+        for pos in self._position_of:
+            if pos >= 0:
+                yield self._unpack(self._sorted_keys[pos]), int(self._sorted_index[pos])
+
+    @property
+    def nbytes(self) -> int:
+        return self._sorted_keys.nbytes + self._sorted_index.nbytes + self._position_of.nbytes
+
+
+class FrameRowLookup:
+    """
+    id -> row mapping over a DataFrame without materializing a dict per row.
+
+    Replaces `df.set_index('id').to_dict('index')`: rows are located through an
+    IdVocabulary and read from per-column arrays that share the frame's memory,
+    so `get()` still returns a plain dict (without the id column).
+    """
+
+    def __init__(self, df: pd.DataFrame, id_column: str = 'id'):
+        df = df[df[id_column].notna()].drop_duplicates(subset=id_column, keep='first')
+        self._rows = IdVocabulary(df[id_column].astype(object), start=0, specials={})
+        self._columns = {
+            col: (df[col].array if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].to_numpy())
+            for col in df.columns if col != id_column
+        }
+
+    def get(self, key: Any, default: Any = None) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(key)
+        if row is None:
+            return default
+        return {col: values[row] for col, values in self._columns.items()}
+
+    def __getitem__(self, key: Any) -> Dict[str, Any]:
+        row = self.get(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._rows
+
+    def __len__(self) -> int:
+        return self._rows.num_keys
@@ -0,0 +1,92 @@
+import io
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+
+class ImagePredictionCache:
+    """
+    Bounded LRU cache of image predictions keyed by the SHA-256 of the raw bytes.
+
+    Optionally keeps a 64-bit difference hash (dHash) per entry so re-encoded or
+    slightly edited copies of the same photo can reuse a prediction when their
+    hashes are within `max_distance` bits of each other.
+
+    Not thread-safe: it is meant to be used from the event loop only.
+    """
+
+    def __init__(self, max_entries: int = 1024, use_perceptual_hash: bool = False, max_distance: int = 4):
+        self.max_entries = max(1, int(max_entries))
+        self.use_perceptual_hash = use_perceptual_hash
+        self.max_distance = max_distance
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._phashes: Dict[str, int] = {}
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_key(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def perceptual_hash(image_bytes: bytes) -> int:
+        """64-bit dHash: compares neighbouring pixels of a 9x8 grayscale thumbnail."""
+        img = Image.open(io.BytesIO(image_bytes))
+        img.draft("L", (64, 64))  # JPEG: decode at reduced size directly
+        pixels = list(img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                left = pixels[row * 9 + col]
+                right = pixels[row * 9 + col + 1]
+                value = (value << 1) | (1 if left > right else 0)
+        return value
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def get_similar(self, phash: int) -> Optional[Dict[str, Any]]:
+        """Returns the closest cached prediction within `max_distance` bits, if any."""
+        best_key, best_distance = None, self.max_distance + 1
+        for key, cached_hash in self._phashes.items():
+            distance = (phash ^ cached_hash).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+                if distance == 0:
+                    break
+
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        self.near_hits += 1
+        return self._entries[best_key]
+
+    def put(self, key: str, value: Dict[str, Any], phash: Optional[int] = None):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if phash is not None:
+            self._phashes[key] = phash
+
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._phashes.pop(evicted_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+        }
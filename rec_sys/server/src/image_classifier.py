@@ -0,0 +1,190 @@
+import io
+import os
+import re
+import hashlib
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import torch
+from PIL import Image
+from transformers import AutoFeatureExtractor, AutoModelForImageClassification
+
+
+class FoodImageClassifier:
+    """
+    Wraps the `nateraw/food` feature extractor and classifier so a whole batch
+    of uploaded images is decoded, preprocessed and classified in one forward pass.
+
+    Serving backends (`backend`):
+      - "fp32": the original float32 PyTorch model.
+      - "int8": PyTorch model with dynamically quantized (qint8) Linear layers.
+      - "onnx": ONNX graph executed by onnxruntime on CPU. The graph is exported
+        from the PyTorch model on first use and cached next to `onnx_path`, keyed
+        by model name and weights version so a changed model is re-exported.
+    """
+
+    BACKENDS = ("fp32", "int8", "onnx")
+    DEFAULT_ONNX_PATH = "./server/model/food_classifier.onnx"
+
+    def __init__(self, model_name: str = "nateraw/food", backend: str = "fp32", onnx_path: Optional[str] = None):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown image model backend '{backend}'. Choose one of {self.BACKENDS}.")
+
+        self.model_name = model_name
+        self.backend = backend
+        self.onnx_session = None
+
+        self.extractor = AutoFeatureExtractor.from_pretrained(model_name)
+        self.model = AutoModelForImageClassification.from_pretrained(model_name)
+        self.model.eval()
+        self.id2label = self.model.config.id2label
+        self.onnx_path = self._keyed_onnx_path(onnx_path or self.DEFAULT_ONNX_PATH) if backend == "onnx" else None
+
+        if backend == "int8":
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        elif backend == "onnx":
+            self.onnx_session = self._load_onnx_session()
+
+    # --- Backends ---
+
+    def _weights_version(self) -> str:
+        """Hub revision of the weights, or a hash of them for local / unversioned models."""
+        revision = getattr(self.model.config, "_commit_hash", None)
+        if revision:
+            return revision[:12]
+        digest = hashlib.sha256()
+        for name, tensor in sorted(self.model.state_dict().items()):
+            digest.update(name.encode("utf-8"))
+            digest.update(tensor.detach().cpu().numpy().tobytes())
+        return digest.hexdigest()[:12]
+
+    def _keyed_onnx_path(self, onnx_path: str) -> str:
+        """`<dir>/<stem>-<model name>-<weights version>.onnx`, so each model gets its own graph."""
+        root, ext = os.path.splitext(onnx_path)
+        model_slug = re.sub(r"[^A-Za-z0-9._-]+", "_", self.model_name)
+        return f"{root}-{model_slug}-{self._weights_version()}{ext or '.onnx'}"
+
+    def _export_onnx(self):
+        """Exports the float32 model to ONNX with a dynamic batch dimension."""
+        size = self.extractor.size
+        if isinstance(size, dict):
+            height = size.get("height", size.get("shortest_edge", 224))
+            width = size.get("width", size.get("shortest_edge", 224))
+        else:
+            height = width = int(size)
+
+        dummy = torch.zeros(1, 3, height, width, dtype=torch.float32)
+        directory = os.path.dirname(os.path.abspath(self.onnx_path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Export to a private temp file and rename it into place: workers exporting
+        # concurrently never expose (or load) a half-written graph.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".onnx.tmp")
+        os.close(fd)
+        try:
+            torch.onnx.export(
+                self.model,
+                (dummy,),
+                tmp_path,
+                input_names=["pixel_values"],
+                output_names=["logits"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=17,
+            )
+            os.replace(tmp_path, self.onnx_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        print(f"Exported image classifier to ONNX: {self.onnx_path}")
+
+    def _load_onnx_session(self):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The 'onnx' image backend requires onnxruntime: pip install onnxruntime") from e
+
+        if not os.path.exists(self.onnx_path):
+            self._export_onnx()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(self.onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        # The PyTorch weights are no longer needed once the graph is loaded
+        self.model = None
+        return session
+
+    def _forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """Returns logits for a batch of preprocessed images."""
+        if self.onnx_session is not None:
+            logits = self.onnx_session.run(["logits"], {"pixel_values": pixel_values.numpy()})[0]
+            return torch.from_numpy(logits)
+
+        with torch.inference_mode():
+            return self.model(pixel_values=pixel_values).logits
+
+    # --- Inference ---
+
+    def _target_size(self) -> int:
+        """Shortest edge the extractor resizes to (224 for nateraw/food)."""
+        size = self.extractor.size
+        if isinstance(size, dict):
+            return int(size.get("shortest_edge") or min(size.get("height", 224), size.get("width", 224)))
+        return int(size)
+
+    def _decode(self, image_bytes: bytes) -> Image.Image:
+        """
+        Decodes straight to roughly the model's input size instead of full resolution.
+        JPEGs use draft mode (libjpeg DCT scaling to 1/2, 1/4 or 1/8 and RGB output),
+        other formats are reduced by an integer factor before the mode conversion,
+        so a 12MP photo never materializes as a full-size RGB copy.
+        """
+        target = self._target_size()
+        img = Image.open(io.BytesIO(image_bytes))
+
+        if img.format == "JPEG":
+            img.draft("RGB", (target, target))
+        else:
+            factor = min(img.size) // target
+            if factor >= 2:
+                if img.mode not in ("L", "LA", "RGB", "RGBA"):
+                    img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+                img = img.reduce(factor)
+
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.load()  # Surface truncated/corrupt files here, per image, not inside the batch
+        return img
+
+    def predict_batch(self, images_bytes: List[bytes]) -> List[Any]:
+        """
+        Classifies a list of raw image payloads.
+        Returns one {"label", "confidence"} dict per input, or the decoding
+        exception for inputs that are not valid images.
+        """
+        results: List[Any] = [None] * len(images_bytes)
+        valid_positions, images = [], []
+
+        for pos, image_bytes in enumerate(images_bytes):
+            try:
+                images.append(self._decode(image_bytes))
+                valid_positions.append(pos)
+            except Exception as e:
+                results[pos] = ValueError(f"Invalid image: {e}")
+
+        if not images:
+            return results
+
+        inputs = self.extractor(images=images, return_tensors="pt")
+        logits = self._forward(inputs["pixel_values"])
+        probs = torch.nn.functional.softmax(logits, dim=-1)
+        confidences, pred_indices = probs.max(dim=-1)
+
+        for pos, conf, idx in zip(valid_positions, confidences.tolist(), pred_indices.tolist()):
+            results[pos] = self._to_result(idx, conf)
+        return results
+
+    def _to_result(self, pred_idx: int, confidence: float) -> Dict[str, Any]:
+        return {"label": self.id2label[pred_idx], "confidence": float(confidence)}
@@ -4,9 +4,20 @@ load_dotenv()
 import os
 import json
 import pandas as pd
-from typing import List, Dict, Any, Set
-from google import genai
-from google.genai import types
+from typing import List, Dict, Any, Set, AsyncIterator
+
+# google.genai is imported lazily (see _import_genai) to keep API startup fast
+genai = None
+types = None
+
+
+def _import_genai():
+    """Imports the Gemini SDK on first use and exposes it as module globals."""
+    global genai, types
+    if genai is None:
+        from google import genai as _genai
+        from google.genai import types as _types
+        genai, types = _genai, _types
 
 
 class LLMService:
@@ -25,6 +36,7 @@ class LLMService:
 
     def __init__(self, model_name: str = 'gemini-2.5-flash'):
         try:
+            _import_genai()
             # --- SỬA LỖI KHỞI TẠO ---
             # SDK mới sử dụng Client().
             # Nó sẽ tự động đọc API key từ biến môi trường GEMINI_API_KEY.
@@ -39,10 +51,15 @@ class LLMService:
             self.client = None
         
         # --- PHẦN TẢI TAG (Giữ nguyên) ---
-        self.taste_tags_set_norm: Set[str] = self._load_tags_to_norm_set(self.TAG_FILES["taste"])
-        self.method_tags_set_norm: Set[str] = self._load_tags_to_norm_set(self.TAG_FILES["method"])
-        self.ingredient_tags_set_norm: Set[str] = self._load_tags_to_norm_set(self.TAG_FILES["ingredient"])
-        self.culture_tags_set_norm: Set[str] = self._load_tags_to_norm_set(self.TAG_FILES["culture"])
+        self.taste_tag_ids: Dict[str, str] = self._load_tags_to_norm_map(self.TAG_FILES["taste"])
+        self.method_tag_ids: Dict[str, str] = self._load_tags_to_norm_map(self.TAG_FILES["method"])
+        self.ingredient_tag_ids: Dict[str, str] = self._load_tags_to_norm_map(self.TAG_FILES["ingredient"])
+        self.culture_tag_ids: Dict[str, str] = self._load_tags_to_norm_map(self.TAG_FILES["culture"])
+
+        self.taste_tags_set_norm: Set[str] = set(self.taste_tag_ids)
+        self.method_tags_set_norm: Set[str] = set(self.method_tag_ids)
+        self.ingredient_tags_set_norm: Set[str] = set(self.ingredient_tag_ids)
+        self.culture_tags_set_norm: Set[str] = set(self.culture_tag_ids)
         
         print(f"Đã tải {len(self.taste_tags_set_norm)} taste tags.")
         print(f"Đã tải {len(self.method_tags_set_norm)} method tags.")
@@ -50,20 +67,21 @@ class LLMService:
         print(f"Đã tải {len(self.culture_tags_set_norm)} culture tags.")
         # ------------------------------------
 
-    def _load_tags_to_norm_set(self, filename: str) -> Set[str]:
+    def _load_tags_to_norm_map(self, filename: str) -> Dict[str, str]:
         """
-        Hàm private để tải file CSV (Giữ nguyên).
+        Hàm private để tải file CSV, trả về map: tên tag (đã chuẩn hóa) -> id tag.
         """
         try:
             file_path = os.path.join(self.BASE_DATA_PATH, filename)
             df = pd.read_csv(file_path)
-            return {str(name).lower().strip() for name in df['name']}
+            ids = df['id'] if 'id' in df.columns else df['name']
+            return {str(name).lower().strip(): str(tag_id) for name, tag_id in zip(df['name'], ids)}
         except FileNotFoundError:
-            print(f"CẢNH BÁO: Không tìm thấy file tag: {file_path}. Trả về set rỗng.")
-            return set()
+            print(f"CẢNH BÁO: Không tìm thấy file tag: {file_path}. Trả về map rỗng.")
+            return {}
         except Exception as e:
-            print(f"Lỗi khi tải file {filename}: {e}. Trả về set rỗng.")
-            return set()
+            print(f"Lỗi khi tải file {filename}: {e}. Trả về map rỗng.")
+            return {}
 
     def _build_tagging_prompt(self, name: str, description: str) -> str:
         """
@@ -123,6 +141,32 @@ class LLMService:
         return final_output
 
 
+    def _parse_json_response(self, text: str) -> Dict[str, Any]:
+        """
+        Bỏ các ký tự bọc markdown (```json ... ```) rồi parse JSON.
+        """
+        raw_text = text.strip()
+        if raw_text.startswith("```json"):
+            raw_text = raw_text[7:-3].strip()
+        elif raw_text.startswith("`"):
+            raw_text = raw_text[1:-1].strip()
+        return json.loads(raw_text)
+
+    def tags_to_dish_columns(self, tags: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """
+        Chuyển tag (tên) đã lọc sang id, theo đúng tên cột của dishes.csv
+        để có thể đưa thẳng vào ModelEvaluator.update_dish_embedding.
+        """
+        def to_ids(names: List[str], id_map: Dict[str, str]) -> List[str]:
+            return [id_map[str(n).lower().strip()] for n in names if str(n).lower().strip() in id_map]
+
+        return {
+            "food_tags": to_ids(tags.get("ingredient_tags", []), self.ingredient_tag_ids),
+            "taste_tags": to_ids(tags.get("taste_tags", []), self.taste_tag_ids),
+            "cooking_method_tags": to_ids(tags.get("method_tags", []), self.method_tag_ids),
+            "culture_tags": to_ids(tags.get("culture_tags", []), self.culture_tag_ids)
+        }
+
     async def extract_tags(self, name: str, description: str) -> Dict[str, List[str]]:
         """
         Chức năng 1: Gán thẻ (Cập nhật logic gọi API).
@@ -152,13 +196,7 @@ class LLMService:
             )
             print(response) # In ra để debug
             
-            raw_text = response.text.strip()
-            if raw_text.startswith("```json"):
-                raw_text = raw_text[7:-3].strip()
-            elif raw_text.startswith("`"):
-                raw_text = raw_text[1:-1].strip()
-
-            llm_output_dict = json.loads(raw_text)
+            llm_output_dict = self._parse_json_response(response.text)
             
             filtered_output = self._filter_llm_tags(llm_output_dict)
             
@@ -207,6 +245,106 @@ class LLMService:
                 "new_description": f"Lỗi khi tạo mô tả: {e}"
             }
 
+    async def optimize_description_stream(self, name: str, description: str) -> AsyncIterator[str]:
+        """
+        Chức năng 2 (streaming): Trả về từng đoạn văn bản ngay khi Gemini sinh ra.
+        Khi generator bị đóng (client ngắt kết nối), stream tới Gemini cũng được đóng theo.
+        """
+        if not self.client:
+            raise RuntimeError("Client not initialized")
+
+        prompt = self._build_optimize_prompt(name, description)
+
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                thinking_config=types.ThinkingConfig(
+                    thinking_budget=0
+                )
+            )
+        )
+        try:
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # Dừng nhận token từ Gemini nếu client đã ngắt kết nối giữa chừng
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def enrich_dish(self, name: str, description: str) -> Dict[str, Any]:
+        """
+        Chức năng 3: Gán thẻ + tối ưu mô tả trong MỘT lần gọi Gemini.
+        Trả về các danh sách tag đã lọc và mô tả mới.
+        """
+        base_text = description if description else name
+        payload = {
+            "taste_tags": [], "method_tags": [], "ingredient_tags": [], "culture_tags": [],
+            "original_name": name,
+            "original_description": description,
+            "new_description": base_text
+        }
+
+        if not self.client:
+            print("Lỗi: Client chưa được khởi tạo")
+            return payload
+
+        prompt = self._build_enrich_prompt(name, base_text)
+
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    thinking_config=types.ThinkingConfig(
+                        thinking_budget=0
+                    )
+                )
+            )
+
+            llm_output_dict = self._parse_json_response(response.text)
+
+            payload.update(self._filter_llm_tags(llm_output_dict))
+            new_description = str(llm_output_dict.get("new_description") or "").strip()
+            if new_description:
+                payload["new_description"] = new_description
+            return payload
+
+        except Exception as e:
+            print(f"Lỗi khi làm giàu thông tin món ăn: {e}")
+            return payload
+
+    def _build_enrich_prompt(self, name: str, base_text: str) -> str:
+        return f"""
+        Bạn là một chuyên gia ẩm thực kiêm copywriter cho ứng dụng đặt món.
+        Với tên và mô tả món ăn dưới đây, hãy làm ĐỒNG THỜI hai việc:
+
+        A. Trích xuất thẻ:
+        1.  **taste_tags**: Hương vị (ví dụ: cay, ngọt, chua, béo ngậy).
+        2.  **method_tags**: Cách chế biến (ví dụ: nướng, chiên, xào, hấp).
+        3.  **ingredient_tags**: Thành phần chính (ví dụ: 'thịt gà', 'thịt bò', 'cá basa', 'tôm', 'đậu hũ').
+        4.  **culture_tags**: Nguồn gốc ẩm thực (ví dụ: 'Việt Nam', 'Thái Lan', 'Nhật Bản').
+
+        B. Viết lại mô tả (**new_description**):
+        - Sử dụng từ ngữ kích thích vị giác, văn phong chuyên nghiệp, mời gọi.
+        - Giữ độ dài vừa phải (khoảng 2-3 câu), không thêm lời dẫn.
+        - Nếu không thể viết lại, trả về chính xác thông tin gốc.
+
+        ĐỊNH DẠNG ĐẦU RA:
+        Chỉ trả về một đối tượng JSON hợp lệ với 5 key: `taste_tags`, `method_tags`,
+        `ingredient_tags`, `culture_tags` (danh sách chuỗi, rỗng nếu không tìm thấy)
+        và `new_description` (chuỗi).
+
+        DỮ LIỆU ĐẦU VÀO:
+        - Tên món ăn: "{name}"
+        - Mô tả: "{base_text}"
+
+        JSON ĐẦU RA:
+        """
+
     def _build_optimize_prompt(self, name: str, description: str) -> str:
         base_text = description if description else name
         
@@ -0,0 +1,130 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    Collects concurrent async requests for a short time window and runs them
+    as a single batch on a dedicated executor, so heavy (CPU / torch) work never
+    blocks the event loop and bursts of requests share one forward pass.
+
+    `batch_fn` receives a list of items and must return a list of results in the
+    same order. A result that is an Exception instance is raised only for that
+    item, so one bad input does not fail the whole batch. `stats()` reports the
+    queue depth and batch sizes, to tune max_batch_size / max_wait_ms.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0, executor: Optional[Executor] = None, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.batches_run = 0
+        self.items_processed = 0
+        self.last_batch_size = 0
+        self.max_queue_depth = 0
+
+    async def start(self):
+        """Starts the background collector on the running event loop."""
+        if self._worker_task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker_task = asyncio.create_task(self._run(), name=f"{self.name}-worker")
+
+    async def stop(self):
+        """Stops the collector and fails any request still waiting in the queue."""
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} stopped"))
+
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one item and waits for its result from the next batch."""
+        if self._worker_task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    def queue_depth(self) -> int:
+        """Requests waiting for the next batch."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches_run,
+            "items": self.items_processed,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(self.items_processed / self.batches_run, 2) if self.batches_run else 0.0,
+        }
+
+    async def _collect_batch(self) -> List[Tuple[Any, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+
+            # Requests whose client already gave up are not worth computing
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            self.batches_run += 1
+            self.items_processed += len(items)
+            self.last_batch_size = len(items)
+            try:
+                results = await loop.run_in_executor(self._executor, self.batch_fn, items)
+            except Exception as e:
+                print(f"[{self.name}] Batch of {len(items)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,55 @@
+from typing import Dict, Iterable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class SeenItemsIndex:
+    """
+    Per-user set of dish rows the user already ordered / interacted with, kept as
+    one packed bitset per user (num_dishes / 8 bytes) over the DishEmbeddingIndex
+    rows. `mask()` expands it to a boolean row mask for top-k retrieval, and
+    `mark_seen()` updates it online when new orders come in.
+    """
+
+    def __init__(self, id_to_row: Mapping[str, int]):
+        # Live reference to the embedding index map, so dishes added later resolve too
+        self.id_to_row = id_to_row
+        self._bits: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def build(cls, pairs: Optional[pd.DataFrame], id_to_row: Mapping[str, int]) -> "SeenItemsIndex":
+        """From a (user_id, dish_id) table, e.g. the serving `user_seen` table."""
+        index = cls(id_to_row)
+        if pairs is None or pairs.empty:
+            return index
+        for user_id, dish_ids in pairs.groupby('user_id', observed=True, sort=False)['dish_id']:
+            index.mark_seen(str(user_id), dish_ids.astype(str))
+        return index
+
+    def mark_seen(self, user_id: str, dish_ids: Iterable[str]) -> int:
+        """Adds dishes to the user's seen set. Returns how many were newly added."""
+        rows = np.array([self.id_to_row[d] for d in dish_ids if d in self.id_to_row], dtype=np.int64)
+        if len(rows) == 0:
+            return 0
+        bits = self._bits.get(user_id)
+        num_bytes = (int(rows.max()) >> 3) + 1
+        if bits is None or len(bits) < num_bytes:
+            grown = np.zeros(num_bytes, dtype=np.uint8)
+            if bits is not None:
+                grown[:len(bits)] = bits
+            bits = self._bits[user_id] = grown
+
+        before = int(np.unpackbits(bits).sum())
+        np.bitwise_or.at(bits, rows >> 3, (0x80 >> (rows & 7)).astype(np.uint8))
+        return int(np.unpackbits(bits).sum()) - before
+
+    def mask(self, user_id: str, num_rows: int) -> Optional[np.ndarray]:
+        """Boolean mask of the user's seen rows (None when the user has seen nothing)."""
+        bits = self._bits.get(user_id)
+        if bits is None:
+            return None
+        seen = np.zeros(num_rows, dtype=bool)
+        unpacked = np.unpackbits(bits).astype(bool)[:num_rows]
+        seen[:len(unpacked)] = unpacked
+        return seen
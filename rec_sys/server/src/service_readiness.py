@@ -0,0 +1,90 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class ServiceReadiness:
+    """
+    Tracks per-feature readiness (image model, recommender, LLM...) and a
+    startup-time breakdown, so independent services can be initialized in
+    parallel and each endpoint only waits for the feature it actually needs.
+
+    States: "pending" -> "loading" -> "ready" | "unavailable" | "failed"
+
+    Overall readiness (the /health/ready probe) only requires the critical
+    services to have settled without failing: "unavailable" (e.g. no API key or
+    no model files) is a final state, and endpoints of features that are not
+    ready are still refused individually.
+    """
+
+    SETTLED_STATES = ("ready", "unavailable", "failed")
+
+    def __init__(self, services: List[str], critical: Optional[Iterable[str]] = None):
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._services: Dict[str, Dict[str, Any]] = {
+            name: {"state": "pending", "error": None, "seconds": None, "phases": {}}
+            for name in services
+        }
+        # Services the overall readiness waits for (default: all of them)
+        self.critical = [name for name in (critical or services) if name in self._services]
+
+    def set_state(self, name: str, state: str, error: str = None):
+        with self._lock:
+            service = self._services[name]
+            service["state"] = state
+            service["error"] = error
+            if state in self.SETTLED_STATES:
+                started = service.get("_started")
+                if started is not None:
+                    service["seconds"] = round(time.perf_counter() - started, 3)
+            elif state == "loading":
+                service["_started"] = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str, phase: str):
+        """Times one step (e.g. 'import', 'load_weights') of a service's startup."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._services[name]["phases"][phase] = round(time.perf_counter() - start, 3)
+
+    def is_ready(self, name: str) -> bool:
+        return self._services[name]["state"] == "ready"
+
+    def state(self, name: str) -> str:
+        return self._services[name]["state"]
+
+    def all_settled(self, names: Optional[Iterable[str]] = None) -> bool:
+        names = self._services if names is None else names
+        return all(self._services[name]["state"] in self.SETTLED_STATES for name in names)
+
+    def is_healthy(self) -> bool:
+        """Critical services settled ("ready" or "unavailable") and none of them failed."""
+        return self.all_settled(self.critical) and all(
+            self._services[name]["state"] != "failed" for name in self.critical
+        )
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            services = {
+                name: {k: v for k, v in info.items() if not k.startswith("_")}
+                for name, info in self._services.items()
+            }
+        return {
+            "ready": self.is_healthy(),
+            "critical_services": list(self.critical),
+            "uptime_seconds": round(time.perf_counter() - self._started_at, 3),
+            "services": services,
+        }
+
+    def format_report(self) -> str:
+        lines = ["--- Startup time breakdown ---"]
+        for name, info in self.report()["services"].items():
+            phases = ", ".join(f"{p}={s:.2f}s" for p, s in info["phases"].items())
+            total = f"{info['seconds']:.2f}s" if info["seconds"] is not None else "-"
+            lines.append(f"  {name:<12} {info['state']:<12} total={total:<8} {phases}")
+        return "\n".join(lines)
@@ -0,0 +1,129 @@
+import os
+import json
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: rebuilds are not serialized across processes
+    fcntl = None
+
+import pandas as pd
+
+from src.columnar_io import read_table, resolve_format, write_table
+from src.data_preprocessor import DataPreprocessor
+from src.shared_artifacts import data_fingerprint
+
+# Only the fields the API needs to encode users / dishes and enrich responses;
+# the interaction history is reduced to distinct (user, dish) pairs for the
+# seen-items filter, and the tag name tables are never loaded for serving.
+TAG_COLUMNS = ['food_tags', 'taste_tags', 'cooking_method_tags', 'culture_tags']
+DISH_SERVING_COLUMNS = ['id', 'name', 'price', 'category', 'cuisine', 'store_id', 'rating', *TAG_COLUMNS]
+USER_SERVING_COLUMNS = ['id', 'age', 'gender', 'liked_tags', 'disliked_tags', 'allergy_tags']
+SEEN_COLUMNS = ['user_id', 'dish_id']
+
+# Source tables a serving artifact depends on (see serving_tables_valid)
+SOURCE_STEMS = ('dishes', 'users', 'interaction')
+
+SERVING_MANIFEST_FILE = "serving_manifest.json"
+SERVING_LOCK_FILE = ".serving.lock"
+
+
+def _select(df: pd.DataFrame, columns) -> pd.DataFrame:
+    return df[[col for col in columns if col in df.columns]].reset_index(drop=True)
+
+
+def _prepare(preprocessor: DataPreprocessor, users: pd.DataFrame, dishes: pd.DataFrame,
+             user_seen: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    users = preprocessor.compact_dtypes(preprocessor.preprocess_users(_select(users, USER_SERVING_COLUMNS)))
+    dishes = preprocessor.compact_dtypes(preprocessor.preprocess_dishes(_select(dishes, DISH_SERVING_COLUMNS)))
+    user_seen = preprocessor.compact_dtypes(user_seen)
+    return {'users': users, 'dishes': dishes, 'user_seen': user_seen}
+
+
+def _seen_pairs(interactions: pd.DataFrame) -> pd.DataFrame:
+    """Distinct (user_id, dish_id) pairs from the interaction history."""
+    if interactions.empty or not set(SEEN_COLUMNS) <= set(interactions.columns):
+        return pd.DataFrame(columns=SEEN_COLUMNS)
+    return interactions[SEEN_COLUMNS].dropna().astype(str).drop_duplicates().reset_index(drop=True)
+
+
+def load_source_tables(data_dir: str) -> Dict[str, pd.DataFrame]:
+    """Serving tables straight from the exported data (users, dishes and seen pairs)."""
+    preprocessor = DataPreprocessor(data_dir)
+    data = preprocessor.load_data(tables=['users', 'dishes'])
+    try:
+        interactions = preprocessor.load_data(tables=['interactions'])['interactions']
+    except FileNotFoundError:
+        interactions = pd.DataFrame()
+    return _prepare(preprocessor, data['users'], data['dishes'], _seen_pairs(interactions))
+
+
+def build_serving_tables(data_dir: str, output_dir: str, fmt: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """Writes the serving tables plus a manifest of the source snapshot they came from."""
+    tables = load_source_tables(data_dir)
+    fmt = resolve_format(fmt)
+    for stem, df in tables.items():
+        write_table(df, output_dir, stem, fmt)
+    manifest = {
+        "fingerprint": data_fingerprint(data_dir, SOURCE_STEMS),
+        "format": fmt,
+        "rows": {stem: len(df) for stem, df in tables.items()},
+    }
+    with open(os.path.join(output_dir, SERVING_MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Serving tables written to {output_dir}: {manifest['rows']}")
+    return tables
+
+
+@contextmanager
+def _build_lock(directory: str):
+    """Exclusive lock on `directory`, held by one process at a time (e.g. API workers)."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, SERVING_LOCK_FILE), "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def serving_tables_valid(directory: str, data_dir: str) -> bool:
+    """True if the serving tables in `directory` were built from the current export."""
+    manifest_path = os.path.join(directory, SERVING_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return False
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    return manifest.get("fingerprint") == data_fingerprint(data_dir, SOURCE_STEMS)
+
+
+def load_serving_tables(data_dir: str, serving_dir: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """
+    The users / dishes tables for the API. With `serving_dir`, reads the prebuilt
+    artifact (rebuilding it when the export changed); otherwise reads the export.
+    """
+    if not serving_dir:
+        return load_source_tables(data_dir)
+
+    if not serving_tables_valid(serving_dir, data_dir):
+        try:
+            # One worker rebuilds; the others wait and then read its output
+            with _build_lock(serving_dir):
+                if not serving_tables_valid(serving_dir, data_dir):
+                    return build_serving_tables(data_dir, serving_dir)
+        except OSError as e:
+            print(f"⚠️ Could not write serving tables to {serving_dir}: {e}")
+            return load_source_tables(data_dir)
+
+    print(f"Loading serving tables from {serving_dir}...")
+    preprocessor = DataPreprocessor(serving_dir)
+    return _prepare(
+        preprocessor, read_table(serving_dir, 'users'), read_table(serving_dir, 'dishes'),
+        read_table(serving_dir, 'user_seen')
+    )
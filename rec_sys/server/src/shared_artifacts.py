@@ -0,0 +1,70 @@
+import os
+import json
+from typing import Any, Dict, Iterable, Optional
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _stat(path: Optional[str]) -> Optional[list]:
+    if not path or not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, int(st.st_mtime)]
+
+
+def data_fingerprint(data_dir: str, stems: Iterable[str] = ("dishes", "users")) -> Dict[str, Any]:
+    """Identifies the snapshot of the given tables (CSV and Parquet) in `data_dir`."""
+    fingerprint = {}
+    for stem in stems:
+        fingerprint[stem] = _stat(os.path.join(data_dir, f"{stem}.csv"))
+        fingerprint[f"{stem}_parquet"] = _stat(os.path.join(data_dir, f"{stem}.parquet"))
+    return fingerprint
+
+
+def artifact_fingerprint(model_path: str, data_dir: str) -> Dict[str, Any]:
+    """Identifies the checkpoint + catalog snapshot that shared artifacts were built from."""
+    return {"model": _stat(model_path), **data_fingerprint(data_dir)}
+
+
+def shared_artifacts_valid(artifact_dir: str, model_path: str, data_dir: str) -> bool:
+    """True if the artifacts in `artifact_dir` were built from the current checkpoint and data."""
+    manifest_path = os.path.join(artifact_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return False
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    return manifest.get("fingerprint") == artifact_fingerprint(model_path, data_dir)
+
+
+def write_manifest(artifact_dir: str, model_path: str, data_dir: str, extra: Dict[str, Any] = None):
+    os.makedirs(artifact_dir, exist_ok=True)
+    manifest = {"fingerprint": artifact_fingerprint(model_path, data_dir), **(extra or {})}
+    with open(os.path.join(artifact_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def configure_torch_threads(workers: Optional[int] = None) -> int:
+    """
+    Sizes torch intra-op threads per worker process so N workers on one node do
+    not each spawn one thread per core (oversubscription). Honors TORCH_NUM_THREADS
+    when set explicitly; otherwise uses cpu_count // API_WORKERS.
+    """
+    import torch
+
+    explicit = os.getenv("TORCH_NUM_THREADS")
+    if explicit:
+        threads = int(explicit)
+    else:
+        workers = workers or int(os.getenv("API_WORKERS", "1"))
+        threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1 if workers and workers > 1 else max(1, threads // 2))
+    except RuntimeError:
+        # Can only be set once, before any inter-op parallel work has started
+        pass
+    return threads
@@ -103,6 +103,62 @@ class SimpleTwoTowerModel(nn.Module):
 
         return F.normalize(self.item_projection(combined), p=2, dim=-1)
 
+    # --- Partial projections (time-context decomposition) ---
+    # The projections are linear before the normalization, so their input splits into
+    # a static part and a time/day part that is the same for every dish / user:
+    #   forward_item(x) == normalize(item_static_projection(x) + item_context_projection(t, d))
+    #   forward_user(x) == normalize(user_static_projection(x) + user_context_projection(t, d))
+
+    def item_static_projection(self, item_features: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """Unnormalized item projection of the dish features only (bias included, time/day excluded)."""
+        static = torch.cat([
+            self.dish_embedding(item_features['dish_id']),
+            self.store_embedding(item_features['store_id']),
+            self._mean_pooling(item_features['tags'], self.tag_embedding),
+            self.category_embedding(item_features['category']),
+            self.dish_price(item_features['price'].unsqueeze(-1)),
+            self.dish_rating(item_features['rating'].unsqueeze(-1)),
+        ], dim=-1)
+        weight = self.item_projection.weight[:, :static.shape[-1]]
+        return F.linear(static, weight, self.item_projection.bias)
+
+    def item_context_projection(self, time_of_day: torch.Tensor, day_of_week: torch.Tensor) -> torch.Tensor:
+        """The time/day share of the item projection (no bias), identical for all dishes."""
+        context = torch.cat([
+            self.dish_time(time_of_day.unsqueeze(-1)),
+            self.dish_day(day_of_week),
+        ], dim=-1)
+        weight = self.item_projection.weight[:, -context.shape[-1]:]
+        return F.linear(context, weight)
+
+    def _user_context_columns(self) -> slice:
+        # user_projection input: [id, age, gender, time, day, liked, disliked, allergy]
+        start = self.embedding_dim + 2 * (self.embedding_dim // 4)
+        return slice(start, start + 2 * (self.embedding_dim // 8))
+
+    def user_static_projection(self, user_features: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """Unnormalized user projection of the profile features only (bias included, time/day excluded)."""
+        static = torch.cat([
+            self.user_embedding(user_features['user_id']),
+            self.user_age(user_features['age'].unsqueeze(-1)),
+            self.user_gender(user_features['gender']),
+            self._mean_pooling(user_features['liked_tags'], self.tag_embedding),
+            self._mean_pooling(user_features['disliked_tags'], self.tag_embedding),
+            self._mean_pooling(user_features['allergy_tags'], self.tag_embedding),
+        ], dim=-1)
+        context = self._user_context_columns()
+        weight = self.user_projection.weight
+        weight = torch.cat([weight[:, :context.start], weight[:, context.stop:]], dim=1)
+        return F.linear(static, weight, self.user_projection.bias)
+
+    def user_context_projection(self, time_of_day: torch.Tensor, day_of_week: torch.Tensor) -> torch.Tensor:
+        """The time/day share of the user projection (no bias), identical for all users."""
+        context = torch.cat([
+            self.user_time(time_of_day.unsqueeze(-1)),
+            self.user_day(day_of_week),
+        ], dim=-1)
+        return F.linear(context, self.user_projection.weight[:, self._user_context_columns()])
+
     def forward(self, user_features, item_features):
         u_vec = self.forward_user(user_features)
         i_vec = self.forward_item(item_features)
@@ -9,7 +9,7 @@ import random
 import argparse
 
 # Assume these modules exist in your project
-from src.data_preprocessor import DataPreprocessor
+from src.data_preprocessor import DataPreprocessor, CONTEXT_COLUMNS
 from src.dataset import FoodRecommendationDataset
 from src.simple_two_tower_model import SimpleTwoTowerModel
 from src.trainner import Trainer
@@ -28,7 +28,7 @@ def create_negative_samples(interactions_df, users_df, dishes_df, num_negatives=
     # (This function does not need to be changed)
     negative_samples = []
     all_dishes_set = set(dishes_df['id'].unique())
-    user_interactions_map = interactions_df.groupby('user_id')['dish_id'].apply(set)
+    user_interactions_map = interactions_df.groupby('user_id', observed=True)['dish_id'].apply(set)
     for _, row in interactions_df.iterrows():
         user_id = row['user_id']
         user_interacted_dishes = user_interactions_map.get(user_id, set())
@@ -43,7 +43,7 @@ def create_negative_samples(interactions_df, users_df, dishes_df, num_negatives=
             negative_samples.append({
                 'user_id': user_id, 'dish_id': neg_dish_id,
                 'interaction_type': 'negative', 'timestamp': row['timestamp'],
-                'context': row['context']
+                **{col: row[col] for col in CONTEXT_COLUMNS if col in row}
             })
     return pd.DataFrame(negative_samples)
 
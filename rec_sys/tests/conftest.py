@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Server modules import each other as `src.<module>`; the export script lives in scripts/
+for path in (os.path.join(ROOT, "server"), os.path.join(ROOT, "scripts"), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
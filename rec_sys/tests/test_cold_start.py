@@ -0,0 +1,61 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from src.cold_start import ColdStartEmbedder, price_bands_of
+
+
+@pytest.mark.parametrize("price, bands", [
+    (50000, ['budget']),
+    (60000, ['budget', 'mid']),
+    (65000, ['mid']),
+    (70000, ['mid', 'premium']),
+    (90000, ['premium']),
+    (None, []),
+    (float("nan"), []),
+    ("n/a", []),
+])
+def test_price_bands_of(price, bands):
+    assert price_bands_of(price) == bands
+
+
+@pytest.fixture
+def embedder():
+    tags = {
+        "vietnamese": torch.tensor([1.0, 0.0, 0.0]),
+        "spicy": torch.tensor([0.0, 1.0, 0.0]),
+    }
+    prices = {"budget": torch.tensor([0.0, 0.0, 1.0])}
+    return ColdStartEmbedder(tags, prices, fallback=torch.tensor([1.0, 1.0, 1.0]) / 3 ** 0.5, cache_size=2)
+
+
+def test_embedding_combines_centroids(embedder):
+    vector = embedder.embedding({'cuisine': ["vietnamese"], 'taste': "spicy", 'price_range': "budget"})
+
+    assert torch.allclose(vector, torch.tensor([1.0, 1.0, 1.0]) / 3 ** 0.5)
+    assert torch.isclose(vector.norm(), torch.tensor(1.0))
+
+
+def test_unknown_preferences_use_fallback(embedder):
+    assert embedder.embedding({'cuisine': ["martian"]}) is embedder.fallback
+    assert embedder.embedding(None) is embedder.fallback
+
+
+def test_signature_is_order_insensitive(embedder):
+    first = embedder.signature({'cuisine': ["a", "b", "a"], 'taste': "spicy"})
+    second = embedder.signature({'taste': ["spicy"], 'cuisine': ["b", "a"], 'price_range': None})
+
+    assert first == second
+
+
+def test_cache_is_bounded_lru(embedder):
+    a, b, c = ({'cuisine': [tag]} for tag in ("vietnamese", "spicy", "thai"))
+    first = embedder.embedding(a)
+    embedder.embedding(b)
+    assert embedder.embedding(a) is first
+    embedder.embedding(c)
+
+    assert len(embedder) == 2
+    assert embedder.signature(b) not in embedder._cache
+    embedder.clear()
+    assert len(embedder) == 0
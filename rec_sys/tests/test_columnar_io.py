@@ -0,0 +1,84 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.columnar_io import (
+    PARQUET_AVAILABLE, parse_list, read_frame, read_table, table_path, to_typed_frame, write_frame, write_table
+)
+
+FORMATS = ["csv", "parquet"] if PARQUET_AVAILABLE else ["csv"]
+
+
+def sample_dishes():
+    return pd.DataFrame({
+        'dish_id': ["d1", "d2"],
+        'dish_tags': [["noodle", "soup"], []],
+        'price': [65000.0, 55000.0],
+        'created_at': pd.to_datetime(["2024-03-01T12:00:00", "2024-03-02T08:30:00"]),
+    })
+
+
+@pytest.mark.parametrize("value, expected", [
+    (["a", "b"], ["a", "b"]),
+    ('["a", "b"]', ["a", "b"]),
+    ("['a', 'b']", ["a", "b"]),
+    ("", []),
+    ("not a list", []),
+    (None, []),
+    (float("nan"), []),
+])
+def test_parse_list(value, expected):
+    assert parse_list(value) == expected
+
+
+@pytest.mark.parametrize("data_format", FORMATS)
+def test_round_trip(tmp_path, data_format):
+    path = write_table(sample_dishes(), str(tmp_path), "dishes", data_format)
+
+    assert path.endswith(f"dishes.{data_format}")
+    df = to_typed_frame(read_table(str(tmp_path), "dishes"))
+    assert df['dish_tags'].tolist() == [["noodle", "soup"], []]
+    assert df['price'].tolist() == [65000.0, 55000.0]
+    assert pd.api.types.is_datetime64_any_dtype(df['created_at'])
+
+
+def test_write_frame_leaves_no_temporary_files(tmp_path):
+    path = str(tmp_path / "dishes.csv")
+    write_frame(sample_dishes(), path)
+    write_frame(sample_dishes(), path)
+
+    assert os.listdir(tmp_path) == ["dishes.csv"]
+
+
+def test_write_frame_failure_keeps_previous_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "dishes.csv")
+    write_frame(sample_dishes(), path)
+
+    def disk_full(self, path_or_buf, *args, **kwargs):
+        open(path_or_buf, "w").close()
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pd.DataFrame, "to_csv", disk_full)
+    with pytest.raises(OSError):
+        write_frame(sample_dishes(), path)
+    monkeypatch.undo()
+    assert os.listdir(tmp_path) == ["dishes.csv"]
+    assert len(read_frame(path)) == 2
+
+
+@pytest.mark.skipif(not PARQUET_AVAILABLE, reason="pyarrow is not installed")
+def test_table_path_prefers_newer_file(tmp_path):
+    write_table(sample_dishes(), str(tmp_path), "dishes", "parquet")
+    assert table_path(str(tmp_path), "dishes").endswith(".parquet")
+
+    csv_path = write_table(sample_dishes(), str(tmp_path), "dishes", "csv")
+    parquet_mtime = os.path.getmtime(str(tmp_path / "dishes.parquet"))
+    os.utime(csv_path, (parquet_mtime + 10, parquet_mtime + 10))
+    assert table_path(str(tmp_path), "dishes") == csv_path
+
+
+def test_read_table_missing(tmp_path):
+    assert table_path(str(tmp_path), "dishes") is None
+    with pytest.raises(FileNotFoundError):
+        read_table(str(tmp_path), "dishes")
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.dish_filter_index import DishFilterIndex
+
+
+@pytest.fixture
+def index():
+    dishes = pd.DataFrame({
+        'id': ["d0", "d1", "d2", "d3", "unknown"],
+        'food_tags': [["noodle"], '["rice"]', [], ["noodle", "soup"], ["noodle"]],
+        'taste_tags': [["savory"], ["sweet"], ["savory"], [], []],
+        'category': ["Noodles", "Rice", None, "Noodles", "Noodles"],
+        'store_id': ["s1", "s1", "s2", "s2", "s2"],
+        'price': [65000, 50000, np.nan, 72000, 1000],
+    })
+    return DishFilterIndex.build(dishes, {"d0": 0, "d1": 1, "d2": 2, "d3": 3})
+
+
+def rows(mask):
+    return mask.nonzero()[0].tolist()
+
+
+def test_rows_with_any(index):
+    assert index.num_rows == 4
+    assert rows(index.rows_with_any(["noodle"])) == [0, 3]
+    assert rows(index.rows_with_any(["sweet", "soup"])) == [1, 3]
+    assert rows(index.rows_with_any(["savory"], columns=["food_tags"])) == []
+    assert rows(index.rows_with_any(["Noodles"], columns=["category"])) == [0, 3]
+    assert rows(index.rows_with_any(["s2"], columns=["store_id"])) == [2, 3]
+
+
+def test_price_between(index):
+    assert rows(index.price_between(55000, 70000)) == [0]
+    assert rows(index.price_between(max_price=65000)) == [0, 1]
+    assert rows(index.price_between(min_price=65000)) == [0, 3]
+    # Without bounds every row matches, including the one without a price
+    assert rows(index.price_between()) == [0, 1, 2, 3]
+
+
+def test_set_row_reindexes(index):
+    index.set_row(0, {'food_tags': ["rice"], 'category': "Rice", 'price': 40000})
+
+    assert rows(index.rows_with_any(["noodle"])) == [3]
+    assert rows(index.rows_with_any(["rice"])) == [0, 1]
+    assert rows(index.price_between(max_price=45000)) == [0]
+    assert index.row_tags(0) == {"rice"}
+    assert index.row_price(0) == 40000.0
+
+
+def test_set_row_grows_index(index):
+    index.set_row(9, {'food_tags': ["noodle"], 'price': 30000})
+
+    assert index.num_rows == 10
+    assert rows(index.rows_with_any(["noodle"])) == [0, 3, 9]
+    assert np.isnan(index.row_price(5))
+    assert np.isnan(index.row_price(42))
+
+
+def test_row_tags_and_tag_rows(index):
+    assert index.row_tags(3) == {"noodle", "soup"}
+    assert index.row_tags(2) == {"savory"}
+    tag_rows = index.tag_rows()
+    assert tag_rows["noodle"].tolist() == [0, 3]
+    assert tag_rows["savory"].tolist() == [0, 2]
@@ -0,0 +1,163 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("pymongo")
+pytest.importorskip("motor")
+from bson import ObjectId
+
+import export_data
+from export_data import DataExporter, PARTITION_DIR, STATE_FILE
+from src.columnar_io import PARQUET_AVAILABLE, read_table
+
+FORMATS = ["csv", "parquet"] if PARQUET_AVAILABLE else ["csv"]
+PAST = datetime(2024, 3, 1, 12, 0)
+
+
+def seed(db):
+    """Two stores, three dishes, two users; one done order rated, one pending order, one completed cart."""
+    ids = {name: ObjectId() for name in (
+        "store1", "store2", "dish1", "dish2", "dish3", "user1", "user2", "ref1",
+        "cat1", "syscat", "order1", "order2", "cart1",
+    )}
+    db.system_categories.insert_one({"_id": ids["syscat"], "name": "Vietnamese"})
+    db.stores.insert_many([
+        {"_id": ids["store1"], "name": "Phở 24", "createdAt": PAST, "systemCategoryId": [ids["syscat"]],
+         "location": {"type": "Point", "coordinates": [106.70, 10.77]}},
+        {"_id": ids["store2"], "name": "Bún chả", "createdAt": PAST},
+    ])
+    db.categories.insert_one({"_id": ids["cat1"], "name": "Noodles"})
+    db.dishes.insert_many([
+        {"_id": ids["dish1"], "name": "Phở bò", "storeId": ids["store1"], "price": 65000, "category": ids["cat1"],
+         "dishTags": ["noodle"], "tasteTags": ["savory"], "createdAt": PAST},
+        {"_id": ids["dish2"], "name": "Phở gà", "storeId": ids["store1"], "price": 55000, "createdAt": PAST},
+        {"_id": ids["dish3"], "name": "Bún chả", "storeId": ids["store2"], "price": 50000, "createdAt": PAST},
+    ])
+    db.user_references.insert_one({"_id": ids["ref1"], "like_taste": ["savory"], "allergy": [], "createdAt": PAST})
+    db.users.insert_many([
+        {"_id": ids["user1"], "name": "An", "user_reference_id": ids["ref1"], "createdAt": PAST},
+        {"_id": ids["user2"], "name": "Bình", "createdAt": PAST},
+    ])
+    db.orders.insert_many([
+        {"_id": ids["order1"], "userId": ids["user1"], "storeId": ids["store1"], "status": "done", "createdAt": PAST},
+        {"_id": ids["order2"], "userId": ids["user2"], "storeId": ids["store2"], "status": "pending", "createdAt": PAST},
+    ])
+    db.order_items.insert_many([
+        {"orderId": ids["order1"], "dishId": ids["dish1"], "quantity": 2, "createdAt": PAST},
+        {"orderId": ids["order1"], "dishId": ids["dish2"], "quantity": 1, "createdAt": PAST},
+        {"orderId": ids["order2"], "dishId": ids["dish3"], "quantity": 1, "createdAt": PAST},
+    ])
+    db.carts.insert_one({"_id": ids["cart1"], "userId": ids["user2"], "storeId": ids["store2"],
+                         "completed": True, "status": "active", "createdAt": PAST})
+    db.cart_items.insert_one({"cartId": ids["cart1"], "dishId": ids["dish3"], "quantity": 3, "createdAt": PAST})
+    db.ratings.insert_one({"userId": ids["user1"], "storeId": ids["store1"], "orderId": ids["order1"],
+                           "ratingValue": 5, "createdAt": PAST})
+    for collection in ("food_tags", "taste_tags", "cooking_method_tags", "culture_tags"):
+        db[collection].insert_one({"name": collection.replace("_tags", ""), "tag_category_id": ObjectId()})
+    return ids
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.mark.parametrize("data_format", FORMATS)
+def test_export_all_row_counts_and_dtypes(db, tmp_path, data_format):
+    ids = seed(db)
+    DataExporter(db=db, batch_size=2, data_format=data_format).export_all(str(tmp_path))
+
+    interactions = read_table(str(tmp_path), "interactions")
+    # order1: 2 items, cart1: 1 item, the rating of order1: 2 items; the pending order is skipped
+    assert len(interactions) == 5
+    assert interactions["event_type"].value_counts().to_dict() == {"order": 2, "rating": 2, "cart_completed": 1}
+    assert len(read_table(str(tmp_path), "users")) == 2
+    assert len(read_table(str(tmp_path), "dishes")) == 3
+    assert len(read_table(str(tmp_path), "stores")) == 2
+    assert len(read_table(str(tmp_path), "tags")) == 4
+
+    assert interactions["user_id"].map(type).eq(str).all()
+    assert pd.api.types.is_integer_dtype(interactions["quantity"])
+    assert pd.api.types.is_float_dtype(interactions["rating"])
+    dishes = read_table(str(tmp_path), "dishes").set_index("dish_id")
+    assert pd.api.types.is_float_dtype(dishes["price"])
+    assert dishes.loc[str(ids["dish1"]), "order_times"] == 1
+    assert dishes.loc[str(ids["dish1"]), "average_rating"] == 5.0
+    assert dishes.loc[str(ids["dish1"]), "category"] == "Noodles"
+
+    if data_format == "parquet":
+        assert pd.api.types.is_datetime64_any_dtype(interactions["timestamp"])
+        assert dishes.loc[str(ids["dish1"]), "dish_tags"] == ["noodle"]
+        users = read_table(str(tmp_path), "users").set_index("user_id")
+        assert users.loc[str(ids["user1"]), "like_taste"] == ["savory"]
+        assert users.loc[str(ids["user1"]), "recent_history_dishes"] == [str(ids["dish1"]), str(ids["dish2"])]
+
+
+@pytest.mark.parametrize("data_format", FORMATS)
+def test_stream_export_matches_in_memory_export(db, tmp_path, data_format):
+    seed(db)
+    DataExporter(db=db, batch_size=2, data_format=data_format).export_all(str(tmp_path / "memory"))
+    DataExporter(db=db, batch_size=2, data_format=data_format).export_all(str(tmp_path / "stream"), stream=True)
+
+    in_memory = read_table(str(tmp_path / "memory"), "interactions")
+    streamed = read_table(str(tmp_path / "stream"), "interactions")
+    key = ["user_id", "dish_id", "event_type"]
+    assert len(streamed) == len(in_memory)
+    assert streamed.sort_values(key)[key].values.tolist() == in_memory.sort_values(key)[key].values.tolist()
+
+
+@pytest.mark.parametrize("data_format", FORMATS)
+def test_export_incremental_appends_changes(db, tmp_path, data_format):
+    ids = seed(db)
+    exporter = DataExporter(db=db, batch_size=2, data_format=data_format)
+    output_dir = str(tmp_path)
+
+    # First run: no state yet, so a full export
+    exporter.export_incremental(output_dir)
+    with open(os.path.join(output_dir, STATE_FILE), encoding="utf-8") as f:
+        state = json.load(f)
+    assert datetime.fromisoformat(state["watermark"]).tzinfo is not None
+    assert len(read_table(output_dir, "interactions")) == 5
+
+    # A new order and a renamed dish since the watermark
+    now = datetime.now(timezone.utc)
+    order3 = ObjectId()
+    db.orders.insert_one({"_id": order3, "userId": ids["user2"], "storeId": ids["store2"], "status": "done",
+                          "createdAt": now})
+    db.order_items.insert_one({"orderId": order3, "dishId": ids["dish3"], "quantity": 1, "createdAt": now})
+    db.dishes.update_one({"_id": ids["dish2"]}, {"$set": {"name": "Phở gà ta", "updatedAt": now}})
+    exporter.export_incremental(output_dir, overlap_seconds=60)
+
+    interactions = read_table(output_dir, "interactions")
+    assert len(interactions) == 6
+    dishes = read_table(output_dir, "dishes").set_index("dish_id")
+    assert len(dishes) == 3
+    assert dishes.loc[str(ids["dish2"]), "name"] == "Phở gà ta"
+    # dish3 was re-exported for its new order
+    assert dishes.loc[str(ids["dish3"]), "order_times"] == 2
+    partitions = os.listdir(os.path.join(output_dir, PARTITION_DIR, "interactions"))
+    assert len(partitions) == 1
+
+    # Nothing changed: the snapshot stays the same
+    exporter.export_incremental(output_dir, overlap_seconds=0)
+    assert len(read_table(output_dir, "interactions")) == 6
+
+
+def test_partition_names_are_never_reused(db, tmp_path):
+    exporter = DataExporter(db=db, data_format="csv")
+    run_start = datetime(2024, 3, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+    name = exporter._partition_name(str(tmp_path), {}, run_start)
+    assert name == "part-20240301T120000123456.csv"
+
+    # Same instant as a compacted partition, or one still on disk: a fresh name
+    state = {'compacted': {'users': [name]}}
+    assert exporter._partition_name(str(tmp_path), state, run_start) != name
+    os.makedirs(tmp_path / PARTITION_DIR / "dishes")
+    (tmp_path / PARTITION_DIR / "dishes" / name).touch()
+    renamed = exporter._partition_name(str(tmp_path), {}, run_start)
+    assert renamed != name and renamed.startswith("part-20240301T120000123456-")
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.id_vocab import FrameRowLookup, IdVocabulary
+
+OBJECT_IDS = [
+    "65a1b2c3d4e5f60718293a4b",
+    "65a1b2c3d4e5f60718293a00",
+    "0000000000000000000000ff",
+    "ff00000000000000000000ff",
+]
+
+
+def dict_vocab(keys, start=1, specials=None):
+    """The dict vocabulary IdVocabulary replaced: first appearance + start, then the specials."""
+    vocab = {key: idx + start for idx, key in enumerate(pd.Series(list(keys), dtype=object).unique())}
+    vocab.update(specials if specials is not None else {'<UNK>': 0})
+    return vocab
+
+
+@pytest.mark.parametrize("keys", [
+    OBJECT_IDS,
+    OBJECT_IDS + OBJECT_IDS[:2],
+    ["dish_b", "dish_a", "dish_c", "dish_a"],
+    ["Phở", "Bún chả", "Cơm tấm"],
+])
+def test_numbering_matches_dict_vocabulary(keys):
+    old = dict_vocab(keys)
+    vocab = IdVocabulary(keys)
+
+    assert len(vocab) == len(old)
+    assert dict(vocab.items()) == old
+    for key, index in old.items():
+        assert vocab[key] == index
+        assert key in vocab
+    assert list(vocab.keys_in_order()) == [k for k in old if k != '<UNK>']
+
+
+def test_object_ids_are_packed():
+    vocab = IdVocabulary(OBJECT_IDS)
+
+    assert vocab.binary
+    # Trailing zero bytes survive the round trip through the 'S12' array
+    assert vocab.key_at(vocab["0000000000000000000000ff"]) == "0000000000000000000000ff"
+    assert [vocab.key_at(i) for i in range(1, len(OBJECT_IDS) + 1)] == OBJECT_IDS
+
+
+def test_tag_vocabulary_specials():
+    tags = sorted({"spicy", "sweet", "grilled"})
+    old = {'<PAD>': 0, '<UNK>': 1, **{tag: i + 2 for i, tag in enumerate(tags)}}
+    vocab = IdVocabulary(tags, start=2, specials={'<PAD>': 0, '<UNK>': 1})
+
+    assert dict(vocab.items()) == old
+    assert len(vocab) == len(old)
+
+
+def test_nan_ids_keep_their_slot():
+    keys = pd.Series([OBJECT_IDS[0], np.nan, OBJECT_IDS[1], None, OBJECT_IDS[2]], dtype=object).unique()
+    old = dict_vocab(keys)
+    vocab = IdVocabulary(keys)
+
+    # Missing ids take an index in the dict, so the ids after them keep their numbers
+    assert len(vocab) == len(old)
+    for key in OBJECT_IDS[:3]:
+        assert vocab[key] == old[key]
+    assert vocab.num_keys == 3
+    assert vocab.num_slots == len(keys)
+    assert vocab.get(np.nan) is None
+    assert vocab.get(None) is None
+    assert vocab.key_at(old[OBJECT_IDS[1]] - 1) is None
+    assert list(vocab.keys_in_order()) == OBJECT_IDS[:3]
+
+
+def test_uppercase_hex_is_not_folded():
+    upper = OBJECT_IDS[0].upper()
+    keys = [upper, OBJECT_IDS[0]]
+    vocab = IdVocabulary(keys)
+
+    assert dict(vocab.items()) == dict_vocab(keys)
+    assert vocab[upper] != vocab[OBJECT_IDS[0]]
+    assert vocab.key_at(vocab[upper]) == upper
+
+
+def test_uppercase_query_misses_packed_vocabulary():
+    vocab = IdVocabulary(OBJECT_IDS)
+
+    assert vocab.binary
+    assert vocab.get(OBJECT_IDS[0].upper()) is None
+    assert OBJECT_IDS[0].upper() not in vocab
+
+
+def test_lookup_matches_get():
+    vocab = IdVocabulary(OBJECT_IDS)
+    queries = [OBJECT_IDS[2], "unknown", None, np.nan, OBJECT_IDS[0], OBJECT_IDS[0].upper()]
+
+    assert vocab.lookup(queries).tolist() == [vocab.get(q, 0) for q in queries]
+
+
+def test_empty_vocabulary():
+    vocab = IdVocabulary([])
+
+    assert len(vocab) == 1
+    assert vocab.get("anything") is None
+    assert vocab.lookup(["a", "b"]).tolist() == [0, 0]
+    assert dict(vocab.items()) == {'<UNK>': 0}
+
+
+def test_frame_row_lookup():
+    df = pd.DataFrame({
+        'id': ["d1", "d2", None, "d1"],
+        'name': ["Phở", "Bún", "nameless", "duplicate"],
+        'price': [50000.0, 45000.0, 1.0, 2.0],
+    })
+    lookup = FrameRowLookup(df)
+
+    assert len(lookup) == 2
+    assert lookup["d1"] == {'name': "Phở", 'price': 50000.0}
+    assert lookup.get("missing") is None
+    with pytest.raises(KeyError):
+        lookup["missing"]
@@ -0,0 +1,205 @@
+import threading
+import time
+
+import pytest
+
+from job_queue import (
+    CANCELLED, COMPLETED, FAILED, PENDING, RUNNING, JobCancelled, JobQueue, JobStore
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"), stale_after_seconds=60)
+
+
+def make_stale(store, job_id):
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?", (time.time() - 3600, job_id))
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+# --- JobStore ---
+
+def test_claim_next_takes_oldest_pending(store):
+    first = store.create("pipeline")
+    second = store.create("pipeline")
+
+    claimed = store.claim_next()
+
+    assert claimed["job_id"] == first["job_id"]
+    assert claimed["state"] == RUNNING
+    assert claimed["start_time"] is not None
+    assert store.get(second["job_id"])["state"] == PENDING
+
+
+def test_claim_next_runs_one_job_at_a_time(store):
+    store.create("pipeline")
+    store.create("pipeline")
+
+    assert store.claim_next() is not None
+    assert store.claim_next() is None
+
+
+def test_claim_next_with_empty_queue(store):
+    assert store.claim_next() is None
+
+
+def test_claim_next_concurrent_claims_are_exclusive(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    JobStore(path).create("pipeline")
+    claimed = []
+
+    def claim():
+        job = JobStore(path).claim_next()
+        if job is not None:
+            claimed.append(job["job_id"])
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(claimed) == 1
+
+
+def test_recover_stale_fails_silent_jobs(store):
+    job = store.create("pipeline")
+    store.claim_next()
+    make_stale(store, job["job_id"])
+
+    assert store.recover_stale() == 1
+    recovered = store.get(job["job_id"])
+    assert recovered["state"] == FAILED
+    assert "stopped responding" in recovered["error"]
+    # The queue is no longer blocked
+    store.create("pipeline")
+    assert store.claim_next() is not None
+
+
+def test_recover_stale_keeps_live_jobs(store):
+    job = store.create("pipeline")
+    store.claim_next()
+    store.heartbeat(job["job_id"])
+
+    assert store.recover_stale() == 0
+    assert store.get(job["job_id"])["state"] == RUNNING
+
+
+def test_recover_stale_ignores_pending_jobs(store):
+    job = store.create("pipeline")
+
+    assert store.recover_stale() == 0
+    assert store.get(job["job_id"])["state"] == PENDING
+
+
+def test_conditional_update_does_not_resurrect_failed_job(store):
+    job = store.create("pipeline")
+    store.claim_next()
+    make_stale(store, job["job_id"])
+    store.recover_stale()
+
+    assert not store.update(job["job_id"], only_if_state=RUNNING, state=COMPLETED, status=COMPLETED)
+    assert store.get(job["job_id"])["state"] == FAILED
+    # A job that is no longer RUNNING should stop
+    assert store.heartbeat(job["job_id"])
+
+
+def test_request_cancel(store):
+    pending = store.create("pipeline")
+    running = store.create("pipeline")
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET state = ? WHERE job_id = ?", (RUNNING, running["job_id"]))
+
+    assert store.request_cancel(pending["job_id"])["state"] == CANCELLED
+    flagged = store.request_cancel(running["job_id"])
+    assert flagged["state"] == RUNNING and flagged["cancel_requested"]
+    assert store.heartbeat(running["job_id"])
+
+
+# --- JobQueue ---
+
+def run_queue(store, handler, **kwargs):
+    queue = JobQueue(store, {"pipeline": handler}, poll_interval=0.05, **kwargs)
+    job = queue.submit("pipeline")
+    queue.start()
+    finished = wait_for(lambda: store.get(job["job_id"])["state"] not in (PENDING, RUNNING))
+    queue.stop()
+    assert finished
+    return store.get(job["job_id"])
+
+
+def test_queue_runs_handler_and_records_steps(store):
+    def handler(job_id, update_status, is_cancelled):
+        update_status(job_id, "EXPORTING", message="Exporting data...")
+        update_status(job_id, "TRAINING", progress=50)
+
+    job = run_queue(store, handler)
+
+    assert job["state"] == COMPLETED
+    assert job["progress"] == 100.0
+    assert set(job["steps"]) == {"EXPORTING", "TRAINING"}
+    assert all(step["seconds"] is not None for step in job["steps"].values())
+
+
+def test_queue_records_handler_failure(store):
+    def handler(job_id, update_status, is_cancelled):
+        update_status(job_id, "TRAINING")
+        raise RuntimeError("out of memory")
+
+    job = run_queue(store, handler)
+
+    assert job["state"] == FAILED
+    assert job["error"] == "out of memory"
+
+
+def test_queue_cancels_at_next_checkpoint(store):
+    def handler(job_id, update_status, is_cancelled):
+        store.request_cancel(job_id)
+        update_status(job_id, "TRAINING")
+        raise AssertionError("update_status should have raised")
+
+    assert run_queue(store, handler)["state"] == CANCELLED
+
+
+def test_keep_alive_covers_steps_without_checkpoints(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), stale_after_seconds=0.5)
+
+    def handler(job_id, update_status, is_cancelled):
+        update_status(job_id, "EXPORTING")
+        # Longer than the stale timeout without calling back; another worker keeps checking
+        deadline = time.time() + 1.5
+        while time.time() < deadline:
+            store.recover_stale()
+            time.sleep(0.05)
+        update_status(job_id, "TRAINING")
+
+    assert run_queue(store, handler, heartbeat_interval=0.1)["state"] == COMPLETED
+
+
+def test_job_failed_externally_stops_and_stays_failed(store):
+    seen = {}
+
+    def handler(job_id, update_status, is_cancelled):
+        update_status(job_id, "EXPORTING")
+        store.update(job_id, state=FAILED, error="Interrupted")
+        try:
+            update_status(job_id, "TRAINING")
+        except JobCancelled as e:
+            seen["error"] = e
+            raise
+
+    job = run_queue(store, handler)
+
+    assert job["state"] == FAILED
+    assert job["error"] == "Interrupted"
+    assert "no longer running" in str(seen["error"])
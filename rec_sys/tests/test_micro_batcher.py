@@ -0,0 +1,74 @@
+import asyncio
+
+from src.micro_batcher import MicroBatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_requests_share_a_batch():
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(double, max_batch_size=8, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        stats = batcher.stats()
+        await batcher.stop()
+        return results, stats
+
+    results, stats = run(scenario())
+    assert results == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+    assert stats["batches"] == 1 and stats["items"] == 5 and stats["last_batch_size"] == 5
+
+
+def test_batches_are_capped():
+    batches = []
+
+    def identity(items):
+        batches.append(len(items))
+        return items
+
+    async def scenario():
+        batcher = MicroBatcher(identity, max_batch_size=3, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+        await batcher.stop()
+        return results
+
+    assert run(scenario()) == list(range(7))
+    assert max(batches) <= 3
+    assert sum(batches) == 7
+
+
+def test_exception_result_fails_only_its_item():
+    def check(items):
+        return [ValueError(f"bad {item}") if item < 0 else item for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(check, max_wait_ms=20)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(-1), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    ok, error = run(scenario())
+    assert ok == 1
+    assert isinstance(error, ValueError) and str(error) == "bad -1"
+
+
+def test_failed_batch_fails_every_item():
+    def explode(items):
+        raise RuntimeError("model not loaded")
+
+    async def scenario():
+        batcher = MicroBatcher(explode, max_wait_ms=20)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(r, RuntimeError) for r in run(scenario()))
+
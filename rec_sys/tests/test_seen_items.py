@@ -0,0 +1,44 @@
+import pandas as pd
+
+from src.seen_items import SeenItemsIndex
+
+ID_TO_ROW = {f"d{i}": i for i in range(20)}
+
+
+def test_build_from_pairs():
+    pairs = pd.DataFrame({'user_id': ["u1", "u1", "u2"], 'dish_id': ["d0", "d9", "d3"]})
+    index = SeenItemsIndex.build(pairs, ID_TO_ROW)
+
+    assert index.mask("u1", 20).nonzero()[0].tolist() == [0, 9]
+    assert index.mask("u2", 20).nonzero()[0].tolist() == [3]
+    assert index.mask("u3", 20) is None
+
+
+def test_build_from_empty_table():
+    index = SeenItemsIndex.build(pd.DataFrame(columns=['user_id', 'dish_id']), ID_TO_ROW)
+
+    assert index.mask("u1", 20) is None
+
+
+def test_mark_seen_counts_new_dishes_only():
+    index = SeenItemsIndex(ID_TO_ROW)
+
+    assert index.mark_seen("u1", ["d1", "d2"]) == 2
+    assert index.mark_seen("u1", ["d2", "d17", "unknown"]) == 1
+    assert index.mark_seen("u1", ["unknown"]) == 0
+    assert index.mask("u1", 20).nonzero()[0].tolist() == [1, 2, 17]
+
+
+def test_mask_follows_catalog_growth():
+    id_to_row = dict(ID_TO_ROW)
+    index = SeenItemsIndex(id_to_row)
+    index.mark_seen("u1", ["d1"])
+
+    # Dishes added to the embedding index later resolve through the shared map
+    id_to_row["d20"] = 20
+    index.mark_seen("u1", ["d20"])
+    mask = index.mask("u1", 21)
+    assert len(mask) == 21
+    assert mask.nonzero()[0].tolist() == [1, 20]
+    # A mask shorter than the bitset is truncated
+    assert index.mask("u1", 10).nonzero()[0].tolist() == [1]